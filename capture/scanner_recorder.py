@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from relay import sensor as relay
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+_FLUSH_INTERVAL_S = int(os.getenv("SCANNER_FLUSH_INTERVAL_S", "10"))
+_MAX_PENDING = int(os.getenv("SCANNER_MAX_PENDING", "100000"))
+
+_lock = threading.Lock()
+_pending: dict[tuple[int, str, str | None], dict] = {}
+_dropped = 0
+
+
+def record(
+    source_ip: str,
+    client_version: str | None,
+    kex: dict[str, list[str]] | None,
+    fingerprint: str | None,
+    stage: str,
+    duration_ms: float,
+) -> None:
+    global _dropped
+    now = time.time()
+    key = (int(now) // 60, source_ip, fingerprint)
+    with _lock:
+        entry = _pending.get(key)
+        if entry is None:
+            if len(_pending) >= _MAX_PENDING:
+                _dropped += 1
+                return
+            entry = _pending[key] = {
+                "source_ip": source_ip,
+                "hassh": fingerprint,
+                "client_version": client_version,
+                "kex": kex,
+                "first_seen": now,
+                "count": 0,
+                "stages": {},
+                "duration_ms_max": 0.0,
+                "duration_ms_sum": 0.0,
+            }
+        entry["count"] += 1
+        entry["last_seen"] = now
+        entry["stages"][stage] = entry["stages"].get(stage, 0) + 1
+        entry["duration_ms_max"] = max(entry["duration_ms_max"], duration_ms)
+        entry["duration_ms_sum"] += duration_ms
+
+
+def _take(final: bool) -> tuple[list[dict], int]:
+    global _pending, _dropped
+    current = int(time.time()) // 60
+    with _lock:
+        if final or len(_pending) >= _MAX_PENDING:
+            taken, _pending = _pending, {}
+        else:
+            taken = {k: v for k, v in _pending.items() if k[0] < current}
+            for k in taken:
+                del _pending[k]
+        dropped, _dropped = _dropped, 0
+    return list(taken.values()), dropped
+
+
+async def flush(final: bool = False) -> int:
+    entries, dropped = _take(final)
+    if dropped:
+        log.warning(f"Scanner recorder dropped {dropped} connections (pending buffer full)")
+    if not entries:
+        return 0
+
+    for entry in entries:
+        entry["first_seen"] = datetime.fromtimestamp(entry["first_seen"], timezone.utc)
+        entry["last_seen"] = datetime.fromtimestamp(entry["last_seen"], timezone.utc)
+        entry["duration_ms_max"] = round(entry["duration_ms_max"], 1)
+        entry["duration_ms_avg"] = round(entry.pop("duration_ms_sum") / entry["count"], 1)
+        relay.ship("connections", entry)
+    await get_db().connections.insert_many(entries, ordered=False)
+    log.debug(f"Scanner recorder flushed {len(entries)} connection records")
+    return len(entries)
+
+
+async def _run_forever() -> None:
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL_S)
+        try:
+            await flush()
+        except Exception:
+            log.exception("Scanner recorder flush failed")
+
+
+async def ensure_indexes() -> None:
+    connections = get_db().connections
+    await connections.create_index([("first_seen", -1)])
+    await connections.create_index([("hassh", 1), ("first_seen", -1)])
+    await connections.create_index([("source_ip", 1), ("first_seen", -1)])
+
+
+def init() -> None:
+    loop = get_loop()
+    asyncio.run_coroutine_threadsafe(ensure_indexes(), loop).result(timeout=10)
+    asyncio.run_coroutine_threadsafe(_run_forever(), loop)
+    log.info("Scanner recorder initialised")
+
+
+def shutdown() -> None:
+    try:
+        asyncio.run_coroutine_threadsafe(flush(final=True), get_loop()).result(timeout=5)
+    except Exception:
+        log.exception("Final scanner flush failed")
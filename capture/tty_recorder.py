@@ -3,19 +3,43 @@ import base64
 import logging
 from datetime import datetime, timezone
 
+from relay import sensor as relay
+from storage import search
 from storage.database import get_db, get_loop
 
 log = logging.getLogger(__name__)
 
+_DRAIN_POLL_S = 0.05
+_DRAIN_TIMEOUT_S = 5
 
-async def _record(session_id: str, data: bytes, direction: str) -> None:
-    await get_db().keystrokes.insert_one({
-        "session_id": session_id,
-        "timestamp": datetime.now(timezone.utc),
-        "data": base64.b64encode(data).decode(),
-        "direction": direction,
-    })
+_inflight: dict[str, int] = {}
 
 
-def log_keystroke(session_id: str, data: bytes, direction: str) -> None:
-    asyncio.run_coroutine_threadsafe(_record(session_id, data, direction), get_loop())
+async def _record(session_id: str, data: bytes, direction: str, channel: int | None) -> None:
+    search.feed(session_id, data, direction, channel)
+    _inflight[session_id] = _inflight.get(session_id, 0) + 1
+    try:
+        doc = {
+            "session_id": session_id,
+            "timestamp": datetime.now(timezone.utc),
+            "data": base64.b64encode(data).decode(),
+            "direction": direction,
+        }
+        if channel is not None:
+            doc["channel"] = channel
+        relay.ship("keystrokes", doc)
+        await get_db().keystrokes.insert_one(doc)
+    finally:
+        _inflight[session_id] -= 1
+        if not _inflight[session_id]:
+            del _inflight[session_id]
+
+
+async def drain(session_id: str) -> None:
+    deadline = asyncio.get_running_loop().time() + _DRAIN_TIMEOUT_S
+    while session_id in _inflight and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(_DRAIN_POLL_S)
+
+
+def log_keystroke(session_id: str, data: bytes, direction: str, channel: int | None = None) -> None:
+    asyncio.run_coroutine_threadsafe(_record(session_id, data, direction, channel), get_loop())
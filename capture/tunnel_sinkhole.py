@@ -0,0 +1,439 @@
+import asyncio
+import logging
+import os
+import re
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable
+
+import paramiko
+from pymongo import UpdateOne
+
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+_ENABLED = os.getenv("TUNNEL_SINKHOLE", "0") == "1"
+_CAPTURE_BYTES = int(os.getenv("TUNNEL_CAPTURE_BYTES", "2048"))
+_SAMPLE_RING = int(os.getenv("TUNNEL_SAMPLE_RING", "10000"))
+_MAX_FLOWS = int(os.getenv("TUNNEL_MAX_FLOWS", "2000"))
+_FLOW_TIMEOUT_S = float(os.getenv("TUNNEL_FLOW_TIMEOUT_S", "15"))
+_FLUSH_INTERVAL_S = int(os.getenv("TUNNEL_FLUSH_INTERVAL_S", "10"))
+_MAX_PENDING = int(os.getenv("TUNNEL_MAX_PENDING", "100000"))
+
+_MAX_FLOW_BYTES = 1 << 20
+_SAMPLE_OVERHEAD_BYTES = 512
+_MAX_LINE = 4096
+_MAX_SOURCES = 100
+_SMTP_PORTS = {25, 587, 2525}
+_HTTP_PORTS = {80, 81, 3128, 8000, 8008, 8080, 8888}
+_HTTP_METHOD_RE = re.compile(rb"^(GET|POST|HEAD|PUT|DELETE|OPTIONS|PATCH|CONNECT) ")
+_SMTP_HOSTNAME = os.getenv("HONEYPOT_HOSTNAME", "web-prod-01")
+
+_HTTP_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Server: nginx/1.18.0 (Ubuntu)\r\n"
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
+def protocol(port: int, payload: bytes = b"") -> str:
+    if port in _SMTP_PORTS:
+        return "smtp"
+    if port in _HTTP_PORTS or _HTTP_METHOD_RE.match(payload):
+        return "http"
+    if port == 443 or payload[:1] == b"\x16":
+        return "tls"
+    return "raw"
+
+
+class _Smtp:
+    def __init__(self) -> None:
+        self.data = False
+
+    def greeting(self) -> bytes:
+        return f"220 {_SMTP_HOSTNAME} ESMTP Postfix (Ubuntu)\r\n".encode()
+
+    def reply(self, line: bytes) -> tuple[bytes, bool]:
+        if self.data:
+            if line == b".":
+                self.data = False
+                return f"250 2.0.0 Ok: queued as {os.urandom(5).hex().upper()}\r\n".encode(), False
+            return b"", False
+        verb = line.split(b" ", 1)[0].upper()
+        if verb == b"EHLO":
+            return (
+                f"250-{_SMTP_HOSTNAME}\r\n250-PIPELINING\r\n250-SIZE 10240000\r\n"
+                f"250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n"
+            ).encode(), False
+        if verb in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+            return b"250 2.0.0 Ok\r\n", False
+        if verb == b"AUTH":
+            return b"235 2.7.0 Authentication successful\r\n", False
+        if verb == b"DATA":
+            self.data = True
+            return b"354 End data with <CR><LF>.<CR><LF>\r\n", False
+        if verb == b"STARTTLS":
+            return b"454 4.7.0 TLS not available due to local problem\r\n", False
+        if verb == b"QUIT":
+            return b"221 2.0.0 Bye\r\n", True
+        return b"502 5.5.2 Error: command not recognized\r\n", False
+
+
+class _Flow:
+    __slots__ = (
+        "channel", "fd", "session_id", "source_ip", "host", "port", "opened", "last_io",
+        "payload", "bytes_in", "protocol", "smtp", "line", "touch",
+    )
+
+    def __init__(
+        self,
+        channel,
+        session_id: str,
+        source_ip: str,
+        host: str,
+        port: int,
+        touch: Callable[[int, str], None] | None = None,
+    ) -> None:
+        self.channel = channel
+        self.fd: int | None = None
+        self.session_id = session_id
+        self.source_ip = source_ip
+        self.host = host
+        self.port = port
+        self.opened = self.last_io = time.time()
+        self.payload = bytearray()
+        self.bytes_in = 0
+        self.protocol = protocol(port)
+        self.smtp = _Smtp() if self.protocol == "smtp" else None
+        self.line = bytearray()
+        self.touch = touch
+
+    def feed(self, data: bytes) -> tuple[bytes, bool]:
+        self.last_io = time.time()
+        self.bytes_in += len(data)
+        room = _CAPTURE_BYTES - len(self.payload)
+        if room > 0:
+            self.payload.extend(data[:room])
+            if self.protocol == "raw":
+                self.protocol = protocol(self.port, bytes(self.payload))
+        if self.bytes_in > _MAX_FLOW_BYTES:
+            return b"", True
+
+        if self.smtp is not None:
+            out = bytearray()
+            self.line.extend(data)
+            while b"\n" in self.line:
+                line, _, rest = bytes(self.line).partition(b"\n")
+                self.line = bytearray(rest)
+                reply, close = self.smtp.reply(line.rstrip(b"\r"))
+                out += reply
+                if close:
+                    return bytes(out), True
+            if len(self.line) > _MAX_LINE:
+                del self.line[:-_MAX_LINE]
+            return bytes(out), False
+        if self.protocol == "http":
+            if b"\r\n\r\n" in self.payload or b"\n\n" in self.payload or len(self.payload) >= _CAPTURE_BYTES:
+                return _HTTP_RESPONSE, True
+            return b"", False
+        return b"", len(self.payload) >= _CAPTURE_BYTES
+
+
+class Sinkhole:
+    def __init__(
+        self,
+        max_flows: int = _MAX_FLOWS,
+        flow_timeout_s: float = _FLOW_TIMEOUT_S,
+        sample_ring: int = _SAMPLE_RING,
+        max_pending: int = _MAX_PENDING,
+    ) -> None:
+        self.max_flows = max_flows
+        self.flow_timeout_s = flow_timeout_s
+        self.max_pending = max_pending
+        self.samples: deque[dict] = deque(maxlen=sample_ring)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._incoming: deque[_Flow] = deque()
+        self._flows: dict[int, _Flow] = {}
+        self._pending: dict[tuple[int, str, int], dict] = {}
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="tunnel-sinkhole")
+        self._thread.start()
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return len(self._flows) + len(self._incoming) < self.max_flows
+
+    def open(
+        self,
+        channel: paramiko.Channel,
+        session_id: str,
+        source_ip: str,
+        destination: tuple[str, int],
+        touch: Callable[[int, str], None] | None = None,
+    ) -> None:
+        flow = _Flow(channel, session_id, source_ip, destination[0], destination[1], touch)
+        with self._lock:
+            full = len(self._flows) + len(self._incoming) >= self.max_flows
+            if not full:
+                self._incoming.append(flow)
+        if full:
+            self._finish(flow, "capacity")
+            return
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def _loop(self) -> None:
+        next_expiry = 0.0
+        while True:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.data is None:
+                    self._accept_incoming()
+                else:
+                    self._read(key.data)
+            now = time.time()
+            if now >= next_expiry:
+                next_expiry = now + 1.0
+                with self._lock:
+                    expired = [f for f in self._flows.values() if now - f.last_io > self.flow_timeout_s]
+                for flow in expired:
+                    self._finish(flow, "timeout")
+
+    def _accept_incoming(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            with self._lock:
+                if not self._incoming:
+                    return
+                flow = self._incoming.popleft()
+                try:
+                    flow.channel.setblocking(False)
+                    flow.fd = flow.channel.fileno()
+                    self._selector.register(flow.fd, selectors.EVENT_READ, flow)
+                    self._flows[flow.fd] = flow
+                except Exception:
+                    flow.fd = None
+            if flow.fd is None:
+                self._finish(flow, "error")
+                continue
+            if flow.smtp is not None:
+                self._send(flow, flow.smtp.greeting())
+
+    def _read(self, flow: _Flow) -> None:
+        try:
+            data = flow.channel.recv(4096)
+        except socket.timeout:
+            return
+        except Exception:
+            self._finish(flow, "error")
+            return
+        if not data:
+            self._finish(flow, "eof")
+            return
+        if flow.touch is not None:
+            flow.touch(len(data), "input")
+        reply, close = flow.feed(data)
+        if reply:
+            self._send(flow, reply)
+        if close:
+            self._finish(flow, "sinkholed")
+
+    def _send(self, flow: _Flow, data: bytes) -> None:
+        try:
+            sent = flow.channel.send(data)
+        except Exception:
+            return
+        if flow.touch is not None:
+            flow.touch(sent, "output")
+
+    def _finish(self, flow: _Flow, reason: str) -> None:
+        with self._lock:
+            removed = self._flows.pop(flow.fd, None) is not None
+        if removed:
+            self._selector.unregister(flow.fd)
+        try:
+            flow.channel.close()
+        except Exception:
+            pass
+        self.record(flow, reason)
+
+    def record(self, flow: _Flow, reason: str) -> None:
+        key = (int(flow.opened) // 60, flow.host, flow.port)
+        with self._lock:
+            if flow.payload:
+                self.samples.append({
+                    "session_id": flow.session_id,
+                    "source_ip": flow.source_ip,
+                    "dest_host": flow.host,
+                    "dest_port": flow.port,
+                    "protocol": flow.protocol,
+                    "opened_at": datetime.fromtimestamp(flow.opened, timezone.utc),
+                    "bytes_in": flow.bytes_in,
+                    "payload": bytes(flow.payload),
+                    "end_reason": reason,
+                })
+            entry = self._pending.get(key)
+            if entry is None:
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    return
+                entry = self._pending[key] = {
+                    "dest_host": flow.host,
+                    "dest_port": flow.port,
+                    "minute": datetime.fromtimestamp(key[0] * 60, timezone.utc),
+                    "flows": 0,
+                    "bytes_in": 0,
+                    "protocols": {},
+                    "end_reasons": {},
+                    "source_ips": set(),
+                    "session_ids": set(),
+                    "first_seen": flow.opened,
+                    "last_seen": flow.last_io,
+                }
+            entry["flows"] += 1
+            entry["bytes_in"] += flow.bytes_in
+            entry["protocols"][flow.protocol] = entry["protocols"].get(flow.protocol, 0) + 1
+            entry["end_reasons"][reason] = entry["end_reasons"].get(reason, 0) + 1
+            if len(entry["source_ips"]) < _MAX_SOURCES:
+                entry["source_ips"].add(flow.source_ip)
+            if len(entry["session_ids"]) < _MAX_SOURCES:
+                entry["session_ids"].add(flow.session_id)
+            entry["first_seen"] = min(entry["first_seen"], flow.opened)
+            entry["last_seen"] = max(entry["last_seen"], flow.last_io)
+
+    def take(self, final: bool = False) -> tuple[list[dict], list[dict], int]:
+        current = int(time.time()) // 60
+        with self._lock:
+            if final or len(self._pending) >= self.max_pending:
+                taken, self._pending = self._pending, {}
+            else:
+                taken = {k: v for k, v in self._pending.items() if k[0] < current}
+                for k in taken:
+                    del self._pending[k]
+            dropped, self.dropped = self.dropped, 0
+            samples = list(self.samples)
+            self.samples.clear()
+        return list(taken.values()), samples, dropped
+
+
+def _update(entry: dict) -> UpdateOne:
+    return UpdateOne(
+        {"dest_host": entry["dest_host"], "dest_port": entry["dest_port"], "minute": entry["minute"]},
+        {
+            "$inc": {
+                "flows": entry["flows"],
+                "bytes_in": entry["bytes_in"],
+                **{f"protocols.{k}": v for k, v in entry["protocols"].items()},
+                **{f"end_reasons.{k}": v for k, v in entry["end_reasons"].items()},
+            },
+            "$addToSet": {
+                "source_ips": {"$each": sorted(entry["source_ips"])},
+                "session_ids": {"$each": sorted(entry["session_ids"])},
+            },
+            "$min": {"first_seen": datetime.fromtimestamp(entry["first_seen"], timezone.utc)},
+            "$max": {"last_seen": datetime.fromtimestamp(entry["last_seen"], timezone.utc)},
+        },
+        upsert=True,
+    )
+
+
+_sinkhole: Sinkhole | None = None
+
+
+def enabled() -> bool:
+    return _sinkhole is not None
+
+
+def has_capacity() -> bool:
+    return _sinkhole is not None and _sinkhole.has_capacity()
+
+
+def open_flow(
+    channel: paramiko.Channel,
+    session_id: str,
+    source_ip: str,
+    destination: tuple[str, int],
+    touch: Callable[[int, str], None] | None = None,
+) -> None:
+    if _sinkhole is None:
+        channel.close()
+        return
+    _sinkhole.open(channel, session_id, source_ip, destination, touch)
+
+
+async def flush(final: bool = False) -> int:
+    if _sinkhole is None:
+        return 0
+    entries, samples, dropped = _sinkhole.take(final)
+    if dropped:
+        log.warning(f"Tunnel sinkhole dropped {dropped} flow records (pending buffer full)")
+    db = get_db()
+    if entries:
+        await db.tunnel_flows.bulk_write([_update(e) for e in entries], ordered=False)
+    if samples:
+        await db.tunnel_samples.insert_many(samples, ordered=False)
+    if entries or samples:
+        log.debug(f"Tunnel sinkhole flushed {len(entries)} destination records, {len(samples)} samples")
+    return len(entries)
+
+
+async def _run_forever() -> None:
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL_S)
+        try:
+            await flush()
+        except Exception:
+            log.exception("Tunnel sinkhole flush failed")
+
+
+async def ensure_indexes() -> None:
+    db = get_db()
+    await db.tunnel_flows.create_index([("dest_host", 1), ("dest_port", 1), ("minute", 1)], unique=True)
+    await db.tunnel_flows.create_index([("minute", -1)])
+    await db.tunnel_flows.create_index([("dest_port", 1), ("minute", -1)])
+    options = await db.tunnel_samples.options()
+    if not options.get("capped"):
+        size = _SAMPLE_RING * (_CAPTURE_BYTES + _SAMPLE_OVERHEAD_BYTES)
+        if "tunnel_samples" in await db.list_collection_names():
+            await db.command("convertToCapped", "tunnel_samples", size=size)
+        else:
+            await db.create_collection("tunnel_samples", capped=True, size=size, max=_SAMPLE_RING)
+    await db.tunnel_samples.create_index([("opened_at", -1)])
+    await db.tunnel_samples.create_index([("session_id", 1)])
+
+
+def init(enabled: bool = _ENABLED) -> None:
+    global _sinkhole
+    if not enabled:
+        return
+    _sinkhole = Sinkhole()
+    loop = get_loop()
+    asyncio.run_coroutine_threadsafe(ensure_indexes(), loop).result(timeout=10)
+    asyncio.run_coroutine_threadsafe(_run_forever(), loop)
+    log.info(f"Tunnel sinkhole enabled (capture {_CAPTURE_BYTES}B/flow, max {_MAX_FLOWS} open flows)")
+
+
+def shutdown() -> None:
+    if _sinkhole is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(flush(final=True), get_loop()).result(timeout=5)
+    except Exception:
+        log.exception("Final tunnel sinkhole flush failed")
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+
+class _Entry:
+    def __init__(self, key: tuple[str, str]) -> None:
+        self.key = key
+        self.handle: str | None = None
+        self.ready = threading.Event()
+        self.refs = 0
+        self.sessions: list[str] = []
+        self.idle_since: float | None = None
+
+
+class AffinityPool:
+    def __init__(self, window_s: float, destroy: Callable[[str], None]) -> None:
+        self.window_s = window_s
+        self._destroy = destroy
+        self._lock = threading.Lock()
+        self._by_key: dict[tuple[str, str], _Entry] = {}
+        self._by_handle: dict[str, _Entry] = {}
+
+    def acquire(self, key: tuple[str, str], session_id: str, provision: Callable[[], str]) -> tuple[str, bool]:
+        with self._lock:
+            entry = self._by_key.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._by_key[key] = _Entry(key)
+            entry.refs += 1
+            entry.idle_since = None
+            entry.sessions.append(session_id)
+
+        if not owner:
+            entry.ready.wait()
+            if entry.handle is not None:
+                log.info(f"[session:{session_id[:8]}] reattached to {entry.handle[:12]} (refs={entry.refs})")
+                return entry.handle, True
+            return self.acquire(key, session_id, provision)
+
+        try:
+            entry.handle = provision()
+        except Exception:
+            with self._lock:
+                self._by_key.pop(key, None)
+            raise
+        finally:
+            entry.ready.set()
+        with self._lock:
+            self._by_handle[entry.handle] = entry
+        return entry.handle, False
+
+    def sessions(self, handle: str) -> list[str]:
+        with self._lock:
+            entry = self._by_handle.get(handle)
+            return list(entry.sessions) if entry is not None else []
+
+    def release(self, handle: str) -> bool:
+        with self._lock:
+            entry = self._by_handle.get(handle)
+            if entry is None:
+                return False
+            entry.refs -= 1
+            if entry.refs > 0:
+                return True
+            if self.window_s <= 0:
+                self._evict(entry)
+            else:
+                entry.idle_since = time.monotonic()
+                timer = threading.Timer(self.window_s, self._expire, args=(entry,))
+                timer.daemon = True
+                timer.start()
+                return True
+        self._destroy(handle)
+        return True
+
+    def _expire(self, entry: _Entry) -> None:
+        with self._lock:
+            if entry.refs > 0 or entry.idle_since is None:
+                return
+            if time.monotonic() - entry.idle_since < self.window_s - 0.01:
+                return
+            if not self._evict(entry):
+                return
+        log.info(f"Affinity window expired for {entry.key[0]} — destroying {entry.handle[:12]}")
+        self._destroy(entry.handle)
+
+    def _evict(self, entry: _Entry) -> bool:
+        if self._by_handle.get(entry.handle) is not entry:
+            return False
+        del self._by_handle[entry.handle]
+        if self._by_key.get(entry.key) is entry:
+            del self._by_key[entry.key]
+        return True
+
+    def evict(self, handle: str) -> None:
+        with self._lock:
+            entry = self._by_handle.get(handle)
+            if entry is not None:
+                self._evict(entry)
@@ -0,0 +1,56 @@
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Protocol
+
+from proxy.tracing import SessionTrace
+
+
+class ExecStream(Protocol):
+    def sendall(self, data: bytes) -> None: ...
+
+    def recv(self, size: int) -> bytes: ...
+
+    def close(self) -> None: ...
+
+
+class SessionBackend(ABC):
+    name = "base"
+    in_process = False
+
+    def init(self) -> None:
+        pass
+
+    @abstractmethod
+    def provision(self, session_id: str, limits=None) -> str:
+        ...
+
+    @abstractmethod
+    def open_exec(
+        self,
+        handle: str,
+        command: list[str],
+        tty: bool = True,
+        width: int = 80,
+        height: int = 24,
+        trace: SessionTrace | None = None,
+    ) -> tuple[str, ExecStream]:
+        ...
+
+    @abstractmethod
+    def resize(self, exec_id: str, width: int, height: int) -> None:
+        ...
+
+    @abstractmethod
+    def destroy(self, handle: str) -> None:
+        ...
+
+    @abstractmethod
+    def put_archive(self, handle: str, path: str, data) -> None:
+        ...
+
+    def describe(self, handle: str) -> dict:
+        return {"backend": self.name}
+
+
+def span(trace: SessionTrace | None, stage: str):
+    return trace.span(stage) if trace is not None else nullcontext()
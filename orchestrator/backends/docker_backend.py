@@ -0,0 +1,129 @@
+import logging
+import os
+
+import docker
+import docker.errors
+
+from orchestrator.backends.base import SessionBackend, span
+from proxy.tracing import SessionTrace
+
+log = logging.getLogger(__name__)
+
+_HONEYPOT_IMAGE = os.getenv("HONEYPOT_IMAGE", "honeyshell-ubuntu")
+_HONEYPOT_NETWORK = os.getenv("HONEYPOT_NETWORK", "honeypot-net")
+_CPU_LIMIT = float(os.getenv("CONTAINER_CPU_LIMIT", "0.5"))
+_MEMORY_LIMIT = os.getenv("CONTAINER_MEMORY_LIMIT", "256m")
+_FAKE_HOSTNAME = os.getenv("HONEYPOT_HOSTNAME", "web-prod-01")
+_FAKE_HOSTS = {
+    "db-internal": "10.0.1.10",
+    "redis-internal": "10.0.1.11",
+    "api-internal": "10.0.1.12",
+}
+
+
+class _DockerStream:
+    def __init__(self, sock) -> None:
+        self._wrapper = sock
+        self._sock = sock._sock
+        self._sock.setblocking(True)
+
+    def sendall(self, data: bytes) -> None:
+        self._sock.sendall(data)
+
+    def recv(self, size: int) -> bytes:
+        return self._sock.recv(size)
+
+    def close(self) -> None:
+        self._wrapper.close()
+
+
+class DockerBackend(SessionBackend):
+    name = "docker"
+
+    def __init__(self) -> None:
+        self._client: docker.DockerClient | None = None
+
+    def init(self) -> None:
+        self._client = docker.from_env()
+        self._ensure_network()
+        log.info("Docker client initialised")
+
+    def _ensure_network(self) -> None:
+        try:
+            self._client.networks.get(_HONEYPOT_NETWORK)
+        except docker.errors.NotFound:
+            self._client.networks.create(
+                _HONEYPOT_NETWORK,
+                driver="bridge",
+                internal=True,
+            )
+            log.info(f"Created isolated network {_HONEYPOT_NETWORK!r}")
+
+    def provision(self, session_id: str, limits=None) -> str:
+        cpu = limits.cpu if limits is not None else _CPU_LIMIT
+        memory = limits.memory if limits is not None else _MEMORY_LIMIT
+        container = self._client.containers.run(
+            _HONEYPOT_IMAGE,
+            command="sleep infinity",
+            detach=True,
+            stdin_open=True,
+            name=f"honeyshell-{session_id[:8]}",
+            hostname=_FAKE_HOSTNAME,
+            extra_hosts=_FAKE_HOSTS,
+            network=_HONEYPOT_NETWORK,
+            cpu_period=100000,
+            cpu_quota=int(cpu * 100000),
+            mem_limit=memory,
+            memswap_limit=memory,
+            privileged=False,
+            labels={"honeyshell.session_id": session_id},
+        )
+        log.info(f"[session:{session_id[:8]}] container {container.short_id} started")
+        return container.id
+
+    def open_exec(
+        self,
+        handle: str,
+        command: list[str],
+        tty: bool = True,
+        width: int = 80,
+        height: int = 24,
+        trace: SessionTrace | None = None,
+    ) -> tuple[str, _DockerStream]:
+        with span(trace, "exec_create"):
+            exec_id = self._client.api.exec_create(
+                handle,
+                command,
+                stdin=True,
+                tty=tty,
+                environment={"TERM": "xterm-256color", "LANG": "en_US.UTF-8", "HOME": "/root"},
+            )["Id"]
+
+        with span(trace, "exec_start"):
+            sock = self._client.api.exec_start(exec_id, socket=True, tty=tty)
+
+        if tty:
+            with span(trace, "exec_resize"):
+                self._client.api.exec_resize(exec_id, height=height, width=width)
+
+        return exec_id, _DockerStream(sock)
+
+    def resize(self, exec_id: str, width: int, height: int) -> None:
+        try:
+            self._client.api.exec_resize(exec_id, height=height, width=width)
+        except Exception:
+            pass
+
+    def put_archive(self, handle: str, path: str, data) -> None:
+        self._client.api.put_archive(handle, path, data)
+
+    def destroy(self, handle: str) -> None:
+        try:
+            c = self._client.containers.get(handle)
+            c.stop(timeout=5)
+            c.remove(force=True)
+            log.info(f"Container {handle[:12]} destroyed")
+        except docker.errors.NotFound:
+            pass
+        except Exception:
+            log.exception(f"Failed to destroy container {handle[:12]}")
@@ -0,0 +1,237 @@
+import itertools
+import logging
+import os
+import shlex
+import socket
+import threading
+import uuid
+from typing import Callable
+
+from orchestrator.backends.base import SessionBackend, span
+from orchestrator.emulator import EmulatedShell, Escalate, VirtualFS
+from orchestrator.scheduler import AdmissionRejected, Grant
+from proxy.tracing import SessionTrace
+
+log = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 4096
+_MIRROR_MAX_BYTES = int(os.getenv("EMULATOR_MIRROR_MAX_BYTES", str(4 << 20)))
+_FORK_FAILED = b"-bash: fork: retry: Resource temporarily unavailable\r\n"
+
+
+class _Session:
+    def __init__(self, session_id: str, limits) -> None:
+        self.session_id = session_id
+        self.limits = limits
+        self.fs = VirtualFS()
+        self.lock = threading.Lock()
+        self.escalated: str | None = None
+        self.grant: Grant | None = None
+
+
+class EmulatedBackend(SessionBackend):
+    name = "emulated"
+    in_process = True
+
+    def __init__(
+        self,
+        fallback: SessionBackend,
+        admit: Callable[[bool], Grant] | None = None,
+        release: Callable[[Grant], None] | None = None,
+    ) -> None:
+        self._fallback = fallback
+        self._admit = admit
+        self._release = release
+        self._sessions: dict[str, _Session] = {}
+        self._execs: dict[str, str | None] = {}
+
+    def init(self) -> None:
+        self._fallback.init()
+        log.info(f"Emulated shell backend ready (escalates to {self._fallback.name!r})")
+
+    def provision(self, session_id: str, limits=None) -> str:
+        handle = f"emu-{uuid.uuid4().hex[:12]}"
+        self._sessions[handle] = _Session(session_id, limits)
+        return handle
+
+    def open_exec(
+        self,
+        handle: str,
+        command: list[str],
+        tty: bool = True,
+        width: int = 80,
+        height: int = 24,
+        trace: SessionTrace | None = None,
+    ):
+        session = self._sessions[handle]
+        exec_id = f"{handle}:{uuid.uuid4().hex[:8]}"
+        self._execs[exec_id] = None
+
+        with span(trace, "exec_start"):
+            ours, theirs = socket.socketpair()
+            threading.Thread(
+                target=self._serve,
+                args=(session, exec_id, theirs, command, tty, width, height),
+                daemon=True,
+                name=f"emu-{session.session_id[:8]}",
+            ).start()
+        return exec_id, ours
+
+    def _serve(
+        self,
+        session: _Session,
+        exec_id: str,
+        sock: socket.socket,
+        command: list[str],
+        tty: bool,
+        width: int,
+        height: int,
+    ) -> None:
+        try:
+            if session.escalated is not None:
+                self._pump(session, exec_id, sock, command, tty, width, height, b"")
+                return
+
+            if not tty:
+                shell = EmulatedShell(session.fs, sock.sendall)
+                try:
+                    output = shell.run(command[-1])
+                except Escalate:
+                    self._pump(session, exec_id, sock, command, tty, width, height, b"")
+                    return
+                sock.sendall(output)
+                return
+
+            shell = EmulatedShell(session.fs, sock.sendall)
+            sock.sendall(shell.prompt())
+            while not shell.exited:
+                data = sock.recv(_CHUNK_SIZE)
+                if not data:
+                    break
+                try:
+                    shell.feed(data)
+                except Escalate as exc:
+                    script = f"cd {shlex.quote(shell.cwd)} 2>/dev/null; eval {shlex.quote(exc.line)}; exec /bin/bash -i"
+                    self._pump(session, exec_id, sock, ["/bin/bash", "-c", script], tty, width, height, exc.remaining)
+                    return
+        except AdmissionRejected as exc:
+            log.warning(f"[session:{session.session_id[:8]}] escalation rejected — {exc}")
+            try:
+                sock.sendall(_FORK_FAILED)
+            except OSError:
+                pass
+        except OSError:
+            pass
+        except Exception:
+            log.exception(f"[session:{session.session_id[:8]}] emulated exec {exec_id} failed")
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _escalate(self, session: _Session, interactive: bool) -> str:
+        with session.lock:
+            if session.escalated is None:
+                grant = self._admit(interactive) if self._admit is not None else None
+                try:
+                    handle = self._fallback.provision(
+                        session.session_id, grant.limits if grant is not None else session.limits
+                    )
+                except Exception:
+                    if grant is not None:
+                        self._release(grant)
+                    raise
+                session.escalated = handle
+                session.grant = grant
+                if session.fs.dirty:
+                    self._fallback.put_archive(handle, "/", session.fs.to_tar())
+                log.info(f"[session:{session.session_id[:8]}] escalated to {self._fallback.name} {handle[:12]}")
+            return session.escalated
+
+    def _pump(
+        self,
+        session: _Session,
+        exec_id: str,
+        sock: socket.socket,
+        command: list[str],
+        tty: bool,
+        width: int,
+        height: int,
+        pending: bytes,
+    ) -> None:
+        handle = self._escalate(session, tty)
+        real_exec, stream = self._fallback.open_exec(handle, command, tty=tty, width=width, height=height)
+        self._execs[exec_id] = real_exec
+        if pending:
+            stream.sendall(pending)
+
+        def _inbound() -> None:
+            try:
+                while True:
+                    data = sock.recv(_CHUNK_SIZE)
+                    if not data:
+                        break
+                    stream.sendall(data)
+            except OSError:
+                pass
+            finally:
+                stream.close()
+
+        threading.Thread(target=_inbound, daemon=True, name=f"emu-in-{session.session_id[:8]}").start()
+        try:
+            while True:
+                data = stream.recv(_CHUNK_SIZE)
+                if not data:
+                    break
+                sock.sendall(data)
+        except OSError:
+            pass
+
+    def resize(self, exec_id: str, width: int, height: int) -> None:
+        real_exec = self._execs.get(exec_id)
+        if real_exec is not None:
+            self._fallback.resize(real_exec, width, height)
+
+    def put_archive(self, handle: str, path: str, data) -> None:
+        session = self._sessions[handle]
+        chunks = iter([data] if isinstance(data, bytes) else data)
+        with session.lock:
+            if session.escalated is None:
+                buffered: list[bytes] = []
+                size = 0
+                for chunk in chunks:
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    if size > _MIRROR_MAX_BYTES:
+                        break
+                else:
+                    session.fs.extract_tar(path, b"".join(buffered))
+                    return
+                data = itertools.chain(buffered, chunks)
+                log.info(f"[session:{session.session_id[:8]}] upload exceeds {_MIRROR_MAX_BYTES} bytes — escalating")
+        self._fallback.put_archive(self._escalate(session, False), path, data)
+
+    def describe(self, handle: str) -> dict:
+        session = self._sessions.get(handle)
+        info = {"backend": self.name}
+        if session is not None and session.escalated is not None:
+            info["escalated_to"] = {"backend": self._fallback.name, "container_id": session.escalated}
+            if session.grant is not None:
+                info["escalated_to"]["admission"] = session.grant.to_doc()
+        return info
+
+    def destroy(self, handle: str) -> None:
+        session = self._sessions.pop(handle, None)
+        if session is None:
+            return
+        for exec_id in [e for e in self._execs if e.startswith(handle + ":")]:
+            self._execs.pop(exec_id, None)
+        if session.escalated is None:
+            return
+        try:
+            self._fallback.destroy(session.escalated)
+        finally:
+            if session.grant is not None:
+                self._release(session.grant)
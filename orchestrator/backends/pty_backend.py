@@ -0,0 +1,260 @@
+import errno
+import fcntl
+import io
+import logging
+import os
+import pty
+import shlex
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import tarfile
+import termios
+import threading
+import uuid
+
+from orchestrator.backends.base import SessionBackend, span
+from proxy.tracing import SessionTrace
+
+log = logging.getLogger(__name__)
+
+_SANDBOX_DIR = os.getenv("PTY_SANDBOX_DIR", "/tmp/honeyshell-pty")
+_ISOLATION = os.getenv("PTY_SANDBOX_ISOLATION", "unshare")
+_ROOTFS = os.getenv("PTY_SANDBOX_ROOTFS", "")
+_FAKE_HOSTNAME = os.getenv("HONEYPOT_HOSTNAME", "web-prod-01")
+_PATH = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+
+class _PtyStream:
+    def __init__(self, fd: int) -> None:
+        self._fd = fd
+        self._lock = threading.Lock()
+        self._users = 0
+        self._closed = False
+
+    def _enter(self) -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._closed and self._users == 0:
+                self._release()
+
+    def _release(self) -> None:
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+    def sendall(self, data: bytes) -> None:
+        if not self._enter():
+            raise OSError(errno.EBADF, "stream closed")
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+        finally:
+            self._leave()
+
+    def recv(self, size: int) -> bytes:
+        if not self._enter():
+            return b""
+        try:
+            return os.read(self._fd, size)
+        except OSError:
+            return b""
+        finally:
+            self._leave()
+
+    def set_size(self, width: int, height: int) -> None:
+        if not self._enter():
+            return
+        try:
+            fcntl.ioctl(self._fd, termios.TIOCSWINSZ, struct.pack("HHHH", height, width, 0, 0))
+        except OSError:
+            pass
+        finally:
+            self._leave()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._users == 0:
+                self._release()
+
+
+class _Sandbox:
+    def __init__(self, session_id: str, root: str) -> None:
+        self.session_id = session_id
+        self.root = root
+        self.procs: dict[str, tuple[subprocess.Popen, _PtyStream | None]] = {}
+        self.keeper: subprocess.Popen | None = None
+        self.ns_pid: int | None = None
+
+    @property
+    def files(self) -> str:
+        return f"/proc/{self.ns_pid}/root" if self.ns_pid is not None else self.root
+
+
+class PtyBackend(SessionBackend):
+    name = "pty"
+
+    def __init__(self, isolation: str = _ISOLATION, rootfs: str = _ROOTFS) -> None:
+        self.isolation = isolation
+        self.rootfs = rootfs
+        self._lock = threading.Lock()
+        self._sandboxes: dict[str, _Sandbox] = {}
+        self._execs: dict[str, _Sandbox] = {}
+
+    def init(self) -> None:
+        if self.isolation != "none" and not self.rootfs:
+            raise RuntimeError(
+                "PTY_SANDBOX_ISOLATION=unshare requires PTY_SANDBOX_ROOTFS "
+                "— refusing to run sessions on the host filesystem"
+            )
+        os.makedirs(_SANDBOX_DIR, exist_ok=True)
+        if self.isolation == "none":
+            log.warning("PTY backend running without isolation — for testing only")
+        log.info(f"PTY sandbox backend initialised (isolation={self.isolation})")
+
+    def _start_namespace(self, sandbox: _Sandbox) -> None:
+        upper, work, merged = (os.path.join(sandbox.root, d) for d in ("upper", "work", "merged"))
+        for path in (upper, work, merged):
+            os.makedirs(path)
+        options = f"lowerdir={self.rootfs},upperdir={upper},workdir={work}"
+        script = (
+            f"mount -t overlay overlay -o {shlex.quote(options)} {shlex.quote(merged)}"
+            f" && mount -t proc proc {shlex.quote(merged)}/proc"
+            f" && {{ hostname {shlex.quote(_FAKE_HOSTNAME)} 2>/dev/null; echo ready;"
+            f" exec chroot {shlex.quote(merged)} sleep infinity; }}"
+        )
+        keeper = subprocess.Popen(
+            ["unshare", "--user", "--map-root-user", "--pid", "--fork", "--mount", "--net", "--uts", "--ipc",
+             "sh", "-c", script],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        status = keeper.stdout.readline()
+        keeper.stdout.close()
+        if status.strip() != b"ready":
+            keeper.kill()
+            keeper.wait()
+            raise RuntimeError(f"sandbox namespace setup failed: {status.decode(errors='replace').strip()}")
+        with open(f"/proc/{keeper.pid}/task/{keeper.pid}/children") as f:
+            sandbox.ns_pid = int(f.read().split()[0])
+        sandbox.keeper = keeper
+
+    def _wrap(self, sandbox: _Sandbox, command: list[str]) -> list[str]:
+        if sandbox.ns_pid is None:
+            return command
+        return [
+            "nsenter", "-t", str(sandbox.ns_pid), "--user", "--mount", "--pid", "--net", "--uts", "--ipc",
+            "--root", "--wd", "--", *command,
+        ]
+
+    def provision(self, session_id: str, limits=None) -> str:
+        handle = f"pty-{uuid.uuid4().hex[:12]}"
+        root = os.path.join(_SANDBOX_DIR, handle)
+        os.makedirs(root, mode=0o700)
+        sandbox = _Sandbox(session_id, root)
+        if self.isolation != "none":
+            try:
+                self._start_namespace(sandbox)
+            except Exception:
+                shutil.rmtree(root, ignore_errors=True)
+                raise
+        with self._lock:
+            self._sandboxes[handle] = sandbox
+        log.info(f"[session:{session_id[:8]}] sandbox {handle} provisioned")
+        return handle
+
+    def open_exec(
+        self,
+        handle: str,
+        command: list[str],
+        tty: bool = True,
+        width: int = 80,
+        height: int = 24,
+        trace: SessionTrace | None = None,
+    ):
+        sandbox = self._sandboxes[handle]
+        env = {
+            "TERM": "xterm-256color",
+            "LANG": "en_US.UTF-8",
+            "HOME": sandbox.root if sandbox.ns_pid is None else "/root",
+            "PATH": _PATH,
+        }
+        cwd = sandbox.root if sandbox.ns_pid is None else None
+
+        with span(trace, "exec_start"):
+            if tty:
+                master, slave = pty.openpty()
+                pty_stream = _PtyStream(master)
+                pty_stream.set_size(width, height)
+                proc = subprocess.Popen(
+                    self._wrap(sandbox, command), stdin=slave, stdout=slave, stderr=slave,
+                    cwd=cwd, env=env, start_new_session=True, close_fds=True,
+                )
+                os.close(slave)
+                stream = pty_stream
+            else:
+                ours, theirs = socket.socketpair()
+                proc = subprocess.Popen(
+                    self._wrap(sandbox, command), stdin=theirs, stdout=theirs, stderr=theirs,
+                    cwd=cwd, env=env, start_new_session=True, close_fds=True,
+                )
+                theirs.close()
+                stream, pty_stream = ours, None
+
+        exec_id = f"{handle}:{proc.pid}"
+        with self._lock:
+            sandbox.procs[exec_id] = (proc, pty_stream)
+            self._execs[exec_id] = sandbox
+        return exec_id, stream
+
+    def resize(self, exec_id: str, width: int, height: int) -> None:
+        sandbox = self._execs.get(exec_id)
+        if sandbox is None:
+            return
+        _, stream = sandbox.procs[exec_id]
+        if stream is not None:
+            stream.set_size(width, height)
+
+    def put_archive(self, handle: str, path: str, data) -> None:
+        sandbox = self._sandboxes[handle]
+        raw = data if isinstance(data, bytes) else b"".join(data)
+        dest = os.path.join(sandbox.files, path.lstrip("/"))
+        os.makedirs(dest, exist_ok=True)
+        with tarfile.open(fileobj=io.BytesIO(raw), mode="r") as tar:
+            tar.extractall(dest, filter="data")
+
+    def destroy(self, handle: str) -> None:
+        with self._lock:
+            sandbox = self._sandboxes.pop(handle, None)
+            if sandbox is None:
+                return
+            for exec_id in sandbox.procs:
+                self._execs.pop(exec_id, None)
+
+        for proc, _ in sandbox.procs.values():
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait(timeout=5)
+            except (ProcessLookupError, PermissionError, subprocess.TimeoutExpired):
+                pass
+        if sandbox.keeper is not None:
+            try:
+                os.killpg(sandbox.keeper.pid, signal.SIGKILL)
+                sandbox.keeper.wait(timeout=5)
+            except (ProcessLookupError, PermissionError, subprocess.TimeoutExpired):
+                pass
+        shutil.rmtree(sandbox.root, ignore_errors=True)
+        log.info(f"Sandbox {handle} destroyed")
@@ -0,0 +1,151 @@
+import io
+import logging
+import os
+import re
+import string
+import tarfile
+import time
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+_TEMPLATE_DIR = os.getenv("DECOY_TEMPLATE_DIR", os.path.join(os.path.dirname(__file__), "decoy_templates"))
+_CANARY_BASE_URL = os.getenv("CANARY_BASE_URL", "")
+_HOSTNAME = os.getenv("HONEYPOT_HOSTNAME", "web-prod-01")
+_AGE_DAYS = int(os.getenv("DECOY_AGE_DAYS", "90"))
+
+_PLACEHOLDER_RE = re.compile(rb"\{\{(\w+)(?::(\w+))?\}\}")
+_OWNERS = {"home/deploy": 1001, "home/ubuntu": 1000}
+
+_UPPER_DIGITS = (string.ascii_uppercase + string.digits).encode()
+_ALNUM = (string.ascii_letters + string.digits).encode()
+_BASE64 = (string.ascii_letters + string.digits + "+/").encode()
+_HEX = b"0123456789abcdef"
+_LOWER_DIGITS = (string.ascii_lowercase + string.digits).encode()
+_ED25519_PREFIX = b"b3BlbnNzaC1rZXktdjEAAAAABG5vbmUAAAAEbm9uZQAAAAAAAAABAAAAMwAAAAtzc2gtZWQyNTUxOQAAACD"
+
+
+def _random(alphabet: bytes, length: int) -> bytes:
+    return bytes(alphabet[b % len(alphabet)] for b in os.urandom(length))
+
+
+def _ssh_key(lines: int = 5, width: int = 70) -> bytes:
+    body = _ED25519_PREFIX + _random(_BASE64, lines * width - len(_ED25519_PREFIX))
+    return b"\n".join(body[i:i + width] for i in range(0, len(body), width))
+
+
+_KINDS: dict[str, tuple[int, Callable[[], bytes]]] = {
+    "aws_key_id": (20, lambda: b"AKIA" + _random(_UPPER_DIGITS, 16)),
+    "aws_secret": (40, lambda: _random(_BASE64, 40)),
+    "password": (16, lambda: _random(_ALNUM, 16)),
+    "token": (32, lambda: _random(_HEX, 32)),
+    "github_token": (40, lambda: b"ghp_" + _random(_ALNUM, 36)),
+    "url_token": (24, lambda: _random(_LOWER_DIGITS, 24)),
+    "ssh_key": (5 * 70 + 4, _ssh_key),
+}
+
+
+class DecoyLayer:
+    def __init__(
+        self,
+        template_dir: str = _TEMPLATE_DIR,
+        static: dict[str, str] | None = None,
+        age_days: int = _AGE_DAYS,
+    ) -> None:
+        static = static if static is not None else {"hostname": _HOSTNAME, "canary_url": _CANARY_BASE_URL}
+        if not static.get("canary_url"):
+            log.warning("CANARY_BASE_URL not set — decoy lines that embed a canary URL are omitted")
+        mtime = int(time.time()) - age_days * 86400
+        self._slots: list[tuple[int, tuple[str, str]]] = []
+        self._paths: dict[tuple[str, str], list[str]] = {}
+        self._archive = self._render(template_dir, static, mtime)
+        log.info(
+            f"Decoy layer rendered — {len(self._archive) >> 10} KiB, "
+            f"{len(self._paths)} tokens at {len(self._slots)} offsets"
+        )
+
+    def _render(self, template_dir: str, static: dict[str, str], mtime: int) -> bytes:
+        files: list[tuple[str, bytes, list[tuple[int, tuple[str, str]]]]] = []
+        dirs: set[str] = set()
+        for root, _, names in os.walk(template_dir):
+            for name in sorted(names):
+                path = os.path.relpath(os.path.join(root, name), template_dir).replace(os.sep, "/")
+                with open(os.path.join(root, name), "rb") as f:
+                    content, slots = self._fill(f.read(), static)
+                files.append((path, content, slots))
+                parent = os.path.dirname(path)
+                while parent:
+                    if os.path.basename(parent).startswith("."):
+                        dirs.add(parent)
+                    parent = os.path.dirname(parent)
+                for _, key in slots:
+                    self._paths.setdefault(key, [])
+                    if "/" + path not in self._paths[key]:
+                        self._paths[key].append("/" + path)
+        files.sort()
+
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w", format=tarfile.GNU_FORMAT) as tar:
+            for path in sorted(dirs):
+                info = self._info(path, mtime)
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o700
+                tar.addfile(info)
+            for path, content, _ in files:
+                info = self._info(path, mtime)
+                info.size = len(content)
+                info.mode = 0o600 if "/." in "/" + path else 0o644
+                tar.addfile(info, io.BytesIO(content))
+        archive = buf.getvalue()
+
+        offsets = {}
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            for member in tar.getmembers():
+                offsets[member.name] = member.offset_data
+        for path, _, slots in files:
+            self._slots.extend((offsets[path] + pos, key) for pos, key in slots)
+        return archive
+
+    @staticmethod
+    def _info(path: str, mtime: int) -> tarfile.TarInfo:
+        info = tarfile.TarInfo(path)
+        info.mtime = mtime
+        owner = next((uid for prefix, uid in _OWNERS.items() if path == prefix or path.startswith(prefix + "/")), 0)
+        info.uid = info.gid = owner
+        return info
+
+    @staticmethod
+    def _fill(template: bytes, static: dict[str, str]) -> tuple[bytes, list[tuple[int, tuple[str, str]]]]:
+        unset = [b"{{%s}}" % name.encode() for name, value in static.items() if not value]
+        if unset:
+            template = b"".join(
+                line for line in template.splitlines(keepends=True) if not any(p in line for p in unset)
+            )
+        out = bytearray()
+        slots: list[tuple[int, tuple[str, str]]] = []
+        last = 0
+        for match in _PLACEHOLDER_RE.finditer(template):
+            out += template[last:match.start()]
+            last = match.end()
+            name, label = match.group(1).decode(), (match.group(2) or b"").decode()
+            if name in _KINDS:
+                slots.append((len(out), (name, label)))
+                out += b"\0" * _KINDS[name][0]
+            elif name in static:
+                out += static[name].encode()
+            else:
+                raise ValueError(f"Unknown decoy placeholder {match.group(0).decode()!r}")
+        out += template[last:]
+        return bytes(out), slots
+
+    def issue(self) -> tuple[bytes, list[dict]]:
+        values = {key: _KINDS[key[0]][1]() for key in self._paths}
+        archive = bytearray(self._archive)
+        for offset, key in self._slots:
+            value = values[key]
+            archive[offset:offset + len(value)] = value
+        tokens = [
+            {"token": value.decode(), "kind": kind, "label": label, "paths": self._paths[(kind, label)]}
+            for (kind, label), value in values.items()
+        ]
+        return bytes(archive), tokens
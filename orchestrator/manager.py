@@ -1,66 +1,153 @@
+import heapq
 import logging
 import os
 import threading
+import time
 
-import docker
-import docker.errors
+from orchestrator import scheduler as admission
+from orchestrator.affinity import AffinityPool
+from orchestrator.backends.base import ExecStream, SessionBackend
+from orchestrator.decoys import DecoyLayer
+from orchestrator.upload_sync import UploadSync
+from proxy.tracing import SessionTrace
 
 log = logging.getLogger(__name__)
 
-_HONEYPOT_IMAGE = os.getenv("HONEYPOT_IMAGE", "honeyshell-ubuntu")
-_HONEYPOT_NETWORK = os.getenv("HONEYPOT_NETWORK", "honeypot-net")
-_CPU_LIMIT = float(os.getenv("CONTAINER_CPU_LIMIT", "0.5"))
-_MEMORY_LIMIT = os.getenv("CONTAINER_MEMORY_LIMIT", "256m")
+_BACKEND = os.getenv("SESSION_BACKEND", "docker")
+_ESCALATION_BACKEND = os.getenv("EMULATOR_ESCALATION_BACKEND", "docker")
 _TTL_MINUTES = int(os.getenv("CONTAINER_TTL_MINUTES", "30"))
-_FAKE_HOSTNAME = os.getenv("HONEYPOT_HOSTNAME", "web-prod-01")
-_FAKE_HOSTS = {
-    "db-internal": "10.0.1.10",
-    "redis-internal": "10.0.1.11",
-    "api-internal": "10.0.1.12",
-}
+_AFFINITY_WINDOW_S = float(os.getenv("AFFINITY_WINDOW_SECONDS", "0"))
+_SFTP_SYNC_INTERVAL_S = float(os.getenv("SFTP_SYNC_INTERVAL_S", "1"))
+_SFTP_SYNC_STREAM_BYTES = int(os.getenv("SFTP_SYNC_STREAM_BYTES", str(1 << 20)))
+_SFTP_SYNC_RETENTION_S = float(os.getenv("SFTP_SYNC_RETENTION_S", "3600"))
+_DECOYS_ENABLED = os.getenv("DECOYS_ENABLED", "1") == "1"
+
+_backend: SessionBackend | None = None
+_scheduler: admission.Scheduler | None = None
+_affinity: AffinityPool | None = None
+_uploads: UploadSync | None = None
+_decoys: DecoyLayer | None = None
+_decoy_tokens: dict[str, list[dict]] = {}
+_lock = threading.Lock()
+_alternates: dict[str, SessionBackend] = {}
+_handles: dict[str, tuple[SessionBackend, admission.Grant]] = {}
+_execs: dict[str, tuple[SessionBackend, str]] = {}
+_ttl_cond = threading.Condition()
+_ttl_heap: list[tuple[float, str, str]] = []
+_ttl_thread: threading.Thread | None = None
+
+
+def create_backend(name: str) -> SessionBackend:
+    if name == "docker":
+        from orchestrator.backends.docker_backend import DockerBackend
+        return DockerBackend()
+    if name == "pty":
+        from orchestrator.backends.pty_backend import PtyBackend
+        return PtyBackend()
+    if name == "emulated":
+        from orchestrator.backends.emulated_backend import EmulatedBackend
+        return EmulatedBackend(create_backend(_ESCALATION_BACKEND), _admit_escalation, _release_grant)
+    raise ValueError(f"Unknown SESSION_BACKEND {name!r}")
+
+
+def init(
+    backend: str | None = None,
+    scheduler: admission.Scheduler | None = None,
+    affinity_window_s: float = _AFFINITY_WINDOW_S,
+    decoys: bool = _DECOYS_ENABLED,
+) -> None:
+    global _backend, _scheduler, _affinity, _uploads, _decoys
+    _backend = create_backend(backend or _BACKEND)
+    _backend.init()
+    _scheduler = scheduler or admission.Scheduler()
+    if affinity_window_s > 0:
+        _affinity = AffinityPool(affinity_window_s, destroy_container)
+        log.info(f"Session affinity enabled ({affinity_window_s:.0f}s window)")
+    _uploads = UploadSync(put_archive, _SFTP_SYNC_INTERVAL_S, _SFTP_SYNC_STREAM_BYTES, _SFTP_SYNC_RETENTION_S)
+    _decoys = DecoyLayer() if decoys else None
+    log.info(
+        f"Session backend {_backend.name!r} ready "
+        f"(budget {_scheduler.cpu_budget:.1f} CPU / {_scheduler.memory_budget >> 20} MiB, "
+        f"fallback {_scheduler.fallback!r})"
+    )
+
+
+def _alternate(name: str) -> SessionBackend:
+    with _lock:
+        backend = _alternates.get(name)
+        if backend is None:
+            backend = _alternates[name] = create_backend(name)
+            backend.init()
+        return backend
+
+
+def create_session_container(
+    session_id: str,
+    interactive: bool = True,
+    source_ip: str | None = None,
+    username: str | None = None,
+) -> str:
+    if _affinity is not None and source_ip is not None:
+        handle, _ = _affinity.acquire(
+            (source_ip, username or ""),
+            session_id,
+            lambda: _provision(session_id, interactive),
+        )
+    else:
+        handle = _provision(session_id, interactive)
+    if _uploads is not None and source_ip is not None:
+        _uploads.attach((source_ip, username or ""), handle)
+    return handle
 
-_client: docker.DockerClient | None = None
 
+def _admit_escalation(interactive: bool) -> admission.Grant:
+    priority = admission.INTERACTIVE if interactive else admission.EXEC
+    return _scheduler.admit(priority, allow_backend=False)
 
-def init() -> None:
-    global _client
-    _client = docker.from_env()
-    _ensure_network()
-    log.info("Docker client initialised")
 
+def _release_grant(grant: admission.Grant) -> None:
+    _scheduler.release(grant)
 
-def _ensure_network() -> None:
+
+def _provision(session_id: str, interactive: bool) -> str:
+    if _backend.in_process:
+        grant = admission.Grant(admission.NO_LIMITS, "in_process")
+        backend = _backend
+    else:
+        grant = _scheduler.admit(admission.INTERACTIVE if interactive else admission.EXEC)
+        backend = _alternate(grant.backend) if grant.backend else _backend
     try:
-        _client.networks.get(_HONEYPOT_NETWORK)
-    except docker.errors.NotFound:
-        _client.networks.create(
-            _HONEYPOT_NETWORK,
-            driver="bridge",
-            internal=True,
-        )
-        log.info(f"Created isolated network {_HONEYPOT_NETWORK!r}")
-
-
-def create_session_container(session_id: str) -> str:
-    container = _client.containers.run(
-        _HONEYPOT_IMAGE,
-        command="sleep infinity",
-        detach=True,
-        stdin_open=True,
-        name=f"honeyshell-{session_id[:8]}",
-        hostname=_FAKE_HOSTNAME,
-        extra_hosts=_FAKE_HOSTS,
-        network=_HONEYPOT_NETWORK,
-        cpu_period=100000,
-        cpu_quota=int(_CPU_LIMIT * 100000),
-        mem_limit=_MEMORY_LIMIT,
-        memswap_limit=_MEMORY_LIMIT,
-        privileged=False,
-        labels={"honeyshell.session_id": session_id},
-    )
-    log.info(f"[session:{session_id[:8]}] container {container.short_id} started")
-    _schedule_auto_destruct(container.id, session_id)
-    return container.id
+        handle = backend.provision(session_id, None if grant.backend or backend.in_process else grant.limits)
+    except Exception:
+        _scheduler.release(grant)
+        raise
+    with _lock:
+        _handles[handle] = (backend, grant)
+    if _decoys is not None:
+        _inject_decoys(backend, handle, session_id)
+    log.info(f"[session:{session_id[:8]}] admission {grant.outcome} after {grant.wait_ms:.0f}ms")
+    _schedule_auto_destruct(handle, session_id)
+    return handle
+
+
+def _inject_decoys(backend: SessionBackend, handle: str, session_id: str) -> None:
+    archive, tokens = _decoys.issue()
+    try:
+        backend.put_archive(handle, "/", archive)
+    except Exception:
+        log.exception(f"[session:{session_id[:8]}] decoy injection failed")
+        return
+    with _lock:
+        _decoy_tokens[handle] = tokens
+
+
+def decoy_tokens(container_id: str) -> list[dict]:
+    return _decoy_tokens.get(container_id, [])
+
+
+def _backend_for(container_id: str) -> SessionBackend:
+    entry = _handles.get(container_id)
+    return entry[0] if entry is not None else _backend
 
 
 def open_exec(
@@ -69,47 +156,87 @@ def open_exec(
     tty: bool = True,
     width: int = 80,
     height: int = 24,
-) -> tuple[str, object]:
-    exec_id = _client.api.exec_create(
-        container_id,
-        command,
-        stdin=True,
-        tty=tty,
-        environment={"TERM": "xterm-256color", "LANG": "en_US.UTF-8", "HOME": "/root"},
-    )["Id"]
+    trace: SessionTrace | None = None,
+) -> tuple[str, ExecStream]:
+    backend = _backend_for(container_id)
+    exec_id, stream = backend.open_exec(container_id, command, tty=tty, width=width, height=height, trace=trace)
+    _execs[exec_id] = (backend, container_id)
+    return exec_id, stream
 
-    sock = _client.api.exec_start(exec_id, socket=True, tty=tty)
 
-    if tty:
-        _client.api.exec_resize(exec_id, height=height, width=width)
+def resize_exec(exec_id: str, width: int, height: int) -> None:
+    entry = _execs.get(exec_id)
+    if entry is not None:
+        entry[0].resize(exec_id, width, height)
 
-    return exec_id, sock
 
+def put_archive(container_id: str, path: str, data) -> None:
+    _backend_for(container_id).put_archive(container_id, path, data)
 
-def resize_exec(exec_id: str, width: int, height: int) -> None:
-    try:
-        _client.api.exec_resize(exec_id, height=height, width=width)
-    except Exception:
-        pass
+
+def queue_upload(
+    source_ip: str, username: str | None, container_path: str, host_path: str, size: int | None = None
+) -> None:
+    if _uploads is not None:
+        _uploads.enqueue((source_ip, username or ""), container_path, host_path, size)
+
+
+def describe(container_id: str) -> dict:
+    info = _backend_for(container_id).describe(container_id)
+    entry = _handles.get(container_id)
+    if entry is not None:
+        info["admission"] = entry[1].to_doc()
+    if _affinity is not None:
+        info["affinity_sessions"] = _affinity.sessions(container_id)
+    if container_id in _decoy_tokens:
+        info["decoy_tokens"] = len(_decoy_tokens[container_id])
+    return info
+
+
+def release_container(container_id: str) -> None:
+    if _affinity is not None and _affinity.release(container_id):
+        return
+    destroy_container(container_id)
 
 
 def destroy_container(container_id: str) -> None:
+    if _affinity is not None:
+        _affinity.evict(container_id)
+    if _uploads is not None:
+        _uploads.detach(container_id)
+    with _lock:
+        entry = _handles.pop(container_id, None)
+        _decoy_tokens.pop(container_id, None)
+        for exec_id in [e for e, (_, c) in _execs.items() if c == container_id]:
+            del _execs[exec_id]
+    if entry is None:
+        return
+    backend, grant = entry
     try:
-        c = _client.containers.get(container_id)
-        c.stop(timeout=5)
-        c.remove(force=True)
-        log.info(f"Container {container_id[:12]} destroyed")
-    except docker.errors.NotFound:
-        pass
-    except Exception:
-        log.exception(f"Failed to destroy container {container_id[:12]}")
+        backend.destroy(container_id)
+    finally:
+        _scheduler.release(grant)
 
 
 def _schedule_auto_destruct(container_id: str, session_id: str) -> None:
-    def _run() -> None:
-        import time
-        time.sleep(_TTL_MINUTES * 60)
-        log.warning(f"[session:{session_id[:8]}] TTL expired — destroying container")
-        destroy_container(container_id)
-
-    threading.Thread(target=_run, daemon=True, name=f"ttl-{session_id[:8]}").start()
+    global _ttl_thread
+    with _ttl_cond:
+        heapq.heappush(_ttl_heap, (time.monotonic() + _TTL_MINUTES * 60, container_id, session_id))
+        _ttl_cond.notify()
+        if _ttl_thread is None:
+            _ttl_thread = threading.Thread(target=_expire_loop, daemon=True, name="container-ttl")
+            _ttl_thread.start()
+
+
+def _expire_loop() -> None:
+    while True:
+        with _ttl_cond:
+            while not _ttl_heap or _ttl_heap[0][0] > time.monotonic():
+                _ttl_cond.wait(_ttl_heap[0][0] - time.monotonic() if _ttl_heap else None)
+            _, container_id, session_id = heapq.heappop(_ttl_heap)
+        if container_id in _handles:
+            log.warning(f"[session:{session_id[:8]}] TTL expired — destroying container")
+            try:
+                destroy_container(container_id)
+            except Exception:
+                log.exception(f"[session:{session_id[:8]}] TTL destroy failed")
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+EXEC = 1
+
+_UNITS = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_memory(value: str) -> int:
+    value = value.strip().lower().rstrip("b")
+    if value and value[-1] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+_CPU_BUDGET = float(os.getenv("HOST_CPU_BUDGET", str(os.cpu_count() or 1)))
+_MEMORY_BUDGET = parse_memory(os.getenv("HOST_MEMORY_BUDGET", "4g"))
+_CPU_LIMIT = float(os.getenv("CONTAINER_CPU_LIMIT", "0.5"))
+_MEMORY_LIMIT = parse_memory(os.getenv("CONTAINER_MEMORY_LIMIT", "256m"))
+_LIGHT_CPU_LIMIT = float(os.getenv("ADMISSION_LIGHT_CPU_LIMIT", "0.1"))
+_LIGHT_MEMORY_LIMIT = parse_memory(os.getenv("ADMISSION_LIGHT_MEMORY_LIMIT", "64m"))
+_FALLBACK = os.getenv("ADMISSION_FALLBACK", "reject")
+_DEADLINES_S = {
+    INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_DEADLINE_S", "15")),
+    EXEC: float(os.getenv("ADMISSION_EXEC_DEADLINE_S", "3")),
+}
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class Limits:
+    def __init__(self, cpu: float, memory: int) -> None:
+        self.cpu = cpu
+        self.memory = memory
+
+
+DEFAULT_LIMITS = Limits(_CPU_LIMIT, _MEMORY_LIMIT)
+LIGHT_LIMITS = Limits(_LIGHT_CPU_LIMIT, _LIGHT_MEMORY_LIMIT)
+NO_LIMITS = Limits(0.0, 0)
+
+
+class Grant:
+    def __init__(self, limits: Limits, outcome: str, backend: str | None = None) -> None:
+        self.limits = limits
+        self.outcome = outcome
+        self.backend = backend
+        self.wait_ms = 0.0
+
+    def to_doc(self) -> dict:
+        doc = {"outcome": self.outcome, "wait_ms": round(self.wait_ms, 1)}
+        if self.backend is not None:
+            doc["backend"] = self.backend
+        return doc
+
+
+class _Waiter:
+    def __init__(self, limits: Limits) -> None:
+        self.limits = limits
+        self.event = threading.Event()
+        self.granted = False
+
+
+class Scheduler:
+    def __init__(
+        self,
+        cpu_budget: float = _CPU_BUDGET,
+        memory_budget: int = _MEMORY_BUDGET,
+        fallback: str = _FALLBACK,
+        deadlines_s: dict[int, float] | None = None,
+    ) -> None:
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.fallback = fallback
+        self.deadlines_s = deadlines_s or _DEADLINES_S
+        self.cpu_used = 0.0
+        self.memory_used = 0
+        self._lock = threading.Lock()
+        self._queue: list[tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+
+    def _fits(self, limits: Limits) -> bool:
+        return (
+            self.cpu_used + limits.cpu <= self.cpu_budget + 1e-9
+            and self.memory_used + limits.memory <= self.memory_budget
+        )
+
+    def _commit(self, limits: Limits) -> None:
+        self.cpu_used += limits.cpu
+        self.memory_used += limits.memory
+
+    def _dispatch(self) -> None:
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if not self._fits(waiter.limits):
+                return
+            heapq.heappop(self._queue)
+            self._commit(waiter.limits)
+            waiter.granted = True
+            waiter.event.set()
+
+    def admit(
+        self,
+        priority: int = INTERACTIVE,
+        limits: Limits = DEFAULT_LIMITS,
+        allow_backend: bool = True,
+    ) -> Grant:
+        start = time.monotonic()
+        with self._lock:
+            if not self._queue and self._fits(limits):
+                self._commit(limits)
+                return Grant(limits, "admitted")
+            waiter = _Waiter(limits)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            depth = len(self._queue)
+
+        log.info(f"Admission queued (priority={priority}, depth={depth})")
+        waiter.event.wait(self.deadlines_s[priority])
+
+        with self._lock:
+            if waiter.granted:
+                grant = Grant(limits, "queued")
+            else:
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                self._dispatch()
+                grant = self._degrade(allow_backend)
+        grant.wait_ms = (time.monotonic() - start) * 1000
+        return grant
+
+    def _degrade(self, allow_backend: bool) -> Grant:
+        if self.fallback == "light" and self._fits(LIGHT_LIMITS):
+            self._commit(LIGHT_LIMITS)
+            log.warning("Admission deadline passed — degrading to light profile")
+            return Grant(LIGHT_LIMITS, "light")
+        if allow_backend and self.fallback.startswith("backend:"):
+            backend = self.fallback.split(":", 1)[1]
+            log.warning(f"Admission deadline passed — degrading to backend {backend!r}")
+            return Grant(NO_LIMITS, "backend", backend)
+        raise AdmissionRejected(
+            f"host budget exhausted (cpu {self.cpu_used:.1f}/{self.cpu_budget:.1f}, "
+            f"memory {self.memory_used >> 20}/{self.memory_budget >> 20} MiB)"
+        )
+
+    def release(self, grant: Grant) -> None:
+        with self._lock:
+            self.cpu_used = max(0.0, self.cpu_used - grant.limits.cpu)
+            self.memory_used = max(0, self.memory_used - grant.limits.memory)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cpu_used": self.cpu_used,
+                "cpu_budget": self.cpu_budget,
+                "memory_used": self.memory_used,
+                "memory_budget": self.memory_budget,
+                "queued": len(self._queue),
+            }
@@ -0,0 +1,181 @@
+import io
+import logging
+import os
+import tarfile
+import threading
+import time
+from typing import Callable, Iterator
+
+log = logging.getLogger(__name__)
+
+_READ_CHUNK = 64 * 1024
+
+
+class _Upload:
+    def __init__(self, host_path: str, size: int | None = None) -> None:
+        self.host_path = host_path
+        self.size = size
+        self.queued_at = time.monotonic()
+
+
+def _tarinfo(container_path: str, st: os.stat_result) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(container_path.lstrip("/"))
+    info.size = st.st_size
+    info.mode = st.st_mode & 0o7777
+    info.mtime = int(st.st_mtime)
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    return info
+
+
+def stream_tar(host_path: str, info: tarfile.TarInfo) -> Iterator[bytes]:
+    yield info.tobuf(tarfile.GNU_FORMAT)
+    remaining = info.size
+    with open(host_path, "rb") as f:
+        while remaining:
+            chunk = f.read(min(_READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if remaining:
+        yield bytes(remaining)
+    yield bytes(-info.size % tarfile.BLOCKSIZE + 2 * tarfile.BLOCKSIZE)
+
+
+class UploadSync:
+    def __init__(
+        self,
+        put_archive: Callable[[str, str, object], None],
+        interval_s: float = 1.0,
+        stream_threshold: int = 1 << 20,
+        retention_s: float = 3600.0,
+    ) -> None:
+        self.interval_s = interval_s
+        self.stream_threshold = stream_threshold
+        self.retention_s = retention_s
+        self._put_archive = put_archive
+        self._cond = threading.Condition()
+        self._flush_locks: dict[str, threading.Lock] = {}
+        self._uploads: dict[tuple[str, str], dict[str, _Upload]] = {}
+        self._targets: dict[tuple[str, str], set[str]] = {}
+        self._sent: dict[str, dict[str, tuple[int, int, int]]] = {}
+        self._dirty = False
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="upload-sync")
+        self._thread.start()
+
+    def enqueue(self, key: tuple[str, str], container_path: str, host_path: str, size: int | None = None) -> None:
+        with self._cond:
+            self._uploads.setdefault(key, {})[container_path] = _Upload(host_path, size)
+            self._dirty = True
+            self._cond.notify()
+
+    def attach(self, key: tuple[str, str], container_id: str) -> None:
+        with self._cond:
+            self._targets.setdefault(key, set()).add(container_id)
+            self._sent.setdefault(container_id, {})
+            self._flush_locks.setdefault(container_id, threading.Lock())
+            uploads = dict(self._uploads.get(key, {}))
+        if uploads:
+            self._flush_container(container_id, uploads)
+
+    def detach(self, container_id: str) -> None:
+        with self._cond:
+            self._sent.pop(container_id, None)
+            self._flush_locks.pop(container_id, None)
+            for key in [k for k, targets in self._targets.items() if container_id in targets]:
+                self._targets[key].discard(container_id)
+                if not self._targets[key]:
+                    del self._targets[key]
+
+    def flush(self) -> int:
+        now = time.monotonic()
+        with self._cond:
+            self._dirty = False
+            for key in list(self._uploads):
+                uploads = self._uploads[key]
+                for path in [p for p, u in uploads.items() if now - u.queued_at > self.retention_s]:
+                    del uploads[path]
+                if not uploads:
+                    del self._uploads[key]
+            work = [
+                (container_id, dict(self._uploads[key]))
+                for key, targets in self._targets.items() if key in self._uploads
+                for container_id in targets
+            ]
+        return sum(self._flush_container(container_id, uploads) for container_id, uploads in work)
+
+    def _flush_container(self, container_id: str, uploads: dict[str, _Upload]) -> int:
+        with self._cond:
+            lock = self._flush_locks.get(container_id)
+        if lock is None:
+            return 0
+        with lock:
+            sent = self._sent.get(container_id)
+            if sent is None:
+                return 0
+            small: list[tuple[str, tarfile.TarInfo]] = []
+            large: list[tuple[str, tarfile.TarInfo]] = []
+            signatures: dict[str, tuple[int, int, int]] = {}
+            for container_path, upload in uploads.items():
+                try:
+                    st = os.stat(upload.host_path)
+                except OSError:
+                    continue
+                if upload.size is not None and st.st_size != upload.size:
+                    log.debug(f"Upload {container_path} is {st.st_size}B, expected {upload.size}B — deferring sync")
+                    continue
+                signature = (st.st_size, st.st_mtime_ns, st.st_mode)
+                if sent.get(container_path) == signature:
+                    continue
+                signatures[container_path] = signature
+                info = _tarinfo(container_path, st)
+                (large if st.st_size > self.stream_threshold else small).append((upload.host_path, info))
+
+            synced = 0
+            if small:
+                buf = io.BytesIO()
+                added: list[tarfile.TarInfo] = []
+                with tarfile.open(fileobj=buf, mode="w", format=tarfile.GNU_FORMAT) as tar:
+                    for host_path, info in small:
+                        try:
+                            with open(host_path, "rb") as f:
+                                content = f.read(self.stream_threshold + 1)
+                        except OSError:
+                            content = None
+                        if content is None or len(content) != info.size:
+                            signatures.pop("/" + info.name, None)
+                            continue
+                        tar.addfile(info, io.BytesIO(content))
+                        added.append(info)
+                if added and self._put(container_id, buf.getvalue(), len(added)):
+                    synced += len(added)
+                else:
+                    for info in added:
+                        signatures.pop("/" + info.name, None)
+            for host_path, info in large:
+                if self._put(container_id, stream_tar(host_path, info), 1):
+                    synced += 1
+                else:
+                    signatures.pop("/" + info.name, None)
+            sent.update(signatures)
+            return synced
+
+    def _put(self, container_id: str, data, count: int) -> bool:
+        try:
+            self._put_archive(container_id, "/", data)
+            return True
+        except Exception:
+            log.exception(f"Upload sync of {count} file(s) into {container_id[:12]} failed")
+            return False
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            time.sleep(self.interval_s)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Upload sync flush failed")
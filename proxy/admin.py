@@ -0,0 +1,124 @@
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import orchestrator.manager as manager
+from proxy import reaper
+
+log = logging.getLogger(__name__)
+
+_ENABLED = os.getenv("ADMIN_API_ENABLED", "0") == "1"
+_LISTEN_HOST = os.getenv("ADMIN_LISTEN_HOST", "127.0.0.1")
+_LISTEN_PORT = int(os.getenv("ADMIN_LISTEN_PORT", "2224"))
+_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+_server: ThreadingHTTPServer | None = None
+
+
+def list_sessions(stage: str | None = None, source_ip: str | None = None) -> dict:
+    now = time.monotonic()
+    docs = [
+        live.to_doc(now)
+        for live in reaper.sessions()
+        if (stage is None or live.stage == stage) and (source_ip is None or live.source_ip == source_ip)
+    ]
+    docs.sort(key=lambda d: d["started_at"])
+    return {"count": len(docs), "sessions": docs}
+
+
+def inspect(live: reaper.LiveSession) -> dict:
+    doc = live.to_doc()
+    if live.container_id is not None:
+        doc["container"] = manager.describe(live.container_id)
+    return doc
+
+
+def terminate(live: reaper.LiveSession) -> dict:
+    live.terminate("admin")
+    return live.to_doc()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "HoneyShellAdmin/1"
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["sessions"]:
+            query = parse_qs(url.query)
+            self._reply(200, list_sessions(
+                stage=query.get("stage", [None])[0],
+                source_ip=query.get("ip", [None])[0],
+            ))
+        elif len(parts) == 2 and parts[0] == "sessions":
+            live = self._find(parts[1])
+            if live is not None:
+                self._reply(200, inspect(live))
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        parts = [p for p in urlsplit(self.path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "sessions":
+            self._reply(404, {"error": "not found"})
+            return
+        live = self._find(parts[1])
+        if live is not None:
+            log.info(f"[session:{live.session_id[:8]}] termination requested via admin API")
+            self._reply(202, terminate(live))
+
+    def _find(self, prefix: str) -> reaper.LiveSession | None:
+        live = reaper.find(prefix)
+        if live is None:
+            self._reply(404, {"error": f"no unique live session matching {prefix!r}"})
+        return live
+
+    def _authorized(self) -> bool:
+        supplied = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if _TOKEN and hmac.compare_digest(supplied.encode(), _TOKEN.encode()):
+            return True
+        self._reply(401, {"error": "unauthorized"})
+        return False
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt: str, *args) -> None:
+        log.debug(f"{self.address_string()} {fmt % args}")
+
+
+def start(host: str = _LISTEN_HOST, port: int = _LISTEN_PORT) -> ThreadingHTTPServer | None:
+    global _server
+    if _server is not None or not _ENABLED:
+        return _server
+    if not _TOKEN:
+        log.error("ADMIN_API_ENABLED is set but ADMIN_TOKEN is empty — admin API not started")
+        return None
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True, name="admin-api").start()
+    log.info(f"Admin API listening on {host}:{_server.server_port}")
+    return _server
+
+
+def shutdown() -> None:
+    global _server
+    if _server is None:
+        return
+    _server.shutdown()
+    _server.server_close()
+    _server = None
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import paramiko
+
+import orchestrator.manager as manager
+import storage.activity as activity
+import storage.database as db
+from capture import tunnel_sinkhole
+from orchestrator.scheduler import AdmissionRejected
+from proxy import reaper
+from proxy.handlers.auth import HoneypotServerInterface
+from proxy.handlers.shell import bridge
+from storage import canaries
+from storage.models import end_session, record_channel, update_session_container
+
+log = logging.getLogger(__name__)
+
+_DB_WRITE_TIMEOUT_S = 5
+_ACCEPT_POLL_S = 0.5
+_CHANNEL_REQUEST_TIMEOUT_S = float(os.getenv("CHANNEL_REQUEST_TIMEOUT_S", "10"))
+_CHANNEL_LINGER_S = float(os.getenv("CHANNEL_LINGER_S", "2"))
+
+
+class ChannelDispatcher:
+    def __init__(
+        self,
+        transport: paramiko.Transport,
+        server_iface: HoneypotServerInterface,
+        session_id: str,
+        request_timeout_s: float = _CHANNEL_REQUEST_TIMEOUT_S,
+        linger_s: float = _CHANNEL_LINGER_S,
+    ) -> None:
+        self.transport = transport
+        self.server_iface = server_iface
+        self.session_id = session_id
+        self.request_timeout_s = request_timeout_s
+        self.linger_s = linger_s
+        self.live = reaper.register(
+            session_id, transport.close, source_ip=server_iface.client_ip, username=server_iface.username
+        )
+        self.end_reason: str | None = None
+        self._lock = threading.Lock()
+        self._open = 0
+        self._sftp = 0
+        self._requested = 0
+        self.tunnels = 0
+        self._tunnel_channels: list[paramiko.Channel] = []
+        self._idle_since = time.monotonic()
+        self._provision_lock = threading.Lock()
+        self._container_id: str | None = None
+        self._threads: list[threading.Thread] = []
+
+    def run(self, first: paramiko.Channel) -> None:
+        chan: paramiko.Channel | None = first
+        while True:
+            if chan is not None and self._tunnel(chan):
+                chan = None
+            if chan is not None:
+                with self._lock:
+                    self._open += 1
+                t = threading.Thread(target=self._serve, args=(chan,), daemon=True)
+                self._threads.append(t)
+                t.start()
+            if not self.transport.is_active():
+                break
+            if self._tunnel_channels:
+                self._tunnel_channels = [c for c in self._tunnel_channels if not c.closed]
+            with self._lock:
+                if self._tunnel_channels:
+                    self._idle_since = time.monotonic()
+                elif self._open == 0 and time.monotonic() - self._idle_since >= self.linger_s:
+                    break
+            chan = self.transport.accept(timeout=_ACCEPT_POLL_S)
+        for t in self._threads:
+            t.join(timeout=_DB_WRITE_TIMEOUT_S)
+        if self._requested == 0:
+            self.end_reason = "request_timeout"
+
+    def _tunnel(self, channel: paramiko.Channel) -> bool:
+        destination = self.server_iface.pop_tunnel(channel.get_id())
+        if destination is None:
+            return False
+        self.tunnels += 1
+        self._tunnel_channels.append(channel)
+        self.live.touch()
+        self.live.tunnels = self.tunnels
+        self.live.stage = "active"
+        with self._lock:
+            self._requested += 1
+        tunnel_sinkhole.open_flow(
+            channel, self.session_id, self.server_iface.client_ip, destination, self.live.touch
+        )
+        if self.tunnels == 1:
+            log.info(f"[session:{self.session_id[:8]}] direct-tcpip to {destination[0]}:{destination[1]} sinkholed")
+        return True
+
+    def container(self, interactive: bool) -> str:
+        with self._provision_lock:
+            if self._container_id is None:
+                session_id = self.session_id
+                self.live.stage = "provisioning"
+                with self.server_iface.trace.span("provision"):
+                    container_id = manager.create_session_container(
+                        session_id,
+                        interactive=interactive,
+                        source_ip=self.server_iface.client_ip,
+                        username=self.server_iface.username,
+                    )
+                first = (manager.describe(container_id).get("affinity_sessions") or [session_id])[0]
+                activity.record("containers_started" if first == session_id else "containers_reused")
+                with self.server_iface.trace.span("update_container"):
+                    asyncio.run_coroutine_threadsafe(
+                        update_session_container(session_id, container_id),
+                        db.get_loop(),
+                    ).result(timeout=_DB_WRITE_TIMEOUT_S)
+                if first == session_id:
+                    asyncio.run_coroutine_threadsafe(
+                        canaries.record(session_id, container_id, manager.decoy_tokens(container_id)),
+                        db.get_loop(),
+                    ).add_done_callback(self._canaries_recorded)
+                self._container_id = container_id
+                self.live.container_id = container_id
+                self.live.backend = manager.describe(container_id).get("backend")
+            return self._container_id
+
+    def _canaries_recorded(self, future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            log.error(
+                f"[session:{self.session_id[:8]}] failed to record canary tokens",
+                exc_info=future.exception(),
+            )
+
+    def _serve(self, channel: paramiko.Channel) -> None:
+        session_id = self.session_id
+        chanid = channel.get_id()
+        request = self.server_iface.channel_request(chanid)
+        sftp = False
+        try:
+            if not request.event.wait(self.request_timeout_s):
+                log.info(f"[session:{session_id[:8]}] channel {chanid}: no shell/exec request — closing")
+                return
+            with self._lock:
+                self._requested += 1
+            command = request.command.decode("utf-8", errors="replace") if request.command is not None else None
+            asyncio.run_coroutine_threadsafe(
+                record_channel(session_id, chanid, request.kind, command), db.get_loop()
+            )
+            log.info(f"[session:{session_id[:8]}] channel {chanid}: {request.kind}")
+            self.live.channels[chanid] = request.kind
+
+            if request.kind == "sftp":
+                sftp = True
+                self._set_sftp(+1)
+                self.live.stage = "active"
+                _wait_for_close(channel)
+            else:
+                container_id = self.container(interactive=request.kind == "shell")
+                self.live.stage = "active"
+                bridge(channel, request, container_id, session_id, self.live, self.server_iface.trace)
+
+        except AdmissionRejected as exc:
+            log.warning(f"[session:{session_id[:8]}] admission rejected — {exc}")
+            activity.record("admission_rejected")
+            self.transport.close()
+        except Exception:
+            log.exception(f"Error in channel handler (session={session_id!r}, channel={chanid})")
+        finally:
+            channel.close()
+            self.server_iface.discard_channel(chanid)
+            self.live.channels.pop(chanid, None)
+            if sftp:
+                self._set_sftp(-1)
+            with self._lock:
+                self._open -= 1
+                if self._open == 0:
+                    self._idle_since = time.monotonic()
+                    if not self._tunnel_channels:
+                        self.live.stage = "lingering"
+
+    def _set_sftp(self, delta: int) -> None:
+        with self._lock:
+            self._sftp += delta
+            self.live.idle = self._sftp == 0
+
+    def close(self) -> None:
+        self.live.stage = "closing"
+        end_reason = self.end_reason or self.live.reason
+        backend_info: dict | None = None
+        try:
+            if self._container_id:
+                backend_info = manager.describe(self._container_id)
+                manager.release_container(self._container_id)
+            asyncio.run_coroutine_threadsafe(
+                end_session(
+                    self.session_id,
+                    trace=self.server_iface.trace.to_doc(),
+                    backend=backend_info,
+                    end_reason=end_reason,
+                ),
+                db.get_loop(),
+            ).result(timeout=_DB_WRITE_TIMEOUT_S)
+        finally:
+            reaper.unregister(self.session_id)
+
+
+def _resolve_session_id(server_iface: HoneypotServerInterface) -> str | None:
+    if server_iface._session_future is None:
+        log.warning("No session future — auth may not have fired.")
+        return None
+    try:
+        return server_iface._session_future.result(timeout=_DB_WRITE_TIMEOUT_S)
+    except Exception:
+        log.exception("Failed to retrieve session_id")
+        return None
+
+
+def _wait_for_close(channel: paramiko.Channel) -> None:
+    transport = channel.get_transport()
+    while True:
+        if channel.closed:
+            break
+        if transport is None or not transport.is_active():
+            break
+        time.sleep(0.1)
+
+
+def serve(transport: paramiko.Transport, first: paramiko.Channel, server_iface: HoneypotServerInterface) -> None:
+    session_id = _resolve_session_id(server_iface)
+    if session_id is None:
+        first.close()
+        return
+    dispatcher = ChannelDispatcher(transport, server_iface, session_id)
+    try:
+        dispatcher.run(first)
+    finally:
+        dispatcher.close()
@@ -0,0 +1,28 @@
+import hashlib
+
+import paramiko
+
+
+class RecordingTransport(paramiko.Transport):
+    def __init__(self, sock, *args, **kwargs) -> None:
+        super().__init__(sock, *args, **kwargs)
+        self.client_kex: dict[str, list[str]] | None = None
+
+    def _really_parse_kex_init(self, m, ignore_first_byte=False):
+        parsed = super()._really_parse_kex_init(m, ignore_first_byte)
+        if self.client_kex is None and not ignore_first_byte:
+            self.client_kex = {
+                "kex": list(parsed["kex_algo_list"]),
+                "host_key": list(parsed["server_key_algo_list"]),
+                "enc": list(parsed["client_encrypt_algo_list"]),
+                "mac": list(parsed["client_mac_algo_list"]),
+                "cmp": list(parsed["client_compress_algo_list"]),
+            }
+        return parsed
+
+
+def hassh(kex: dict[str, list[str]] | None) -> str | None:
+    if kex is None:
+        return None
+    raw = ";".join(",".join(kex[k]) for k in ("kex", "enc", "mac", "cmp"))
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -1,23 +1,69 @@
 import asyncio
 import logging
+import os
+import threading
+import time
 from typing import Callable
 
 import paramiko
 
+import storage.activity as activity
 import storage.database as db
+from capture import tunnel_sinkhole
+from proxy.fingerprint import hassh
+from proxy.tracing import SessionTrace
 from storage.models import create_session
 
 log = logging.getLogger(__name__)
 
+_MAX_CHANNELS = int(os.getenv("MAX_CHANNELS_PER_CONNECTION", "10"))
+
+
+class ChannelRequest:
+    def __init__(self, chanid: int) -> None:
+        self.chanid = chanid
+        self.kind: str | None = None
+        self.command: bytes | None = None
+        self.width = 80
+        self.height = 24
+        self.event = threading.Event()
+        self.resize: Callable[[int, int], None] | None = None
+
+    def set(self, kind: str, command: bytes | None = None) -> bool:
+        if self.kind is not None:
+            return False
+        self.kind, self.command = kind, command
+        self.event.set()
+        return True
+
 
 class HoneypotServerInterface(paramiko.ServerInterface):
     def __init__(self, client_addr: tuple[str, int]) -> None:
         self.client_ip: str = client_addr[0]
         self.client_port: int = client_addr[1]
+        self.username: str | None = None
+        self.transport: paramiko.Transport | None = None
         self._session_future: asyncio.Future | None = None
-        self.exec_command: bytes | None = None
-        self.sftp_subsystem: bool = False
-        self._resize_callback: Callable[[int, int], None] | None = None
+        self.auth_event = threading.Event()
+        self._channels: dict[int, ChannelRequest] = {}
+        self._channels_lock = threading.Lock()
+        self._tunnels: dict[int, tuple[str, int]] = {}
+        self.trace = SessionTrace()
+
+    def channel_request(self, chanid: int) -> ChannelRequest:
+        with self._channels_lock:
+            request = self._channels.get(chanid)
+            if request is None:
+                request = self._channels[chanid] = ChannelRequest(chanid)
+            return request
+
+    def discard_channel(self, chanid: int) -> None:
+        with self._channels_lock:
+            self._channels.pop(chanid, None)
+
+    def pop_tunnel(self, chanid: int) -> tuple[str, int] | None:
+        with self._channels_lock:
+            return self._tunnels.pop(chanid, None)
 
     def get_allowed_auths(self, username: str) -> str:
         return "password,publickey"
@@ -35,6 +81,10 @@ class HoneypotServerInterface(paramiko.ServerInterface):
         return paramiko.AUTH_SUCCESSFUL
 
     def _submit_session_log(self, username: str, password: str | None, auth_method: str) -> None:
+        activity.record("auths", method=auth_method)
+        self.username = username
+        self.auth_event.set()
+        submitted = time.monotonic()
         self._session_future = asyncio.run_coroutine_threadsafe(
             create_session(
                 source_ip=self.client_ip,
@@ -42,20 +92,45 @@ class HoneypotServerInterface(paramiko.ServerInterface):
                 username=username,
                 password=password,
                 auth_method=auth_method,
+                client_version=getattr(self.transport, "remote_version", None),
+                hassh=hassh(getattr(self.transport, "client_kex", None)),
             ),
             db.get_loop(),
         )
+        self._session_future.add_done_callback(
+            lambda _: self.trace.add("create_session", submitted, time.monotonic())
+        )
 
     def check_channel_request(self, kind: str, chanid: int) -> int:
-        if kind == "session":
-            return paramiko.OPEN_SUCCEEDED
-        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        if kind != "session":
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        with self._channels_lock:
+            if len(self._channels) >= _MAX_CHANNELS:
+                log.info(f"{self.client_ip} exceeded {_MAX_CHANNELS} concurrent channels")
+                return paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+        self.channel_request(chanid)
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_direct_tcpip_request(
+        self, chanid: int, origin: tuple[str, int], destination: tuple[str, int],
+    ) -> int:
+        activity.record("tunnel_requests")
+        if not tunnel_sinkhole.enabled():
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        if not tunnel_sinkhole.has_capacity():
+            activity.record("tunnel_rejected")
+            return paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+        with self._channels_lock:
+            self._tunnels[chanid] = (str(destination[0]), int(destination[1]))
+        return paramiko.OPEN_SUCCEEDED
 
     def check_channel_pty_request(
         self, channel: paramiko.Channel,
         term: str, width: int, height: int,
         pixelwidth: int, pixelheight: int, modes: bytes,
     ) -> bool:
+        request = self.channel_request(channel.get_id())
+        request.width, request.height = width or 80, height or 24
         return True
 
     def check_channel_window_change_request(
@@ -63,19 +138,19 @@ class HoneypotServerInterface(paramiko.ServerInterface):
         width: int, height: int,
         pixelwidth: int, pixelheight: int,
     ) -> bool:
-        if self._resize_callback:
-            self._resize_callback(width, height)
+        request = self.channel_request(channel.get_id())
+        request.width, request.height = width, height
+        if request.resize:
+            request.resize(width, height)
         return True
 
     def check_channel_shell_request(self, channel: paramiko.Channel) -> bool:
-        return True
+        return self.channel_request(channel.get_id()).set("shell")
 
     def check_channel_exec_request(self, channel: paramiko.Channel, command: bytes) -> bool:
-        self.exec_command = command
-        return True
+        return self.channel_request(channel.get_id()).set("exec", command)
 
     def check_channel_subsystem_request(self, channel: paramiko.Channel, name: str) -> bool:
-        if name == "sftp":
-            self.sftp_subsystem = True
-            return True
-        return False
+        if name != "sftp" or not self.channel_request(channel.get_id()).set("sftp"):
+            return False
+        return super().check_channel_subsystem_request(channel, name)
@@ -1,34 +1,68 @@
 import asyncio
 import logging
 import os
+import posixpath
+import stat
+from functools import partial
+from typing import Callable
 
 import paramiko
 
+import orchestrator.manager as manager
 import storage.database as db
 from capture import sftp_recorder
 
 log = logging.getLogger(__name__)
 
 _SFTP_ROOT = "/tmp/honeyshell-sftp"
+_HOME = "/root"
 
 
 class HoneypotSFTPServerInterface(paramiko.SFTPServerInterface):
     def __init__(self, server) -> None:
         super().__init__(server)
+        self._client_ip: str = getattr(server, "client_ip", "unknown")
+        self._username: str | None = getattr(server, "username", None)
         try:
-            honeypot_iface = server.get_server()
-            future = getattr(honeypot_iface, "_session_future", None)
+            future = getattr(server, "_session_future", None)
             self._session_id = future.result(timeout=5) if future else "unknown"
         except Exception:
             self._session_id = "unknown"
 
         self._root = os.path.join(_SFTP_ROOT, self._session_id[:8])
-        os.makedirs(self._root, exist_ok=True)
+        self._writers: dict[str, int] = {}
+        os.makedirs(self._realpath(_HOME), exist_ok=True)
         log.info(f"[session:{self._session_id[:8]}] SFTP session started")
 
     def _realpath(self, path: str) -> str:
-        path = os.path.normpath(path)
-        return os.path.join(self._root, path.lstrip("/"))
+        return os.path.join(self._root, self._container_path(path).lstrip("/"))
+
+    def _container_path(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join(_HOME, path))
+
+    def _mirror(self, path: str) -> None:
+        if self._writers.get(self._container_path(path)):
+            return
+        try:
+            st = os.stat(self._realpath(path))
+        except OSError:
+            return
+        if stat.S_ISREG(st.st_mode):
+            manager.queue_upload(
+                self._client_ip, self._username, self._container_path(path), self._realpath(path), st.st_size
+            )
+
+    def _closed(self, path: str) -> None:
+        container_path = self._container_path(path)
+        remaining = self._writers.get(container_path, 1) - 1
+        if remaining > 0:
+            self._writers[container_path] = remaining
+            return
+        self._writers.pop(container_path, None)
+        self._mirror(path)
+
+    def canonicalize(self, path: str) -> str:
+        return self._container_path(path)
 
     def list_folder(self, path: str):
         try:
@@ -58,12 +92,23 @@ class HoneypotSFTPServerInterface(paramiko.SFTPServerInterface):
         try:
             binary_flag = getattr(os, "O_BINARY", 0)
             mode = getattr(attr, "st_mode", None) or 0o666
+            if flags & os.O_CREAT:
+                os.makedirs(os.path.dirname(self._realpath(path)), exist_ok=True)
             fd = os.open(self._realpath(path), flags | binary_flag, mode)
         except OSError as e:
             return paramiko.SFTPServer.convert_errno(e.errno)
 
         is_write = bool(flags & (os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT))
-        return HoneypotSFTPHandle(fd, path, self._session_id, capture=is_write)
+        if is_write:
+            container_path = self._container_path(path)
+            self._writers[container_path] = self._writers.get(container_path, 0) + 1
+        return HoneypotSFTPHandle(
+            fd,
+            path,
+            self._session_id,
+            capture=is_write,
+            on_close=partial(self._closed, path) if is_write else None,
+        )
 
     def remove(self, path: str) -> int:
         try:
@@ -77,6 +122,7 @@ class HoneypotSFTPServerInterface(paramiko.SFTPServerInterface):
             os.rename(self._realpath(oldpath), self._realpath(newpath))
         except OSError as e:
             return paramiko.SFTPServer.convert_errno(e.errno)
+        self._mirror(newpath)
         return paramiko.SFTP_OK
 
     def mkdir(self, path: str, attr) -> int:
@@ -97,8 +143,11 @@ class HoneypotSFTPServerInterface(paramiko.SFTPServerInterface):
         try:
             if getattr(attr, "st_mode", None) is not None:
                 os.chmod(self._realpath(path), attr.st_mode)
+            if getattr(attr, "st_mtime", None) is not None:
+                os.utime(self._realpath(path), (attr.st_atime or attr.st_mtime, attr.st_mtime))
         except OSError as e:
             return paramiko.SFTPServer.convert_errno(e.errno)
+        self._mirror(path)
         return paramiko.SFTP_OK
 
     def symlink(self, target_path: str, path: str) -> int:
@@ -119,12 +168,20 @@ class HoneypotSFTPServerInterface(paramiko.SFTPServerInterface):
 
 
 class HoneypotSFTPHandle(paramiko.SFTPHandle):
-    def __init__(self, fd: int, path: str, session_id: str, capture: bool = False) -> None:
+    def __init__(
+        self,
+        fd: int,
+        path: str,
+        session_id: str,
+        capture: bool = False,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
         super().__init__()
         self._fd = fd
         self._path = path
         self._session_id = session_id
         self._capture = capture
+        self._on_close = on_close
         self._buf: bytearray | None = bytearray() if capture else None
 
     def read(self, offset: int, length: int):
@@ -155,6 +212,8 @@ class HoneypotSFTPHandle(paramiko.SFTPHandle):
                 db.get_loop(),
             )
         os.close(self._fd)
+        if self._on_close is not None:
+            self._on_close()
         return paramiko.SFTP_OK
 
     def stat(self):
@@ -167,6 +226,8 @@ class HoneypotSFTPHandle(paramiko.SFTPHandle):
         try:
             if getattr(attr, "st_mode", None) is not None:
                 os.fchmod(self._fd, attr.st_mode)
+            if getattr(attr, "st_mtime", None) is not None:
+                os.utime(self._fd, (attr.st_atime or attr.st_mtime, attr.st_mtime))
         except OSError as e:
             return paramiko.SFTPServer.convert_errno(e.errno)
         return paramiko.SFTP_OK
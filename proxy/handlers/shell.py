@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import threading
 import time
@@ -6,91 +5,41 @@ import time
 import paramiko
 
 import orchestrator.manager as manager
-import storage.database as db
+import storage.activity as activity
 from capture import tty_recorder
-from storage.models import end_session, update_session_container
-from proxy.handlers.auth import HoneypotServerInterface
+from proxy import reaper
+from proxy.handlers.auth import ChannelRequest
+from proxy.tracing import SessionTrace
 
 log = logging.getLogger(__name__)
 
-_DB_WRITE_TIMEOUT_S = 5
 _CHUNK_SIZE = 4096
 _POLL_S = 0.01
 
 
-def handle_channel(channel: paramiko.Channel, server_iface: HoneypotServerInterface) -> None:
-    session_id: str | None = None
-    container_id: str | None = None
-
-    try:
-        session_id = _resolve_session_id(server_iface)
-        if session_id is None:
-            return
-
-        if getattr(server_iface, "sftp_subsystem", False):
-            _wait_for_close(channel)
-        else:
-            container_id = manager.create_session_container(session_id)
-            asyncio.run_coroutine_threadsafe(
-                update_session_container(session_id, container_id),
-                db.get_loop(),
-            ).result(timeout=_DB_WRITE_TIMEOUT_S)
-            _bridge(channel, server_iface, container_id, session_id)
-
-    except Exception:
-        log.exception(f"Error in channel handler (session={session_id!r})")
-    finally:
-        channel.close()
-        if container_id:
-            manager.destroy_container(container_id)
-        if session_id:
-            asyncio.run_coroutine_threadsafe(
-                end_session(session_id), db.get_loop()
-            ).result(timeout=_DB_WRITE_TIMEOUT_S)
-
-
-def _resolve_session_id(server_iface: HoneypotServerInterface) -> str | None:
-    if server_iface._session_future is None:
-        log.warning("No session future — auth may not have fired.")
-        return None
-    try:
-        return server_iface._session_future.result(timeout=_DB_WRITE_TIMEOUT_S)
-    except Exception:
-        log.exception("Failed to retrieve session_id")
-        return None
-
-
-def _wait_for_close(channel: paramiko.Channel) -> None:
-    transport = channel.get_transport()
-    while True:
-        if channel.closed:
-            break
-        if transport is None or not transport.is_active():
-            break
-        time.sleep(0.1)
-
-
-def _bridge(
+def bridge(
     channel: paramiko.Channel,
-    server_iface: HoneypotServerInterface,
+    request: ChannelRequest,
     container_id: str,
     session_id: str,
+    live: reaper.LiveSession,
+    trace: SessionTrace,
 ) -> None:
-    if server_iface.exec_command:
-        command = ["sh", "-c", server_iface.exec_command.decode("utf-8", errors="replace")]
+    if request.kind == "exec":
+        command = ["sh", "-c", request.command.decode("utf-8", errors="replace")]
         tty = False
     else:
         command = ["/bin/bash"]
         tty = True
 
-    exec_id, sock = manager.open_exec(container_id, command, tty=tty)
-
-    raw = sock._sock
-    raw.setblocking(True)
+    exec_id, stream = manager.open_exec(
+        container_id, command, tty=tty, width=request.width, height=request.height, trace=trace
+    )
 
-    server_iface._resize_callback = lambda w, h: manager.resize_exec(exec_id, w, h)
+    request.resize = lambda w, h: manager.resize_exec(exec_id, w, h)
 
     stop = threading.Event()
+    chanid = channel.get_id()
 
     def attacker_to_container() -> None:
         try:
@@ -99,8 +48,10 @@ def _bridge(
                     data = channel.recv(_CHUNK_SIZE)
                     if not data:
                         break
-                    raw.sendall(data)
-                    tty_recorder.log_keystroke(session_id, data, "input")
+                    stream.sendall(data)
+                    live.touch(len(data), "input")
+                    tty_recorder.log_keystroke(session_id, data, "input", channel=chanid)
+                    activity.record("bytes_bridged", len(data), direction="input")
                 elif channel.closed:
                     break
                 else:
@@ -113,11 +64,14 @@ def _bridge(
     def container_to_attacker() -> None:
         try:
             while not stop.is_set():
-                data = raw.recv(_CHUNK_SIZE)
+                data = stream.recv(_CHUNK_SIZE)
                 if not data:
                     break
                 channel.send(data)
-                tty_recorder.log_keystroke(session_id, data, "output")
+                live.touch(len(data), "output")
+                trace.mark("first_output")
+                tty_recorder.log_keystroke(session_id, data, "output", channel=chanid)
+                activity.record("bytes_bridged", len(data), direction="output")
         except Exception:
             pass
         finally:
@@ -130,6 +84,6 @@ def _bridge(
     stop.wait()
 
     try:
-        sock.close()
+        stream.close()
     except Exception:
         pass
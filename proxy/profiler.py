@@ -0,0 +1,57 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+_PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+_PROFILE_SECONDS = int(os.getenv("PROFILE_SECONDS", "30"))
+_SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_S", "0.005"))
+
+_running = threading.Lock()
+
+
+def _stack(frame, thread_name: str) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+def _sample(seconds: int, path: str) -> None:
+    me = threading.get_ident()
+    samples: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name.split("-")[0] for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    samples[_stack(frame, names.get(ident, "unknown"))] += 1
+            time.sleep(_SAMPLE_INTERVAL_S)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info(f"Profile written to {path} ({sum(samples.values())} samples)")
+    finally:
+        _running.release()
+
+
+def start(seconds: int | None = None) -> str | None:
+    if not _running.acquire(blocking=False):
+        log.warning("Profiler already running")
+        return None
+
+    seconds = seconds or _PROFILE_SECONDS
+    path = os.path.join(_PROFILE_DIR, f"honeyshell-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+    log.info(f"Sampling profiler started for {seconds}s")
+    threading.Thread(target=_sample, args=(seconds, path), daemon=True, name="profiler").start()
+    return path
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+_INTERVAL_S = float(os.getenv("REAPER_INTERVAL_S", "5"))
+_IDLE_TIMEOUT_S = float(os.getenv("SESSION_IDLE_TIMEOUT_S", "600"))
+_MAX_SESSION_S = float(os.getenv("SESSION_MAX_SECONDS", "3600"))
+
+
+class LiveSession:
+    def __init__(
+        self,
+        session_id: str,
+        close: Callable[[], None],
+        idle: bool,
+        source_ip: str | None = None,
+        username: str | None = None,
+    ) -> None:
+        self.session_id = session_id
+        self.source_ip = source_ip
+        self.username = username
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+        self.last_io = self.started
+        self.idle = idle
+        self.reason: str | None = None
+        self.stage = "awaiting_request"
+        self.backend: str | None = None
+        self.container_id: str | None = None
+        self.channels: dict[int, str] = {}
+        self.tunnels = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._close = close
+
+    def touch(self, nbytes: int = 0, direction: str = "input") -> None:
+        self.last_io = time.monotonic()
+        if direction == "input":
+            self.bytes_in += nbytes
+        else:
+            self.bytes_out += nbytes
+
+    def to_doc(self, now: float | None = None) -> dict:
+        now = now if now is not None else time.monotonic()
+        return {
+            "session_id": self.session_id,
+            "source_ip": self.source_ip,
+            "username": self.username,
+            "stage": self.stage,
+            "backend": self.backend,
+            "container_id": self.container_id,
+            "channels": [{"channel": c, "kind": k} for c, k in sorted(self.channels.items())],
+            "tunnels": self.tunnels,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "started_at": self.started_at.isoformat(),
+            "age_s": round(now - self.started, 1),
+            "idle_s": round(now - self.last_io, 1),
+            "reason": self.reason,
+        }
+
+    def terminate(self, reason: str) -> None:
+        if self.reason is not None:
+            return
+        self.reason = reason
+        log.info(f"[session:{self.session_id[:8]}] terminating — {reason}")
+        try:
+            self._close()
+        except Exception:
+            log.exception(f"[session:{self.session_id[:8]}] close failed")
+
+
+_lock = threading.Lock()
+_sessions: dict[str, LiveSession] = {}
+_thread: threading.Thread | None = None
+
+
+def register(
+    session_id: str,
+    close: Callable[[], None],
+    idle: bool = True,
+    source_ip: str | None = None,
+    username: str | None = None,
+) -> LiveSession:
+    live = LiveSession(session_id, close, idle, source_ip, username)
+    with _lock:
+        _sessions[session_id] = live
+    return live
+
+
+def unregister(session_id: str) -> None:
+    with _lock:
+        _sessions.pop(session_id, None)
+
+
+def sessions() -> list[LiveSession]:
+    with _lock:
+        return list(_sessions.values())
+
+
+def find(prefix: str) -> LiveSession | None:
+    if not prefix:
+        return None
+    with _lock:
+        live = _sessions.get(prefix)
+        if live is not None:
+            return live
+        matches = [s for sid, s in _sessions.items() if sid.startswith(prefix)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def sweep(
+    now: float | None = None,
+    idle_timeout_s: float = _IDLE_TIMEOUT_S,
+    max_session_s: float = _MAX_SESSION_S,
+) -> int:
+    now = now if now is not None else time.monotonic()
+    reaped = 0
+    for session in sessions():
+        if session.reason is not None:
+            continue
+        if max_session_s and now - session.started > max_session_s:
+            session.terminate("max_duration")
+        elif session.idle and idle_timeout_s and now - session.last_io > idle_timeout_s:
+            session.terminate("idle_timeout")
+        else:
+            continue
+        reaped += 1
+    return reaped
+
+
+def _run() -> None:
+    while True:
+        time.sleep(_INTERVAL_S)
+        try:
+            sweep()
+        except Exception:
+            log.exception("Reaper sweep failed")
+
+
+def start() -> None:
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, daemon=True, name="session-reaper")
+    _thread.start()
+    log.info(f"Session reaper started (idle {_IDLE_TIMEOUT_S:.0f}s, cap {_MAX_SESSION_S:.0f}s)")
@@ -1,16 +1,29 @@
+import asyncio
 import logging
 import os
+import signal
 import socket
 import threading
+import time
 
 import paramiko
 from dotenv import load_dotenv
 
+import capture.scanner_recorder as scanner_recorder
+import capture.tunnel_sinkhole as tunnel_sinkhole
+import storage.activity as activity
+import storage.campaigns as campaigns
+import storage.canaries as canaries
 import storage.database as db
+import storage.geoip as geoip
+import storage.search as search
 import orchestrator.manager as manager
+from proxy import admin, dispatcher, profiler, reaper, tracing
+from proxy.fingerprint import RecordingTransport, hassh
 from proxy.handlers.auth import HoneypotServerInterface
 from proxy.handlers.sftp import HoneypotSFTPServerInterface
-from proxy.handlers.shell import handle_channel
+from relay import sensor as relay
+from storage.models import reconcile_stale_sessions
 
 load_dotenv()
 
@@ -23,7 +36,12 @@ log = logging.getLogger(__name__)
 _HOST_KEY_PATH = os.getenv("HOST_KEY_PATH", "proxy/keys/host_rsa")
 _LISTEN_HOST = os.getenv("PROXY_LISTEN_HOST", "0.0.0.0")
 _LISTEN_PORT = int(os.getenv("PROXY_LISTEN_PORT", "2222"))
-_CHANNEL_ACCEPT_TIMEOUT_S = 20
+_BANNER_TIMEOUT_S = float(os.getenv("BANNER_TIMEOUT_S", "10"))
+_KEX_TIMEOUT_S = float(os.getenv("KEX_TIMEOUT_S", "15"))
+_AUTH_TIMEOUT_S = float(os.getenv("AUTH_TIMEOUT_S", "30"))
+_CHANNEL_OPEN_TIMEOUT_S = float(os.getenv("CHANNEL_OPEN_TIMEOUT_S", "10"))
+_AUTH_POLL_S = 0.5
+_RECONCILE_TIMEOUT_S = 60
 
 
 def _load_host_key() -> paramiko.RSAKey:
@@ -34,42 +52,97 @@ def _load_host_key() -> paramiko.RSAKey:
     return paramiko.RSAKey(filename=_HOST_KEY_PATH)
 
 
+def _record_connection(transport: RecordingTransport, ip: str, stage: str, started: float) -> None:
+    scanner_recorder.record(
+        source_ip=ip,
+        client_version=transport.remote_version or None,
+        kex=transport.client_kex,
+        fingerprint=hassh(transport.client_kex),
+        stage=stage,
+        duration_ms=(time.monotonic() - started) * 1000,
+    )
+
+
 def _handle_connection(
     client_sock: socket.socket,
     client_addr: tuple[str, int],
     host_key: paramiko.RSAKey,
 ) -> None:
+    started = time.monotonic()
     ip, port = client_addr
-    log.info(f"Connection from {ip}:{port}")
+    log.debug(f"Connection from {ip}:{port}")
+    activity.record("connections")
 
-    transport = paramiko.Transport(client_sock)
+    transport = RecordingTransport(client_sock)
     transport.add_server_key(host_key)
     transport.local_version = os.getenv("SSH_BANNER", "SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6")
+    transport.banner_timeout = _BANNER_TIMEOUT_S
+    transport.handshake_timeout = _KEX_TIMEOUT_S
 
     server_iface = HoneypotServerInterface(client_addr)
+    server_iface.transport = transport
     transport.set_subsystem_handler("sftp", paramiko.SFTPServer, HoneypotSFTPServerInterface)
 
     try:
-        transport.start_server(server=server_iface)
-    except paramiko.SSHException as exc:
-        log.warning(f"SSH handshake failed from {ip}:{port} — {exc}")
+        with server_iface.trace.span("handshake"):
+            transport.start_server(server=server_iface)
+    except (paramiko.SSHException, EOFError, OSError) as exc:
+        log.debug(f"SSH handshake failed from {ip}:{port} — {exc}")
+        activity.record("handshake_failures")
+        _record_connection(transport, ip, "kex" if transport.remote_version else "banner", started)
         client_sock.close()
         return
 
-    chan = transport.accept(timeout=_CHANNEL_ACCEPT_TIMEOUT_S)
+    auth_deadline = time.monotonic() + _AUTH_TIMEOUT_S
+    while transport.is_active() and time.monotonic() < auth_deadline:
+        if server_iface.auth_event.wait(_AUTH_POLL_S):
+            break
+    if not server_iface.auth_event.is_set():
+        log.debug(f"No authentication from {ip}:{port} within {_AUTH_TIMEOUT_S:.0f}s")
+        _record_connection(transport, ip, "auth", started)
+        transport.close()
+        return
+
+    with server_iface.trace.span("channel_accept"):
+        chan = transport.accept(timeout=_CHANNEL_OPEN_TIMEOUT_S)
     if chan is None:
         log.debug(f"No channel opened by {ip}:{port}")
+        _record_connection(transport, ip, "channel", started)
         transport.close()
         return
 
-    handle_channel(chan, server_iface)
+    log.info(f"Channel from {ip}:{port} ({transport.remote_version})")
+    dispatcher.serve(transport, chan, server_iface)
+    _record_connection(transport, ip, "session", started)
     transport.close()
 
 
+def _install_signal_handlers() -> None:
+    signal.signal(signal.SIGUSR1, lambda *_: profiler.start())
+    signal.signal(signal.SIGUSR2, lambda *_: tracing.log_histograms())
+
+
 def main() -> None:
     db.init()
+    activity.init()
+    relay.init()
+    scanner_recorder.init()
+    tunnel_sinkhole.init()
+    geoip.init()
+    search.init()
+    campaigns.init()
+    canaries.init()
     manager.init()
+    try:
+        asyncio.run_coroutine_threadsafe(reconcile_stale_sessions(), db.get_loop()).result(
+            timeout=_RECONCILE_TIMEOUT_S
+        )
+    except Exception:
+        log.exception("Reconciling stale sessions failed")
+    reaper.start()
+    admin.start()
     host_key = _load_host_key()
+    _install_signal_handlers()
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -91,6 +164,11 @@ def main() -> None:
         log.info("Shutting down.")
     finally:
         sock.close()
+        admin.shutdown()
+        scanner_recorder.shutdown()
+        tunnel_sinkhole.shutdown()
+        activity.shutdown()
+        relay.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from storage import activity
+
+log = logging.getLogger(__name__)
+
+_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_lock = threading.Lock()
+_histograms: dict[str, list[int]] = {}
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(_BUCKETS_MS)
+
+
+def _observe(stage: str, ms: float) -> None:
+    i = _bucket(ms)
+    with _lock:
+        counts = _histograms.get(stage)
+        if counts is None:
+            counts = _histograms[stage] = [0] * (len(_BUCKETS_MS) + 1)
+        counts[i] += 1
+    le = str(_BUCKETS_MS[i]) if i < len(_BUCKETS_MS) else "inf"
+    activity.record("stage_latency", stage=stage, le_ms=le)
+
+
+def histograms() -> dict[str, dict[str, int]]:
+    labels = [f"<={b}ms" for b in _BUCKETS_MS] + [f">{_BUCKETS_MS[-1]}ms"]
+    with _lock:
+        return {
+            stage: {label: n for label, n in zip(labels, counts) if n}
+            for stage, counts in _histograms.items()
+        }
+
+
+def log_histograms() -> None:
+    for stage, buckets in sorted(histograms().items()):
+        log.info(f"latency {stage}: " + " ".join(f"{k}={v}" for k, v in buckets.items()))
+
+
+class SessionTrace:
+    def __init__(self) -> None:
+        self.origin = time.monotonic()
+        self._spans: list[tuple[str, float, float]] = []
+        self._marks: set[str] = set()
+
+    def add(self, stage: str, start: float, end: float) -> None:
+        self._spans.append((stage, start - self.origin, end - start))
+        _observe(stage, (end - start) * 1000)
+
+    def mark(self, stage: str) -> None:
+        if stage in self._marks:
+            return
+        self._marks.add(stage)
+        self.add(stage, self.origin, time.monotonic())
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, start, time.monotonic())
+
+    def to_doc(self) -> list[dict]:
+        return [
+            {"stage": stage, "start_ms": round(offset * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+            for stage, offset, duration in self._spans
+        ]
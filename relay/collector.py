@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import ReplaceOne, UpdateOne
+
+import storage.database as db
+from relay import protocol
+from storage.database import get_db
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+_LISTEN_HOST = os.getenv("RELAY_LISTEN_HOST", "0.0.0.0")
+_LISTEN_PORT = int(os.getenv("RELAY_LISTEN_PORT", "2223"))
+_SECRET = os.getenv("RELAY_SECRET", "")
+_MAX_INFLIGHT = int(os.getenv("RELAY_MAX_INFLIGHT", "8"))
+_BUSY_RETRY_MS = 500
+
+
+class MongoSink:
+    async def last_seq(self, node: str) -> int:
+        doc = await get_db().relay_checkpoints.find_one({"_id": node})
+        return doc["last_seq"] if doc else 0
+
+    async def write(self, node: str, seq: int, records: list[dict]) -> None:
+        ops: dict[str, list] = {}
+        for i, record in enumerate(records):
+            doc = {**record["d"], "node_id": node}
+            key = record.get("k")
+            if key:
+                ops.setdefault(record["c"], []).append(ReplaceOne({**key, "node_id": node}, doc, upsert=True))
+            else:
+                doc["_id"] = f"{node}:{seq}:{i}"
+                ops.setdefault(record["c"], []).append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+
+        for collection, batch in ops.items():
+            await get_db()[collection].bulk_write(batch, ordered=False)
+        await get_db().relay_checkpoints.bulk_write(
+            [UpdateOne({"_id": node}, {"$max": {"last_seq": seq}}, upsert=True)]
+        )
+
+
+class Collector:
+    def __init__(self, secret: bytes, sink, max_inflight: int = _MAX_INFLIGHT) -> None:
+        self.secret = secret
+        self.sink = sink
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._node_locks: dict[str, asyncio.Lock] = {}
+        self._last_seq: dict[str, int] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        node = None
+        try:
+            kind, hello = await protocol.read_frame_async(reader, self.secret)
+            if kind != protocol.HELLO:
+                raise protocol.RelayError(f"expected HELLO, got {kind}")
+            node = hello["node"]
+            lock = self._node_locks.setdefault(node, asyncio.Lock())
+            if node not in self._last_seq:
+                self._last_seq[node] = await self.sink.last_seq(node)
+            self._send(writer, protocol.WELCOME, {"last_seq": self._last_seq[node]})
+            await writer.drain()
+            log.info(f"Sensor {node!r} connected from {peer[0]}")
+
+            while True:
+                kind, batch = await protocol.read_frame_async(reader, self.secret)
+                if kind != protocol.BATCH or batch["node"] != node:
+                    raise protocol.RelayError(f"unexpected frame {kind} from {node!r}")
+                seq = batch["seq"]
+
+                if seq <= self._last_seq[node]:
+                    self._send(writer, protocol.ACK, {"seq": seq})
+                elif self.inflight >= self.max_inflight:
+                    self._send(writer, protocol.BUSY, {"seq": seq, "retry_ms": _BUSY_RETRY_MS})
+                else:
+                    self.inflight += 1
+                    try:
+                        async with lock:
+                            if seq > self._last_seq[node]:
+                                await self.sink.write(node, seq, batch["records"])
+                                self._last_seq[node] = seq
+                    finally:
+                        self.inflight -= 1
+                    self._send(writer, protocol.ACK, {"seq": seq})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except protocol.RelayError as exc:
+            log.warning(f"Rejected relay connection from {peer[0]} ({node!r}) — {exc}")
+        except Exception:
+            log.exception(f"Relay connection from {peer[0]} ({node!r}) failed")
+        finally:
+            writer.close()
+
+    def _send(self, writer: asyncio.StreamWriter, kind: int, body: dict) -> None:
+        writer.write(protocol.frame(self.secret, kind, protocol.encode_body(body)))
+
+    async def serve(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s — %(message)s",
+    )
+    if not _SECRET:
+        raise SystemExit("RELAY_SECRET must be set")
+
+    db.init()
+    collector = Collector(_SECRET.encode(), MongoSink())
+    asyncio.run_coroutine_threadsafe(collector.serve(_LISTEN_HOST, _LISTEN_PORT), db.get_loop()).result()
+    log.info(f"Relay collector listening on {_LISTEN_HOST}:{_LISTEN_PORT}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        log.info("Shutting down.")
+
+
+if __name__ == "__main__":
+    main()
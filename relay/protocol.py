@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import hmac
+import socket
+import struct
+import zlib
+
+import bson
+
+HELLO = 1
+WELCOME = 2
+BATCH = 3
+ACK = 4
+BUSY = 5
+
+_HEADER = struct.Struct(">IB")
+_MAC_SIZE = 32
+_COMPRESS_LEVEL = 6
+MAX_FRAME = 32 * 1024 * 1024
+
+
+class RelayError(Exception):
+    pass
+
+
+def _mac(secret: bytes, kind: int, body: bytes) -> bytes:
+    return hmac.new(secret, bytes([kind]) + body, hashlib.sha256).digest()
+
+
+def encode_body(obj: dict) -> bytes:
+    return zlib.compress(bson.encode(obj), _COMPRESS_LEVEL)
+
+
+def decode_body(body: bytes) -> dict:
+    return bson.decode(zlib.decompress(body))
+
+
+def frame(secret: bytes, kind: int, body: bytes) -> bytes:
+    return _HEADER.pack(_MAC_SIZE + len(body), kind) + _mac(secret, kind, body) + body
+
+
+def _open(secret: bytes, kind: int, payload: bytes) -> dict:
+    mac, body = payload[:_MAC_SIZE], payload[_MAC_SIZE:]
+    if not hmac.compare_digest(mac, _mac(secret, kind, body)):
+        raise RelayError("frame authentication failed")
+    return decode_body(body)
+
+
+def _check_length(length: int) -> None:
+    if length < _MAC_SIZE or length > MAX_FRAME:
+        raise RelayError(f"bad frame length {length}")
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("relay connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket, secret: bytes) -> tuple[int, dict]:
+    length, kind = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    _check_length(length)
+    return kind, _open(secret, kind, _recv_exactly(sock, length))
+
+
+async def read_frame_async(reader: asyncio.StreamReader, secret: bytes) -> tuple[int, dict]:
+    length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    _check_length(length)
+    return kind, _open(secret, kind, await reader.readexactly(length))
@@ -0,0 +1,225 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from relay import protocol
+
+log = logging.getLogger(__name__)
+
+_COLLECTOR = os.getenv("RELAY_COLLECTOR", "")
+_NODE_ID = os.getenv("RELAY_NODE_ID", "") or socket.gethostname()
+_SECRET = os.getenv("RELAY_SECRET", "")
+_SPOOL_DIR = os.getenv("RELAY_SPOOL_DIR", "relay-spool")
+_SPOOL_MAX_BYTES = int(os.getenv("RELAY_SPOOL_MAX_MB", "512")) * 1024 * 1024
+_BATCH_MAX_RECORDS = int(os.getenv("RELAY_BATCH_MAX_RECORDS", "500"))
+_BATCH_INTERVAL_S = float(os.getenv("RELAY_BATCH_INTERVAL_S", "2"))
+_RECONNECT_S = 5
+_ACK_TIMEOUT_S = 30
+
+
+class Sensor:
+    def __init__(
+        self,
+        collector: tuple[str, int],
+        node_id: str,
+        secret: bytes,
+        spool_dir: str,
+        batch_max_records: int = _BATCH_MAX_RECORDS,
+        batch_interval_s: float = _BATCH_INTERVAL_S,
+        spool_max_bytes: int = _SPOOL_MAX_BYTES,
+    ) -> None:
+        self.collector = collector
+        self.node_id = node_id
+        self.secret = secret
+        self.spool_dir = spool_dir
+        self.batch_max_records = batch_max_records
+        self.batch_interval_s = batch_interval_s
+        self.spool_max_bytes = spool_max_bytes
+        self.dropped = 0
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._seq_lock = threading.Lock()
+        self._size_lock = threading.Lock()
+        self._pending: list[dict] = []
+        self._wake = threading.Event()
+        self._spooled = threading.Condition()
+        self._stop = threading.Event()
+        self._seq = self._load_seq()
+        self._spool_size = self._spool_bytes()
+        self._threads: list[threading.Thread] = []
+
+    def _seq_path(self) -> str:
+        return os.path.join(self.spool_dir, "next_seq")
+
+    def _load_seq(self) -> int:
+        try:
+            with open(self._seq_path()) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return max(self._spool_seqs(), default=0) + 1
+
+    def _spool_seqs(self) -> list[int]:
+        return sorted(int(name[:-6]) for name in os.listdir(self.spool_dir) if name.endswith(".batch"))
+
+    def _spool_path(self, seq: int) -> str:
+        return os.path.join(self.spool_dir, f"{seq:012d}.batch")
+
+    def _write_spool(self, seq: int, body: bytes) -> None:
+        path = self._spool_path(seq)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        with self._size_lock:
+            self._spool_size += len(body)
+
+    def _remove_spool(self, seq: int) -> None:
+        path = self._spool_path(seq)
+        size = os.path.getsize(path)
+        os.remove(path)
+        with self._size_lock:
+            self._spool_size -= size
+
+    def _persist_seq(self) -> None:
+        with open(self._seq_path() + ".tmp", "w") as f:
+            f.write(str(self._seq))
+        os.replace(self._seq_path() + ".tmp", self._seq_path())
+
+    def _spool_bytes(self) -> int:
+        return sum(os.path.getsize(self._spool_path(seq)) for seq in self._spool_seqs())
+
+    def ship(self, collection: str, doc: dict, key: dict | None = None) -> None:
+        record = {"c": collection, "d": {k: v for k, v in doc.items() if k != "_id"}, "k": key}
+        with self._lock:
+            self._pending.append(record)
+            full = len(self._pending) >= self.batch_max_records
+        if full:
+            self._wake.set()
+
+    def seal(self) -> int | None:
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return None
+        with self._seq_lock:
+            seq = self._seq
+            body = protocol.encode_body({"node": self.node_id, "seq": seq, "records": records})
+            if self._spool_size + len(body) > self.spool_max_bytes:
+                self.dropped += len(records)
+                log.warning(f"Relay spool full — dropped batch of {len(records)} records")
+                return None
+            self._write_spool(seq, body)
+            self._seq += 1
+            self._persist_seq()
+        with self._spooled:
+            self._spooled.notify_all()
+        return seq
+
+    def _batch_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.batch_interval_s)
+            self._wake.clear()
+            try:
+                self.seal()
+            except Exception:
+                log.exception("Relay batch sealing failed")
+
+    def _send_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection(self.collector, timeout=_ACK_TIMEOUT_S) as sock:
+                    self._session(sock)
+            except (OSError, ConnectionError, protocol.RelayError) as exc:
+                if not self._stop.is_set():
+                    log.warning(f"Relay connection to {self.collector[0]}:{self.collector[1]} lost — {exc}")
+                    self._stop.wait(_RECONNECT_S)
+
+    def _session(self, sock: socket.socket) -> None:
+        sock.sendall(protocol.frame(self.secret, protocol.HELLO, protocol.encode_body({"node": self.node_id})))
+        kind, welcome = protocol.read_frame(sock, self.secret)
+        if kind != protocol.WELCOME:
+            raise protocol.RelayError(f"unexpected frame {kind} during handshake")
+        self._resync(welcome["last_seq"])
+        log.info(f"Relay connected to collector as {self.node_id!r} (last_seq={welcome['last_seq']})")
+
+        while not self._stop.is_set():
+            seqs = self._spool_seqs()
+            if not seqs:
+                with self._spooled:
+                    self._spooled.wait(self.batch_interval_s)
+                continue
+            seq = seqs[0]
+            with open(self._spool_path(seq), "rb") as f:
+                sock.sendall(protocol.frame(self.secret, protocol.BATCH, f.read()))
+            kind, reply = protocol.read_frame(sock, self.secret)
+            if kind == protocol.ACK and reply["seq"] == seq:
+                self._remove_spool(seq)
+            elif kind == protocol.BUSY:
+                self._stop.wait(reply.get("retry_ms", 1000) / 1000)
+            else:
+                raise protocol.RelayError(f"unexpected reply {kind} {reply!r} for batch {seq}")
+
+    def _resync(self, last_seq: int) -> None:
+        with self._seq_lock:
+            if self._seq > last_seq:
+                for seq in self._spool_seqs():
+                    if seq <= last_seq:
+                        self._remove_spool(seq)
+                return
+            seqs = self._spool_seqs()
+            log.warning(
+                f"Relay sequence {self._seq} is behind the collector's {last_seq} — "
+                f"renumbering {len(seqs)} spooled batches"
+            )
+            self._seq = last_seq + 1
+            for seq in seqs:
+                with open(self._spool_path(seq), "rb") as f:
+                    batch = protocol.decode_body(f.read())
+                batch["seq"] = self._seq
+                self._write_spool(self._seq, protocol.encode_body(batch))
+                self._remove_spool(seq)
+                self._seq += 1
+            self._persist_seq()
+
+    def start(self) -> None:
+        for target, name in ((self._batch_loop, "relay-batch"), (self._send_loop, "relay-send")):
+            t = threading.Thread(target=target, daemon=True, name=name)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, drain_s: float = 5.0) -> None:
+        self.seal()
+        deadline = time.monotonic() + drain_s
+        while self._spool_seqs() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        self._wake.set()
+        with self._spooled:
+            self._spooled.notify_all()
+
+
+_sensor: Sensor | None = None
+
+
+def init() -> None:
+    global _sensor
+    if not _COLLECTOR:
+        return
+    if not _SECRET:
+        raise RuntimeError("RELAY_COLLECTOR is set but RELAY_SECRET is empty")
+    host, _, port = _COLLECTOR.rpartition(":")
+    _sensor = Sensor((host, int(port)), _NODE_ID, _SECRET.encode(), _SPOOL_DIR)
+    _sensor.start()
+    log.info(f"Relay sensor {_NODE_ID!r} shipping to {_COLLECTOR}")
+
+
+def ship(collection: str, doc: dict, key: dict | None = None) -> None:
+    if _sensor is not None:
+        _sensor.ship(collection, doc, key)
+
+
+def shutdown() -> None:
+    if _sensor is not None:
+        _sensor.stop()
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import base64
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import retention
+
+load_dotenv()
+
+
+def _run(root: str) -> None:
+    db.init()
+    started = time.monotonic()
+    counts = asyncio.run_coroutine_threadsafe(retention.run(root=root), db.get_loop()).result()
+    for collection, count in counts.items():
+        print(f"[+] {collection:<10} archived for {count} sessions")
+    print(f"[+] Done in {time.monotonic() - started:.1f}s")
+
+
+def _show(root: str, session_id: str, day: str | None) -> None:
+    bundle = retention.load_session(root, session_id, day)
+    if bundle is None:
+        print(f"[-] Session {session_id} not found in {root}", file=sys.stderr)
+        sys.exit(1)
+
+    session = bundle["session"] or {}
+    print(f"session_id : {session_id}")
+    print(f"source     : {session.get('source_ip')}:{session.get('source_port')}")
+    print(f"user       : {session.get('username')!r} / {session.get('password')!r}")
+    print(f"started_at : {session.get('started_at')}")
+    print(f"keystrokes : {len(bundle['keystrokes'])} chunks")
+    for upload in bundle["uploads"]:
+        print(f"upload     : {upload['filename']!r} {upload['size_bytes']}B sha256={upload['content_hash']}")
+
+
+def _replay(root: str, session_id: str, day: str | None, speed: float) -> None:
+    bundle = retention.load_session(root, session_id, day)
+    if bundle is None:
+        print(f"[-] Session {session_id} not found in {root}", file=sys.stderr)
+        sys.exit(1)
+
+    previous: datetime | None = None
+    for chunk in bundle["keystrokes"]:
+        if chunk["direction"] != "output":
+            continue
+        if previous is not None and speed > 0:
+            time.sleep(min((chunk["timestamp"] - previous).total_seconds() / speed, 5))
+        previous = chunk["timestamp"]
+        sys.stdout.buffer.write(base64.b64decode(chunk["data"]))
+        sys.stdout.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HoneyShell capture archive")
+    parser.add_argument("--root", default=retention._ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("run", help="Archive and purge data older than the hot windows")
+
+    show = sub.add_parser("show", help="Print an archived session")
+    show.add_argument("session_id")
+    show.add_argument("--day", help="YYYY-MM-DD partition, if known")
+
+    replay = sub.add_parser("replay", help="Replay an archived session's terminal output")
+    replay.add_argument("session_id")
+    replay.add_argument("--day", help="YYYY-MM-DD partition, if known")
+    replay.add_argument("--speed", type=float, default=1.0, help="0 = no delays")
+
+    find = sub.add_parser("search", help="Find archived sessions whose keystrokes contain text")
+    find.add_argument("text")
+    find.add_argument("--from", dest="start", help="YYYY-MM-DD")
+    find.add_argument("--to", dest="end", help="YYYY-MM-DD")
+
+    args = parser.parse_args()
+
+    if args.cmd == "run":
+        _run(args.root)
+    elif args.cmd == "show":
+        _show(args.root, args.session_id, args.day)
+    elif args.cmd == "replay":
+        _replay(args.root, args.session_id, args.day, args.speed)
+    else:
+        for session_id in retention.search(args.root, args.text, args.start, args.end):
+            print(session_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import statistics
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+import orchestrator.manager as manager
+
+load_dotenv()
+
+_MARKER = b"honeyshell-bench-ready"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _run_once(backend, command: list[str]) -> dict[str, float]:
+    session_id = str(uuid.uuid4())
+    timings = {}
+
+    t0 = time.monotonic()
+    handle = backend.provision(session_id)
+    timings["provision"] = time.monotonic() - t0
+
+    try:
+        t1 = time.monotonic()
+        _, stream = backend.open_exec(handle, command, tty=False)
+        timings["open_exec"] = time.monotonic() - t1
+
+        out = b""
+        while _MARKER not in out:
+            data = stream.recv(4096)
+            if not data:
+                break
+            out += data
+        timings["first_output"] = time.monotonic() - t1
+        stream.close()
+    finally:
+        t2 = time.monotonic()
+        backend.destroy(handle)
+        timings["destroy"] = time.monotonic() - t2
+
+    timings["total"] = time.monotonic() - t0
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare session backend latency")
+    parser.add_argument("backends", nargs="+", help="e.g. docker pty")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    command = ["sh", "-c", f"echo {_MARKER.decode()}"]
+
+    for name in args.backends:
+        backend = manager.create_backend(name)
+        backend.init()
+        _run_once(backend, command)
+
+        results = [_run_once(backend, command) for _ in range(args.iterations)]
+        print(f"\n[+] {name} — {args.iterations} iterations (ms)")
+        print(f"    {'stage':<14}{'p50':>10}{'p95':>10}{'max':>10}")
+        for stage in ("provision", "open_exec", "first_output", "destroy", "total"):
+            values = [r[stage] * 1000 for r in results]
+            print(
+                f"    {stage:<14}{statistics.median(values):>10.1f}"
+                f"{_percentile(values, 0.95):>10.1f}{max(values):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import sys
+
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import canaries
+
+load_dotenv()
+
+
+async def _lookup(tokens: list[str]) -> int:
+    missing = 0
+    for token in tokens:
+        doc = await canaries.lookup(token)
+        if doc is None:
+            print(f"[-] {token}: not issued by this sensor")
+            missing += 1
+            continue
+        session = await db.get_db().sessions.find_one(
+            {"session_id": doc["session_id"]}, {"source_ip": 1, "username": 1, "started_at": 1}
+        ) or {}
+        print(
+            f"[+] {token}: {doc['kind']}:{doc['label']} issued {doc['issued_at']} "
+            f"to session {doc['session_id']} ({session.get('source_ip', '?')}, "
+            f"user {session.get('username', '?')!r}) via {', '.join(doc['paths'])}"
+        )
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Map leaked canary tokens back to the session that was handed them")
+    parser.add_argument("tokens", nargs="+", help="Token values seen in the wild (access key id, password, URL path, ...)")
+    args = parser.parse_args()
+    db.init()
+    missing = asyncio.run_coroutine_threadsafe(_lookup(args.tokens), db.get_loop()).result()
+    if missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import export
+
+load_dotenv()
+
+
+def _parse_time(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export threat intel as STIX 2.1 bundles or flat feeds")
+    parser.add_argument("--name", default="default", help="Checkpoint name for incremental exports")
+    parser.add_argument("--format", choices=export.FORMATS, default="stix")
+    parser.add_argument("--out", default=None, help="Output directory (default: EXPORT_DIR)")
+    parser.add_argument("--since", help="ISO timestamp; default: the checkpoint, or the first session")
+    parser.add_argument("--until", help="ISO timestamp; default: now")
+    parser.add_argument("--parallel", type=int, default=None, help="Day partitions exported concurrently")
+    args = parser.parse_args()
+
+    kwargs = {}
+    if args.out:
+        kwargs["out_dir"] = args.out
+    if args.parallel:
+        kwargs["parallel"] = args.parallel
+
+    db.init()
+    started = time.monotonic()
+    results = asyncio.run_coroutine_threadsafe(
+        export.run(
+            args.name,
+            args.format,
+            since=_parse_time(args.since) if args.since else None,
+            until=_parse_time(args.until) if args.until else None,
+            **kwargs,
+        ),
+        db.get_loop(),
+    ).result()
+
+    for path, count in sorted(results.items()):
+        print(f"[+] {path}  {count} objects")
+    print(f"[+] {len(results)} partitions in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import argparse
+import asyncio
+import time
+
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import geoip
+
+load_dotenv()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Enrich stored sessions with GeoIP/ASN data")
+    parser.add_argument("--refresh", action="store_true", help="Re-resolve sessions that already have geo data")
+    parser.add_argument("--batch", type=int, default=1000, help="Distinct IPs per bulk write")
+    args = parser.parse_args()
+
+    db.init()
+    geoip.init()
+    started = time.monotonic()
+    count = asyncio.run_coroutine_threadsafe(
+        geoip.backfill(refresh=args.refresh, batch=args.batch), db.get_loop()
+    ).result()
+    print(f"[+] Enriched {count} sessions in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
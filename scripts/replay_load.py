@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import base64
+import difflib
+import json
+import re
+import statistics
+import sys
+import threading
+import time
+
+import paramiko
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import campaigns
+
+load_dotenv()
+
+_ANSI_RE = re.compile(rb"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b[()][0-9A-Za-z]|\x1b[=>]|\r")
+_WS_RE = re.compile(rb"[ \t]+")
+_FIDELITY_MAX_BYTES = 64 * 1024
+_TAIL_S = 2.0
+_CHUNK_SIZE = 4096
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def normalize(data: bytes) -> bytes:
+    return _WS_RE.sub(b" ", _ANSI_RE.sub(b"", data))[:_FIDELITY_MAX_BYTES]
+
+
+def fidelity(recorded: bytes, replayed: bytes) -> float:
+    a, b = normalize(recorded), normalize(replayed)
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a.splitlines(), b.splitlines(), autojunk=False).ratio()
+
+
+def ramp_limit(elapsed_s: float, ramp_s: float, concurrency: int) -> int:
+    if ramp_s <= 0 or elapsed_s >= ramp_s:
+        return concurrency
+    return max(1, int(concurrency * elapsed_s / ramp_s) + 1)
+
+
+class Recording:
+    def __init__(self, session: dict, chunks: list[dict]) -> None:
+        self.session_id = session["session_id"]
+        self.username = session["username"]
+        self.password = session.get("password") or ""
+        self.exec_command = session.get("exec_command")
+        started = chunks[0]["timestamp"] if chunks else session["started_at"]
+        self.inputs: list[tuple[float, bytes]] = []
+        output = bytearray()
+        for chunk in chunks:
+            data = base64.b64decode(chunk["data"])
+            if chunk["direction"] == "input":
+                self.inputs.append(((chunk["timestamp"] - started).total_seconds(), data))
+            else:
+                output += data
+        self.output = bytes(output)
+
+
+async def _load(limit: int, campaign: str | None) -> list[Recording]:
+    query: dict = {"status": {"$in": ["completed", "terminated"]}, "auth_method": "password"}
+    if campaign:
+        query["campaign_id"] = campaign
+    sessions = await db.get_db().sessions.find(query).sort("started_at", -1).to_list(length=limit)
+    recordings = []
+    for session in sessions:
+        chunks = await campaigns.load_keystrokes(session["session_id"])
+        if chunks:
+            recordings.append(Recording(session, chunks))
+    return recordings
+
+
+def _replay(host: str, port: int, rec: Recording, compression: float) -> dict:
+    result: dict = {"session_id": rec.session_id, "error": None}
+    started = time.monotonic()
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    output = bytearray()
+    try:
+        client.connect(
+            host, port=port, username=rec.username, password=rec.password,
+            look_for_keys=False, allow_agent=False, timeout=30, banner_timeout=30, auth_timeout=30,
+        )
+        result["connect_ms"] = (time.monotonic() - started) * 1000
+
+        if rec.exec_command:
+            chan = client.get_transport().open_session()
+            chan.exec_command(rec.exec_command)
+        else:
+            chan = client.invoke_shell(width=80, height=24)
+        opened = time.monotonic()
+
+        def _reader() -> None:
+            while True:
+                data = chan.recv(_CHUNK_SIZE)
+                if not data:
+                    break
+                if "first_output_ms" not in result:
+                    result["first_output_ms"] = (time.monotonic() - opened) * 1000
+                output.extend(data)
+
+        reader = threading.Thread(target=_reader, daemon=True)
+        reader.start()
+        for offset_s, data in rec.inputs:
+            delay = opened + offset_s / compression - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            chan.sendall(data)
+        reader.join(timeout=_TAIL_S if not rec.exec_command else 30)
+        chan.close()
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    finally:
+        client.close()
+
+    result["duration_s"] = time.monotonic() - started
+    result["bytes_in"] = sum(len(d) for _, d in rec.inputs)
+    result["bytes_out"] = len(output)
+    result["fidelity"] = fidelity(rec.output, bytes(output))
+    return result
+
+
+def _run_all(host: str, port: int, recordings: list[Recording], args: argparse.Namespace) -> list[dict]:
+    results: list[dict] = []
+    cond = threading.Condition()
+    active = 0
+    started = time.monotonic()
+
+    def _worker(rec: Recording) -> None:
+        nonlocal active
+        result = _replay(host, port, rec, args.compression)
+        with cond:
+            results.append(result)
+            active -= 1
+            cond.notify_all()
+
+    queue = recordings * args.repeat
+    for i, rec in enumerate(queue):
+        with cond:
+            while active >= ramp_limit(time.monotonic() - started, args.ramp, args.concurrency):
+                cond.wait(0.1)
+            active += 1
+        threading.Thread(target=_worker, args=(rec,), daemon=True).start()
+        if (i + 1) % 50 == 0:
+            print(f"    started {i + 1}/{len(queue)} (active {active})", file=sys.stderr)
+
+    with cond:
+        while active:
+            cond.wait(0.5)
+    return results
+
+
+async def _dbstats() -> dict:
+    database = db.get_db()
+    stats = await database.command("dbstats")
+    counts = {
+        name: await database[name].estimated_document_count()
+        for name in ("sessions", "keystrokes", "uploads", "connections")
+    }
+    return {"data_bytes": stats["dataSize"], "storage_bytes": stats["storageSize"], "counts": counts}
+
+
+def _summary(results: list[dict], wall_s: float, before: dict, after: dict) -> dict:
+    ok = [r for r in results if r["error"] is None]
+
+    def _stats(key: str) -> dict:
+        values = [r[key] for r in ok if key in r]
+        if not values:
+            return {}
+        return {
+            "p50": round(statistics.median(values), 1),
+            "p95": round(_percentile(values, 0.95), 1),
+            "max": round(max(values), 1),
+        }
+
+    fidelities = [r["fidelity"] for r in ok]
+    return {
+        "sessions": len(results),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall_s, 1),
+        "sessions_per_s": round(len(results) / wall_s, 2) if wall_s else 0.0,
+        "bytes_out_per_s": round(sum(r["bytes_out"] for r in ok) / wall_s) if wall_s else 0,
+        "connect_ms": _stats("connect_ms"),
+        "first_output_ms": _stats("first_output_ms"),
+        "fidelity": {
+            "mean": round(statistics.mean(fidelities), 3) if fidelities else None,
+            "p10": round(_percentile(fidelities, 0.10), 3) if fidelities else None,
+        },
+        "storage_growth_bytes": after["storage_bytes"] - before["storage_bytes"],
+        "data_growth_bytes": after["data_bytes"] - before["data_bytes"],
+        "documents_added": {k: after["counts"][k] - before["counts"][k] for k in after["counts"]},
+        "error_samples": sorted({r["error"] for r in results if r["error"]})[:5],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded sessions against a HoneyShell proxy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--sessions", type=int, default=100, help="Most recent recorded sessions to load")
+    parser.add_argument("--campaign", help="Only replay sessions from this campaign_id")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the loaded set this many times")
+    parser.add_argument("--compression", type=float, default=10.0, help="Time compression factor (1 = real time)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ramp", type=float, default=30.0, help="Seconds to ramp from 1 to --concurrency")
+    parser.add_argument("--json", help="Write the summary to this file for comparison between releases")
+    args = parser.parse_args()
+
+    db.init()
+    loop = db.get_loop()
+    recordings = asyncio.run_coroutine_threadsafe(_load(args.sessions, args.campaign), loop).result()
+    if not recordings:
+        print("[-] No recorded sessions with keystrokes found", file=sys.stderr)
+        sys.exit(1)
+    print(f"[+] Loaded {len(recordings)} recordings; replaying {len(recordings) * args.repeat} sessions "
+          f"at {args.compression:g}x, concurrency {args.concurrency} (ramp {args.ramp:g}s)")
+
+    before = asyncio.run_coroutine_threadsafe(_dbstats(), loop).result()
+    started = time.monotonic()
+    results = _run_all(args.host, args.port, recordings, args)
+    wall_s = time.monotonic() - started
+    time.sleep(_TAIL_S)
+    after = asyncio.run_coroutine_threadsafe(_dbstats(), loop).result()
+
+    summary = _summary(results, wall_s, before, after)
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "summary": summary, "results": results}, f, indent=2)
+        print(f"[+] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
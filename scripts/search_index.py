@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import storage.database as db
+from storage import search
+
+load_dotenv()
+
+
+def _parse_time(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+async def _rebuild() -> None:
+    started = time.monotonic()
+    count = await search.rebuild()
+    print(f"[+] Indexed {count} sessions in {time.monotonic() - started:.1f}s")
+
+
+async def _query(args: argparse.Namespace) -> None:
+    started = time.monotonic()
+    hits, cursor = await search.query(
+        text=args.text,
+        term=args.term,
+        source_ip=args.ip,
+        since=_parse_time(args.since) if args.since else None,
+        until=_parse_time(args.until) if args.until else None,
+        limit=args.limit,
+        before=args.before,
+    )
+    elapsed_ms = (time.monotonic() - started) * 1000
+
+    needle = (args.text or args.term or "").lower()
+    for hit in hits:
+        print(f"{hit['doc_id']:>8}  {hit['session_id']}  {hit['source_ip']}  {hit['started_at']}")
+        for line in hit["lines"]:
+            if needle and needle in line.lower():
+                print(f"          $ {line}")
+
+    print(f"[+] {len(hits)} hits in {elapsed_ms:.1f}ms")
+    if cursor is not None:
+        print(f"[+] Next page: --before {cursor}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HoneyShell session search index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("rebuild", help="Drop and rebuild the index from sessions + keystrokes")
+
+    q = sub.add_parser("query", help="Search indexed sessions")
+    q.add_argument("text", nargs="?", help="Case-insensitive substring (min 3 chars)")
+    q.add_argument("--term", help="Whole-term match")
+    q.add_argument("--ip", help="Restrict to a source IP")
+    q.add_argument("--since", help="ISO timestamp (inclusive)")
+    q.add_argument("--until", help="ISO timestamp (exclusive)")
+    q.add_argument("--limit", type=int, default=20)
+    q.add_argument("--before", type=int, help="Pagination cursor from a previous page")
+
+    args = parser.parse_args()
+    db.init()
+
+    try:
+        if args.cmd == "rebuild":
+            coro = _rebuild()
+        else:
+            coro = _query(args)
+        asyncio.run_coroutine_threadsafe(coro, db.get_loop()).result()
+    except ValueError as exc:
+        print(f"[-] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
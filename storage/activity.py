@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import CollectionInvalid
+
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+_FLUSH_INTERVAL_S = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_S", "15"))
+_RETAIN_MINUTE_DAYS = int(os.getenv("ACTIVITY_RETAIN_MINUTE_DAYS", "7"))
+_RETAIN_HOURLY_DAYS = int(os.getenv("ACTIVITY_RETAIN_HOURLY_DAYS", "90"))
+_RETAIN_DAILY_DAYS = int(os.getenv("ACTIVITY_RETAIN_DAILY_DAYS", "1825"))
+_MAX_POINTS = 2000
+
+_RESOLUTIONS = (
+    ("activity", timedelta(minutes=1)),
+    ("activity_hourly", timedelta(hours=1)),
+    ("activity_daily", timedelta(days=1)),
+)
+
+_lock = threading.Lock()
+_counters: dict[tuple[int, str, tuple], int] = {}
+
+
+def record(metric: str, value: int = 1, **tags: str) -> None:
+    key = (int(time.time()) // 60, metric, tuple(sorted(tags.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _take(final: bool) -> dict[tuple[int, str, tuple], int]:
+    global _counters
+    current = int(time.time()) // 60
+    with _lock:
+        if final:
+            taken, _counters = _counters, {}
+        else:
+            taken = {k: v for k, v in _counters.items() if k[0] < current}
+            for k in taken:
+                del _counters[k]
+    return taken
+
+
+async def flush(final: bool = False) -> None:
+    taken = _take(final)
+    if not taken:
+        return
+
+    docs = [
+        {
+            "ts": datetime.fromtimestamp(minute * 60, timezone.utc),
+            "meta": {"metric": metric, **dict(tags)},
+            "value": value,
+        }
+        for (minute, metric, tags), value in taken.items()
+    ]
+    await get_db().activity.insert_many(docs, ordered=False)
+    log.debug(f"Activity flushed — {len(docs)} points")
+
+
+async def _rollup(source: str, target: str, unit: str, start: datetime, end: datetime) -> None:
+    await get_db()[source].aggregate([
+        {"$match": {"ts": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"meta": "$meta", "ts": {"$dateTrunc": {"date": "$ts", "unit": unit}}},
+            "value": {"$sum": "$value"},
+        }},
+        {"$project": {"_id": 1, "ts": "$_id.ts", "meta": "$_id.meta", "value": 1}},
+        {"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(length=None)
+
+
+async def downsample(now: datetime | None = None) -> None:
+    now = now or datetime.now(timezone.utc)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    await _rollup("activity", "activity_hourly", "hour", hour - timedelta(hours=2), hour)
+    await _rollup("activity_hourly", "activity_daily", "day", day - timedelta(days=2), day)
+
+
+async def _run_forever() -> None:
+    last_hour = None
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL_S)
+        try:
+            await flush()
+            hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            if hour != last_hour:
+                await downsample()
+                last_hour = hour
+        except Exception:
+            log.exception("Activity flush failed")
+
+
+async def ensure_collections() -> None:
+    db = get_db()
+    try:
+        await db.create_collection(
+            "activity",
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+            expireAfterSeconds=_RETAIN_MINUTE_DAYS * 86400,
+        )
+        log.info("Created time-series collection 'activity'")
+    except CollectionInvalid:
+        pass
+
+    await db.activity_hourly.create_index("ts", expireAfterSeconds=_RETAIN_HOURLY_DAYS * 86400)
+    await db.activity_hourly.create_index([("meta.metric", 1), ("ts", 1)])
+    await db.activity_daily.create_index("ts", expireAfterSeconds=_RETAIN_DAILY_DAYS * 86400)
+    await db.activity_daily.create_index([("meta.metric", 1), ("ts", 1)])
+
+
+async def series(
+    metric: str,
+    start: datetime,
+    end: datetime,
+    max_points: int = _MAX_POINTS,
+    **tags: str,
+) -> list[tuple[datetime, int]]:
+    for collection, step in _RESOLUTIONS:
+        if (end - start) / step <= max_points:
+            break
+
+    match = {"meta.metric": metric, "ts": {"$gte": start, "$lt": end}}
+    match.update({f"meta.{k}": v for k, v in tags.items()})
+    rows = await get_db()[collection].aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$ts", "value": {"$sum": "$value"}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(length=None)
+    return [(r["_id"], r["value"]) for r in rows]
+
+
+def init() -> None:
+    loop = get_loop()
+    asyncio.run_coroutine_threadsafe(ensure_collections(), loop).result(timeout=10)
+    asyncio.run_coroutine_threadsafe(_run_forever(), loop)
+    log.info("Activity recorder initialised")
+
+
+def shutdown() -> None:
+    try:
+        asyncio.run_coroutine_threadsafe(flush(final=True), get_loop()).result(timeout=5)
+    except Exception:
+        log.exception("Final activity flush failed")
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import uuid
+from datetime import timedelta
+
+from pymongo import DeleteOne
+
+from capture import tty_recorder
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+_SIMILARITY = float(os.getenv("CAMPAIGN_SIMILARITY", "0.8"))
+_DEDUP = os.getenv("CAMPAIGN_DEDUP", "0") == "1"
+_TEMPLATE_MAX_BYTES = int(os.getenv("CAMPAIGN_TEMPLATE_MAX_BYTES", "65536"))
+_MAX_SOURCE_IPS = 1000
+_LSH_CANDIDATES = 20
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+
+_rng = random.Random(0x484F4E4559)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+
+_NORMALIZERS = [
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\b\d{2,}\b"), "<n>"),
+    (re.compile(r"\b[0-9a-fA-F]{8,}\b"), "<hex>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize(line: str) -> str:
+    for pattern, repl in _NORMALIZERS:
+        line = pattern.sub(repl, line)
+    return line.strip()
+
+
+def command_hash(lines: list[str]) -> str:
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def _shingles(lines: list[str]) -> set[str]:
+    out = set(lines)
+    out.update(f"{a}\n{b}" for a, b in zip(lines, lines[1:]))
+    return out
+
+
+def minhash(lines: list[str]) -> list[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+        for s in _shingles(lines)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def lsh_bands(signature: list[int]) -> list[str]:
+    out = []
+    for band in range(_BANDS):
+        rows = signature[band * _ROWS:(band + 1) * _ROWS]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+        out.append(f"{band}:{digest}")
+    return out
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / _NUM_PERM
+
+
+async def _find_campaign(template_hash: str, signature: list[int], bands: list[str]) -> tuple[dict | None, bool]:
+    campaigns = get_db().campaigns
+
+    exact = await campaigns.find_one({"template_hash": template_hash})
+    if exact is not None:
+        return exact, True
+
+    best, best_score = None, _SIMILARITY
+    async for c in campaigns.find({"lsh_bands": {"$in": bands}}).limit(_LSH_CANDIDATES):
+        score = similarity(signature, c["signature"])
+        if score >= best_score:
+            best, best_score = c, score
+    return best, False
+
+
+async def _session_chunks(session_id: str) -> list[dict]:
+    await tty_recorder.drain(session_id)
+    return await get_db().keystrokes.find(
+        {"session_id": session_id}
+    ).sort("timestamp", 1).to_list(length=None)
+
+
+async def _template_chunks(session_id: str) -> list[dict] | None:
+    chunks = await _session_chunks(session_id)
+    if sum(len(k["data"]) for k in chunks) > _TEMPLATE_MAX_BYTES:
+        return None
+    return [{"direction": k["direction"], "data": k["data"]} for k in chunks]
+
+
+async def _store_delta(session: dict, campaign: dict) -> None:
+    session_id = session["session_id"]
+    template = campaign.get("template_chunks")
+    if not template:
+        return
+
+    chunks = await _session_chunks(session_id)
+    if len(chunks) != len(template):
+        return
+
+    started_at = session["started_at"]
+    offsets_ms, kept, ops = [], [], []
+    for i, (chunk, tmpl) in enumerate(zip(chunks, template)):
+        ts = chunk["timestamp"]
+        offsets_ms.append(int((ts - started_at).total_seconds() * 1000))
+        if chunk["direction"] == tmpl["direction"] and chunk["data"] == tmpl["data"]:
+            ops.append(DeleteOne({"_id": chunk["_id"]}))
+        else:
+            kept.append(i)
+
+    if not ops:
+        return
+
+    db = get_db()
+    await db.sessions.update_one(
+        {"session_id": session_id},
+        {"$set": {"keystroke_delta": {
+            "campaign_id": campaign["campaign_id"],
+            "offsets_ms": offsets_ms,
+            "kept": kept,
+        }}},
+    )
+    await db.keystrokes.bulk_write(ops, ordered=False)
+    log.info(
+        f"[session:{session_id[:8]}] keystrokes deduplicated against campaign "
+        f"{campaign['campaign_id'][:8]} — {len(ops)}/{len(chunks)} chunks dropped"
+    )
+
+
+async def assign(session: dict, lines: list[str]) -> str | None:
+    if not lines:
+        return None
+
+    session_id = session["session_id"]
+    normalized = [normalize(line) for line in lines]
+    template_hash = command_hash(normalized)
+    signature = minhash(normalized)
+    bands = lsh_bands(signature)
+    seen_at = session["started_at"]
+    source_ip = session.get("source_ip")
+
+    db = get_db()
+    campaign, exact = await _find_campaign(template_hash, signature, bands)
+    created = False
+
+    if campaign is None:
+        campaign = {
+            "campaign_id": str(uuid.uuid4()),
+            "template_hash": template_hash,
+            "template_session_id": session_id,
+            "template_commands": lines[:50],
+            "template_chunks": await _template_chunks(session_id) if _DEDUP else None,
+            "signature": signature,
+            "lsh_bands": bands,
+            "first_seen": seen_at,
+            "last_seen": seen_at,
+            "session_count": 1,
+            "exact_count": 1,
+            "source_ips": [source_ip] if source_ip else [],
+        }
+        result = await db.campaigns.update_one(
+            {"template_hash": template_hash},
+            {"$setOnInsert": campaign},
+            upsert=True,
+        )
+        created = result.upserted_id is not None
+        if created:
+            log.info(f"[session:{session_id[:8]}] new campaign {campaign['campaign_id'][:8]}")
+        else:
+            campaign, exact = await db.campaigns.find_one({"template_hash": template_hash}), True
+
+    if not created:
+        update: dict = {
+            "$max": {"last_seen": seen_at},
+            "$min": {"first_seen": seen_at},
+            "$inc": {"session_count": 1, "exact_count": int(exact)},
+        }
+        if source_ip and len(campaign.get("source_ips", [])) < _MAX_SOURCE_IPS:
+            update["$addToSet"] = {"source_ips": source_ip}
+        await db.campaigns.update_one({"_id": campaign["_id"]}, update)
+
+    await db.sessions.update_one(
+        {"session_id": session_id},
+        {"$set": {"campaign_id": campaign["campaign_id"], "command_hash": template_hash}},
+    )
+
+    if _DEDUP and exact and not created:
+        await _store_delta(session, campaign)
+    return campaign["campaign_id"]
+
+
+async def load_keystrokes(session_id: str) -> list[dict]:
+    db = get_db()
+    session = await db.sessions.find_one({"session_id": session_id})
+    own = await db.keystrokes.find({"session_id": session_id}).sort("timestamp", 1).to_list(length=None)
+
+    delta = (session or {}).get("keystroke_delta")
+    if not delta:
+        return own
+
+    campaign = await db.campaigns.find_one({"campaign_id": delta["campaign_id"]})
+    template = campaign["template_chunks"]
+    started_at = session["started_at"]
+    kept = iter(own)
+    kept_idx = set(delta["kept"])
+
+    out = []
+    for i, offset_ms in enumerate(delta["offsets_ms"]):
+        if i in kept_idx:
+            out.append(next(kept))
+            continue
+        out.append({
+            "session_id": session_id,
+            "timestamp": started_at + timedelta(milliseconds=offset_ms),
+            "data": template[i]["data"],
+            "direction": template[i]["direction"],
+        })
+    return out
+
+
+async def ensure_indexes() -> None:
+    db = get_db()
+    await db.campaigns.create_index("campaign_id", unique=True)
+    await db.campaigns.create_index("template_hash", unique=True)
+    await db.campaigns.create_index("lsh_bands")
+    await db.campaigns.create_index("last_seen")
+    await db.sessions.create_index("campaign_id")
+
+
+def init() -> None:
+    asyncio.run_coroutine_threadsafe(ensure_indexes(), get_loop()).result(timeout=10)
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+
+async def record(session_id: str, container_id: str, tokens: list[dict]) -> None:
+    if not tokens:
+        return
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            "_id": t["token"],
+            "session_id": session_id,
+            "container_id": container_id,
+            "kind": t["kind"],
+            "label": t["label"],
+            "paths": t["paths"],
+            "issued_at": now,
+        }
+        for t in tokens
+    ]
+    await get_db().canary_tokens.insert_many(docs, ordered=False)
+    log.debug(f"[session:{session_id[:8]}] {len(docs)} canary tokens issued")
+
+
+async def lookup(token: str) -> dict | None:
+    return await get_db().canary_tokens.find_one({"_id": token.strip()})
+
+
+async def ensure_indexes() -> None:
+    await get_db().canary_tokens.create_index("session_id")
+
+
+def init() -> None:
+    asyncio.run_coroutine_threadsafe(ensure_indexes(), get_loop()).result(timeout=10)
@@ -0,0 +1,282 @@
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+from storage.database import get_db
+
+log = logging.getLogger(__name__)
+
+_EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+_PARALLEL = int(os.getenv("EXPORT_PARALLEL", "4"))
+
+_STIX_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
+_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/DwivediUtkarsh/HoneyShell")
+_IDENTITY_ID = f"identity--{uuid.uuid5(_NAMESPACE, 'identity')}"
+_EPOCH = "2024-01-01T00:00:00.000Z"
+
+FORMATS = ("stix", "ndjson", "csv")
+_EXTENSIONS = {"stix": "json", "ndjson": "ndjson", "csv": "csv"}
+_CSV_FIELDS = ("type", "value", "first_seen", "session_id", "source_ip")
+
+_SESSION_FIELDS = {"_id": 0, "session_id": 1, "source_ip": 1, "username": 1, "password": 1,
+                   "started_at": 1, "ended_at": 1}
+_UPLOAD_FIELDS = {"_id": 0, "session_id": 1, "filename": 1, "size_bytes": 1, "content_hash": 1,
+                  "uploaded_at": 1}
+
+
+def _ts(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _canonical(obj: dict) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _sco(kind: str, **props) -> dict:
+    sco_id = uuid.uuid5(_STIX_NAMESPACE, _canonical(props))
+    return {"type": kind, "spec_version": "2.1", "id": f"{kind}--{sco_id}", **props}
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _indicator(pattern: str, name: str, seen: str) -> dict:
+    return {
+        "type": "indicator",
+        "spec_version": "2.1",
+        "id": f"indicator--{uuid.uuid5(_NAMESPACE, pattern)}",
+        "created_by_ref": _IDENTITY_ID,
+        "created": _EPOCH,
+        "modified": seen,
+        "name": name,
+        "indicator_types": ["malicious-activity"],
+        "pattern": pattern,
+        "pattern_type": "stix",
+        "valid_from": seen,
+    }
+
+
+def _identity() -> dict:
+    return {
+        "type": "identity",
+        "spec_version": "2.1",
+        "id": _IDENTITY_ID,
+        "created": _EPOCH,
+        "modified": _EPOCH,
+        "name": "HoneyShell",
+        "identity_class": "system",
+    }
+
+
+class _Dedup:
+    def __init__(self) -> None:
+        self._seen: set[bytes] = set()
+
+    def first(self, *parts: str) -> bool:
+        digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=16).digest()
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+def _ip_kind(ip: str) -> str:
+    return "ipv6-addr" if ":" in ip else "ipv4-addr"
+
+
+def session_objects(session: dict, dedup: _Dedup) -> Iterator[dict]:
+    ip = session["source_ip"]
+    seen = _ts(session["started_at"])
+    address = _sco(_ip_kind(ip), value=ip)
+    account = _sco("user-account", account_login=session["username"], credential=session.get("password") or "")
+    if dedup.first("ip", ip):
+        yield address
+        yield _indicator(f"[{address['type']}:value = {_quote(ip)}]", f"Honeypot attacker {ip}", seen)
+    if dedup.first("credential", session["username"], session.get("password") or ""):
+        yield account
+        yield _indicator(
+            f"[user-account:account_login = {_quote(session['username'])} AND "
+            f"user-account:credential = {_quote(session.get('password') or '')}]",
+            f"Credential tried against honeypot: {session['username']}",
+            seen,
+        )
+    yield {
+        "type": "observed-data",
+        "spec_version": "2.1",
+        "id": f"observed-data--{uuid.uuid5(_NAMESPACE, session['session_id'])}",
+        "created_by_ref": _IDENTITY_ID,
+        "created": seen,
+        "modified": seen,
+        "first_observed": seen,
+        "last_observed": _ts(session["ended_at"]),
+        "number_observed": 1,
+        "object_refs": [address["id"], account["id"]],
+        "x_honeyshell_session_id": session["session_id"],
+    }
+
+
+def upload_objects(upload: dict, dedup: _Dedup) -> Iterator[dict]:
+    sha256 = upload["content_hash"]
+    if not dedup.first("sha256", sha256):
+        return
+    seen = _ts(upload["uploaded_at"])
+    yield _sco("file", hashes={"SHA-256": sha256}, size=upload["size_bytes"])
+    yield _indicator(
+        f"[file:hashes.'SHA-256' = {_quote(sha256)}]",
+        f"Payload uploaded to honeypot: {upload['filename']}",
+        seen,
+    )
+
+
+def session_rows(session: dict, dedup: _Dedup) -> Iterator[dict]:
+    ip = session["source_ip"]
+    base = {"first_seen": _ts(session["started_at"]), "session_id": session["session_id"], "source_ip": ip}
+    if dedup.first("ip", ip):
+        yield {"type": _ip_kind(ip).split("-")[0], "value": ip, **base}
+    password = session.get("password") or ""
+    if dedup.first("credential", session["username"], password):
+        yield {"type": "credential", "value": f"{session['username']}:{password}", **base}
+
+
+def upload_rows(upload: dict, dedup: _Dedup) -> Iterator[dict]:
+    if dedup.first("sha256", upload["content_hash"]):
+        yield {
+            "type": "sha256",
+            "value": upload["content_hash"],
+            "first_seen": _ts(upload["uploaded_at"]),
+            "session_id": upload["session_id"],
+            "source_ip": "",
+        }
+
+
+class _StixWriter:
+    def __init__(self, f) -> None:
+        self._f = f
+        self._first = True
+        f.write(f'{{"type":"bundle","id":"bundle--{uuid.uuid4()}","objects":[\n')
+        self.write(_identity())
+
+    def write(self, obj: dict) -> None:
+        self._f.write(("" if self._first else ",\n") + json.dumps(obj, ensure_ascii=False))
+        self._first = False
+
+    def close(self) -> None:
+        self._f.write("\n]}\n")
+
+
+class _NdjsonWriter:
+    def __init__(self, f) -> None:
+        self._f = f
+
+    def write(self, row: dict) -> None:
+        self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        pass
+
+
+class _CsvWriter:
+    def __init__(self, f) -> None:
+        self._w = csv.DictWriter(f, fieldnames=_CSV_FIELDS)
+        self._w.writeheader()
+
+    def write(self, row: dict) -> None:
+        self._w.writerow(row)
+
+    def close(self) -> None:
+        pass
+
+
+_WRITERS = {"stix": _StixWriter, "ndjson": _NdjsonWriter, "csv": _CsvWriter}
+
+
+async def export_partition(fmt: str, path: str, start: datetime, end: datetime) -> int:
+    db = get_db()
+    dedup = _Dedup()
+    sessions_gen, uploads_gen = (session_objects, upload_objects) if fmt == "stix" else (session_rows, upload_rows)
+    count = 0
+    with open(path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        writer = _WRITERS[fmt](f)
+        cursor = db.sessions.find(
+            {"ended_at": {"$gte": start, "$lt": end}}, _SESSION_FIELDS
+        ).sort("ended_at", 1).batch_size(_BATCH)
+        async for session in cursor:
+            for obj in sessions_gen(session, dedup):
+                writer.write(obj)
+                count += 1
+        cursor = db.uploads.find(
+            {"uploaded_at": {"$gte": start, "$lt": end}}, _UPLOAD_FIELDS
+        ).sort("uploaded_at", 1).batch_size(_BATCH)
+        async for upload in cursor:
+            for obj in uploads_gen(upload, dedup):
+                writer.write(obj)
+                count += 1
+        writer.close()
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def partitions(start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+    out = []
+    cursor = start
+    while cursor < end:
+        next_day = (cursor + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        out.append((cursor, min(next_day, end)))
+        cursor = next_day
+    return out
+
+
+async def _earliest() -> datetime | None:
+    first = await get_db().sessions.find_one({"ended_at": {"$ne": None}}, {"ended_at": 1}, sort=[("ended_at", 1)])
+    return first["ended_at"] if first else None
+
+
+async def run(
+    name: str,
+    fmt: str,
+    out_dir: str = _EXPORT_DIR,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    parallel: int = _PARALLEL,
+) -> dict[str, int]:
+    db = get_db()
+    until = until or datetime.now(timezone.utc)
+    if since is None:
+        checkpoint = await db.export_checkpoints.find_one({"_id": name})
+        since = checkpoint["until"] if checkpoint else await _earliest()
+    if since is None:
+        return {}
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    await db.sessions.create_index("ended_at")
+    await db.uploads.create_index("uploaded_at")
+    os.makedirs(out_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def _one(start: datetime, end: datetime) -> tuple[str, int]:
+        path = os.path.join(out_dir, f"{name}-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.{_EXTENSIONS[fmt]}")
+        async with semaphore:
+            return path, await export_partition(fmt, path, start, end)
+
+    results = dict(await asyncio.gather(*(_one(s, e) for s, e in partitions(since, until))))
+    await db.export_checkpoints.update_one(
+        {"_id": name},
+        {"$set": {"until": until, "format": fmt, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    log.info(f"Export {name!r} wrote {sum(results.values())} objects in {len(results)} partitions")
+    return results
@@ -0,0 +1,294 @@
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from functools import lru_cache
+
+from pymongo import UpdateMany
+
+from storage.database import get_db
+
+log = logging.getLogger(__name__)
+
+_COUNTRY_DB = os.getenv("GEOIP_COUNTRY_DB", "")
+_ASN_DB = os.getenv("GEOIP_ASN_DB", "")
+_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+_RELOAD_CHECK_S = float(os.getenv("GEOIP_RELOAD_CHECK_S", "30"))
+
+_METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+_DATA_SEPARATOR = 16
+
+
+class _MmdbReader:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self._buf.rfind(_METADATA_MARKER)
+        if start < 0:
+            raise ValueError(f"{path}: not a MaxMind DB file")
+        meta, _ = self._decode(start + len(_METADATA_MARKER), start + len(_METADATA_MARKER))
+        self._nodes = meta["node_count"]
+        self._record_size = meta["record_size"]
+        if self._record_size not in (24, 28, 32):
+            raise ValueError(f"{path}: unsupported record size {self._record_size}")
+        self._ip_version = meta["ip_version"]
+        self._node_bytes = self._record_size // 4
+        self._data = self._node_bytes * self._nodes + _DATA_SEPARATOR
+        self._ipv4_start = 0
+        if self._ip_version == 6:
+            node = 0
+            for _ in range(96):
+                if node >= self._nodes:
+                    break
+                node = self._record(node, 0)
+            self._ipv4_start = node
+
+    def _record(self, node: int, bit: int) -> int:
+        offset = node * self._node_bytes
+        b = self._buf
+        if self._record_size == 24:
+            offset += bit * 3
+            return int.from_bytes(b[offset:offset + 3], "big")
+        if self._record_size == 28:
+            middle = b[offset + 3]
+            if bit:
+                return ((middle & 0x0F) << 24) | int.from_bytes(b[offset + 4:offset + 7], "big")
+            return ((middle & 0xF0) << 20) | int.from_bytes(b[offset:offset + 3], "big")
+        offset += bit * 4
+        return int.from_bytes(b[offset:offset + 4], "big")
+
+    def lookup(self, ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> dict | None:
+        if ip.version == 4 and self._ip_version == 6:
+            node, bits = self._ipv4_start, 32
+        elif ip.version == 6 and self._ip_version == 4:
+            return None
+        else:
+            node, bits = 0, ip.max_prefixlen
+        value = int(ip)
+        for i in range(bits - 1, -1, -1):
+            if node >= self._nodes:
+                break
+            node = self._record(node, (value >> i) & 1)
+        if node <= self._nodes:
+            return None
+        offset = self._data + node - self._nodes - _DATA_SEPARATOR
+        return self._decode(offset, self._data)[0]
+
+    def _size(self, offset: int, size: int) -> tuple[int, int]:
+        if size < 29:
+            return size, offset
+        extra = size - 28
+        raw = int.from_bytes(self._buf[offset:offset + extra], "big")
+        return (29, 285, 65821)[extra - 1] + raw, offset + extra
+
+    def _decode(self, offset: int, base: int):
+        b = self._buf
+        ctrl = b[offset]
+        offset += 1
+        kind = ctrl >> 5
+        if kind == 1:
+            length = ((ctrl >> 3) & 3) + 1
+            raw = int.from_bytes(b[offset:offset + length], "big")
+            if length == 4:
+                target = raw
+            else:
+                target = ((ctrl & 7) << (8 * length)) | raw
+                target += (0, 2048, 526336)[length - 1]
+            return self._decode(base + target, base)[0], offset + length
+        if kind == 0:
+            kind = 7 + b[offset]
+            offset += 1
+        size, offset = self._size(offset, ctrl & 0x1F)
+
+        if kind == 2:
+            return b[offset:offset + size].decode("utf-8"), offset + size
+        if kind == 3:
+            return struct.unpack(">d", b[offset:offset + 8])[0], offset + 8
+        if kind == 4:
+            return bytes(b[offset:offset + size]), offset + size
+        if kind in (5, 6, 9, 10):
+            return int.from_bytes(b[offset:offset + size], "big"), offset + size
+        if kind == 8:
+            return int.from_bytes(b[offset:offset + size].rjust(4, b"\0"), "big", signed=True), offset + size
+        if kind == 7:
+            out = {}
+            for _ in range(size):
+                key, offset = self._decode(offset, base)
+                out[key], offset = self._decode(offset, base)
+            return out, offset
+        if kind == 11:
+            items = []
+            for _ in range(size):
+                item, offset = self._decode(offset, base)
+                items.append(item)
+            return items, offset
+        if kind == 14:
+            return bool(size), offset
+        if kind == 15:
+            return struct.unpack(">f", b[offset:offset + 4])[0], offset + 4
+        raise ValueError(f"Unsupported MaxMind data type {kind}")
+
+
+class _CsvRanges:
+    def __init__(self, path: str) -> None:
+        rows = []
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                try:
+                    if "/" in row[0]:
+                        net = ipaddress.ip_network(row[0], strict=False)
+                        start, end, values = net[0], net[-1], row[1:]
+                    else:
+                        start, end, values = ipaddress.ip_address(row[0]), ipaddress.ip_address(row[1]), row[2:]
+                except ValueError:
+                    continue
+                rows.append((start.version, int(start), int(end), values))
+        rows.sort()
+        self._keys = [(version, start) for version, start, _, _ in rows]
+        self._ends = [end for _, _, end, _ in rows]
+        self._values = [values for _, _, _, values in rows]
+
+    def lookup(self, ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> list[str] | None:
+        value = int(ip)
+        i = bisect_right(self._keys, (ip.version, value)) - 1
+        if i < 0 or self._keys[i][0] != ip.version or self._ends[i] < value:
+            return None
+        return self._values[i]
+
+
+def _country(record) -> dict:
+    if isinstance(record, list):
+        return {"country": record[0]} if record and record[0] else {}
+    country = record.get("country") or record.get("registered_country") or {}
+    return {"country": country["iso_code"]} if "iso_code" in country else {}
+
+
+def _asn(record) -> dict:
+    if isinstance(record, list):
+        out = {}
+        if record and record[0]:
+            asn = record[0].upper().removeprefix("AS")
+            out["asn"] = int(asn) if asn.isdigit() else asn
+        if len(record) > 1 and record[1]:
+            out["org"] = record[1]
+        return out
+    out = {}
+    if "autonomous_system_number" in record:
+        out["asn"] = record["autonomous_system_number"]
+    if "autonomous_system_organization" in record:
+        out["org"] = record["autonomous_system_organization"]
+    return out
+
+
+class _Source:
+    def __init__(self, path: str, extract) -> None:
+        self.path = path
+        self.extract = extract
+        self.mtime = 0.0
+        self.reader = None
+
+    def load(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        reader = _MmdbReader(self.path) if self.path.endswith(".mmdb") else _CsvRanges(self.path)
+        self.reader, self.mtime = reader, mtime
+        log.info(f"GeoIP database loaded — {self.path}")
+        return True
+
+
+class _Generation:
+    def __init__(self, sources: list[_Source]) -> None:
+        self.readers = [(s.reader, s.extract) for s in sources if s.reader is not None]
+        self.lookup = lru_cache(maxsize=_CACHE_SIZE)(self._lookup)
+
+    def _lookup(self, ip: str) -> dict:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return {}
+        if addr.version == 6 and addr.ipv4_mapped is not None:
+            addr = addr.ipv4_mapped
+        out = {}
+        for reader, extract in self.readers:
+            record = reader.lookup(addr)
+            if record is not None:
+                out.update(extract(record))
+        return out
+
+
+_reload_lock = threading.Lock()
+_sources: list[_Source] = []
+_current: _Generation | None = None
+_watcher: threading.Thread | None = None
+
+
+def init(country_db: str = _COUNTRY_DB, asn_db: str = _ASN_DB) -> None:
+    global _sources, _current, _watcher
+    sources = [_Source(p, f) for p, f in ((country_db, _country), (asn_db, _asn)) if p]
+    for source in sources:
+        source.load()
+    with _reload_lock:
+        _sources = sources
+        _current = _Generation(sources) if sources else None
+    if sources and _watcher is None:
+        _watcher = threading.Thread(target=_watch, daemon=True, name="geoip-reload")
+        _watcher.start()
+
+
+def _watch() -> None:
+    while True:
+        time.sleep(_RELOAD_CHECK_S)
+        reload()
+
+
+def reload() -> bool:
+    with _reload_lock:
+        return _reload()
+
+
+def _reload() -> bool:
+    global _current
+    changed = False
+    for source in _sources:
+        try:
+            changed |= source.load()
+        except Exception:
+            log.exception(f"GeoIP reload failed for {source.path} — keeping previous database")
+    if changed:
+        _current = _Generation(_sources)
+    return changed
+
+
+def lookup(ip: str) -> dict | None:
+    generation = _current
+    if generation is None:
+        return None
+    return generation.lookup(ip)
+
+
+async def backfill(refresh: bool = False, batch: int = 1000) -> int:
+    if _current is None:
+        return 0
+    sessions = get_db().sessions
+    query = {} if refresh else {"geo": None}
+    ops = []
+    updated = 0
+    async for row in sessions.aggregate([{"$match": query}, {"$group": {"_id": "$source_ip"}}]):
+        ops.append(UpdateMany({**query, "source_ip": row["_id"]}, {"$set": {"geo": lookup(row["_id"])}}))
+        if len(ops) >= batch:
+            updated += (await sessions.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await sessions.bulk_write(ops, ordered=False)).modified_count
+    return updated
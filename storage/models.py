@@ -1,11 +1,17 @@
 import logging
+import os
+import socket
 import uuid
 from datetime import datetime, timezone
 
+from relay import sensor as relay
+from storage import campaigns, geoip, search
 from storage.database import get_db
 
 log = logging.getLogger(__name__)
 
+PROXY_ID = os.getenv("PROXY_INSTANCE_ID", "") or f"{socket.gethostname()}:{os.getenv('PROXY_LISTEN_PORT', '2222')}"
+
 
 async def create_session(
     source_ip: str,
@@ -13,20 +19,27 @@ async def create_session(
     username: str,
     password: str | None,
     auth_method: str,
+    client_version: str | None = None,
+    hassh: str | None = None,
 ) -> str:
     session_id = str(uuid.uuid4())
     doc = {
         "session_id": session_id,
         "source_ip": source_ip,
         "source_port": source_port,
+        "geo": geoip.lookup(source_ip),
         "username": username,
         "password": password,
         "auth_method": auth_method,
+        "client_version": client_version,
+        "hassh": hassh,
         "container_id": None,
+        "exec_command": None,
         "started_at": datetime.now(timezone.utc),
         "ended_at": None,
         "duration_seconds": None,
         "status": "active",
+        "proxy_id": PROXY_ID,
     }
 
     await get_db().sessions.insert_one(doc)
@@ -41,7 +54,60 @@ async def update_session_container(session_id: str, container_id: str) -> None:
     )
 
 
-async def end_session(session_id: str) -> None:
+async def record_channel(session_id: str, channel: int, kind: str, command: str | None = None) -> None:
+    sessions = get_db().sessions
+    await sessions.update_one(
+        {"session_id": session_id},
+        {"$push": {"channels": {
+            "channel": channel,
+            "kind": kind,
+            "command": command,
+            "opened_at": datetime.now(timezone.utc),
+        }}},
+    )
+    if command is not None:
+        await sessions.update_one(
+            {"session_id": session_id, "exec_command": None},
+            {"$set": {"exec_command": command}},
+        )
+
+
+async def reconcile_stale_sessions() -> int:
+    now = datetime.now(timezone.utc)
+    stale = {"status": "active", "proxy_id": PROXY_ID, "node_id": {"$exists": False}}
+    result = await get_db().sessions.update_many(stale, [{"$set": {
+        "status": "terminated",
+        "end_reason": "proxy_restart",
+        "ended_at": now,
+        "duration_seconds": {"$toInt": {"$divide": [{"$subtract": [now, "$started_at"]}, 1000]}},
+        "reconciled_at": now,
+    }}])
+    if result.modified_count:
+        log.warning(f"Reconciled {result.modified_count} sessions left active by a previous run of {PROXY_ID!r}")
+        async for doc in get_db().sessions.find({"reconciled_at": now}):
+            search.discard(doc["session_id"])
+            relay.ship("sessions", doc, key={"session_id": doc["session_id"]})
+    return result.modified_count
+
+
+async def end_session(
+    session_id: str,
+    trace: list[dict] | None = None,
+    backend: dict | None = None,
+    end_reason: str | None = None,
+) -> None:
+    try:
+        await _end_session(session_id, trace, backend, end_reason)
+    finally:
+        search.discard(session_id)
+
+
+async def _end_session(
+    session_id: str,
+    trace: list[dict] | None,
+    backend: dict | None,
+    end_reason: str | None,
+) -> None:
     now = datetime.now(timezone.utc)
 
     session = await get_db().sessions.find_one({"session_id": session_id})
@@ -60,7 +126,25 @@ async def end_session(session_id: str) -> None:
         {"$set": {
             "ended_at": now,
             "duration_seconds": duration,
-            "status": "completed",
+            "status": "terminated" if end_reason else "completed",
+            "end_reason": end_reason,
+            "trace": trace,
+            "backend": backend,
         }},
     )
-    log.info(f"[session:{session_id[:8]}] ended — {duration}s")
+    log.info(f"[session:{session_id[:8]}] ended — {duration}s" + (f" ({end_reason})" if end_reason else ""))
+
+    lines: list[str] = []
+    try:
+        lines = await search.index_session(session)
+    except Exception:
+        log.exception(f"[session:{session_id[:8]}] search indexing failed")
+
+    try:
+        await campaigns.assign(session, lines)
+    except Exception:
+        log.exception(f"[session:{session_id[:8]}] campaign fingerprinting failed")
+
+    final = await get_db().sessions.find_one({"session_id": session_id})
+    if final is not None:
+        relay.ship("sessions", final, key={"session_id": session_id})
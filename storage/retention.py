@@ -0,0 +1,285 @@
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator
+
+import motor.motor_asyncio
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+
+from storage import campaigns
+from storage.database import get_db
+
+log = logging.getLogger(__name__)
+
+_ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+_WINDOWS_DAYS = {
+    "sessions": int(os.getenv("RETENTION_SESSIONS_DAYS", "90")),
+    "keystrokes": int(os.getenv("RETENTION_KEYSTROKES_DAYS", "30")),
+    "uploads": int(os.getenv("RETENTION_UPLOADS_DAYS", "30")),
+}
+_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+_COMPRESS_LEVEL = 6
+_JSON = JSONOptions(json_mode=JSONMode.CANONICAL)
+
+
+def _dumps(doc: dict) -> bytes:
+    return json_util.dumps(doc, json_options=_JSON).encode() + b"\n"
+
+
+def _day(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d")
+
+
+def _blob_path(root: str, sha256: str) -> str:
+    return os.path.join(root, "blobs", sha256[:2], f"{sha256}.gz")
+
+
+class _Partition:
+    def __init__(self, root: str, day: str, collection: str) -> None:
+        self.day_dir = os.path.join(root, day)
+        os.makedirs(self.day_dir, exist_ok=True)
+        self.collection = collection
+        self.name = f"{collection}.{uuid.uuid4().hex[:8]}.jsonl.gz"
+        self.final = os.path.join(self.day_dir, self.name)
+        self.tmp = self.final + ".tmp"
+        self.digest = hashlib.sha256()
+        self.session_ids: list[str] = []
+        self.entry: dict | None = None
+        self._f = gzip.open(self.tmp, "wb", compresslevel=_COMPRESS_LEVEL)
+
+    def write(self, record: dict) -> None:
+        line = _dumps(record)
+        self.digest.update(line)
+        self._f.write(line)
+        self.session_ids.append(record["session_id"])
+
+    def abort(self) -> None:
+        self._f.close()
+        os.remove(self.tmp)
+
+    def commit(self) -> None:
+        self._f.close()
+        entry = {
+            "file": self.name,
+            "collection": self.collection,
+            "records": len(self.session_ids),
+            "sha256": self.digest.hexdigest(),
+            "session_ids": self.session_ids,
+        }
+        verify(self.tmp, entry)
+
+        with open(self.tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(self.tmp, self.final)
+        with open(os.path.join(self.day_dir, "manifest.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entry = entry
+
+
+@contextmanager
+def open_partition(root: str, day: str, collection: str) -> Iterator[_Partition]:
+    partition = _Partition(root, day, collection)
+    try:
+        yield partition
+    except BaseException:
+        partition.abort()
+        raise
+    partition.commit()
+
+
+def write_partition(root: str, day: str, collection: str, records: Iterable[dict]) -> dict:
+    with open_partition(root, day, collection) as partition:
+        for record in records:
+            partition.write(record)
+    return partition.entry
+
+
+def verify(path: str, entry: dict) -> None:
+    digest = hashlib.sha256()
+    count = 0
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            digest.update(line)
+            count += 1
+    if count != entry["records"] or digest.hexdigest() != entry["sha256"]:
+        raise IOError(f"Archive verification failed for {path}")
+
+
+def write_blob(root: str, sha256: str, content: bytes) -> None:
+    path = _blob_path(root, sha256)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + ".tmp", "wb", compresslevel=_COMPRESS_LEVEL) as f:
+        f.write(content)
+    if hashlib.sha256(read_blob(root, sha256, path + ".tmp")).hexdigest() != sha256:
+        raise IOError(f"Blob verification failed for {sha256}")
+    os.replace(path + ".tmp", path)
+
+
+def read_blob(root: str, sha256: str, path: str | None = None) -> bytes:
+    with gzip.open(path or _blob_path(root, sha256), "rb") as f:
+        return f.read()
+
+
+def _manifest(root: str, day: str) -> list[dict]:
+    path = os.path.join(root, day, "manifest.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def days(root: str, start: str | None = None, end: str | None = None) -> list[str]:
+    if not os.path.isdir(root):
+        return []
+    out = [d for d in sorted(os.listdir(root)) if len(d) == 10 and d[4] == "-"]
+    return [d for d in out if (start is None or d >= start) and (end is None or d <= end)]
+
+
+def iter_records(
+    root: str,
+    collection: str,
+    start: str | None = None,
+    end: str | None = None,
+    session_id: str | None = None,
+) -> Iterator[dict]:
+    for day in days(root, start, end):
+        for entry in _manifest(root, day):
+            if entry["collection"] != collection:
+                continue
+            if session_id is not None and session_id not in entry["session_ids"]:
+                continue
+            with gzip.open(os.path.join(root, day, entry["file"]), "rb") as f:
+                for line in f:
+                    record = json_util.loads(line)
+                    if session_id is None or record["session_id"] == session_id:
+                        yield record
+
+
+def load_session(root: str, session_id: str, day: str | None = None) -> dict | None:
+    def _first(collection: str) -> dict | None:
+        return next(iter_records(root, collection, day, day, session_id), None)
+
+    session = _first("sessions")
+    keystrokes = _first("keystrokes")
+    uploads = _first("uploads")
+    if session is None and keystrokes is None and uploads is None:
+        return None
+    return {
+        "session": session and session["session"],
+        "keystrokes": keystrokes["chunks"] if keystrokes else [],
+        "uploads": uploads["uploads"] if uploads else [],
+    }
+
+
+def search(root: str, text: str, start: str | None = None, end: str | None = None) -> Iterator[str]:
+    needle = text.lower().encode()
+    for record in iter_records(root, "keystrokes", start, end):
+        data = b"".join(base64.b64decode(c["data"]) for c in record["chunks"])
+        if needle in data.lower():
+            yield record["session_id"]
+
+
+async def _session_keystrokes(session_id: str) -> dict:
+    chunks = await campaigns.load_keystrokes(session_id)
+    return {
+        "session_id": session_id,
+        "chunks": [
+            {"timestamp": c["timestamp"], "direction": c["direction"], "data": c["data"]}
+            for c in chunks
+        ],
+    }
+
+
+async def _session_uploads(root: str, session_id: str) -> dict:
+    db = get_db()
+    bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+    uploads = await db.uploads.find({"session_id": session_id}).to_list(length=None)
+    for upload in uploads:
+        if upload.get("file_ref") is None:
+            continue
+        stream = await bucket.open_download_stream(upload["file_ref"])
+        write_blob(root, upload["content_hash"], await stream.read())
+    return {"session_id": session_id, "uploads": uploads}
+
+
+async def _purge(collection: str, sessions: list[dict]) -> None:
+    db = get_db()
+    ids = [s["session_id"] for s in sessions]
+
+    if collection in ("keystrokes", "sessions"):
+        await db.keystrokes.delete_many({"session_id": {"$in": ids}})
+    if collection in ("uploads", "sessions"):
+        bucket = motor.motor_asyncio.AsyncIOMotorGridFSBucket(db)
+        async for upload in db.uploads.find({"session_id": {"$in": ids}, "file_ref": {"$ne": None}}):
+            await bucket.delete(upload["file_ref"])
+        await db.uploads.delete_many({"session_id": {"$in": ids}})
+
+    if collection in ("keystrokes", "sessions"):
+        archived_days = {s["session_id"]: _day(s["started_at"]) for s in sessions}
+        for session_id, day in archived_days.items():
+            await db.search_docs.update_one(
+                {"session_id": session_id}, {"$set": {"archived_day": day}}
+            )
+    if collection == "sessions":
+        await db.sessions.delete_many({"session_id": {"$in": ids}})
+    else:
+        update: dict = {"$addToSet": {"archived": collection}}
+        if collection == "keystrokes":
+            update["$unset"] = {"keystroke_delta": ""}
+        await db.sessions.update_many({"session_id": {"$in": ids}}, update)
+
+
+async def _archive_batch(root: str, collection: str, sessions: list[dict]) -> int:
+    by_day: dict[str, list[dict]] = {}
+    for s in sessions:
+        by_day.setdefault(_day(s["started_at"]), []).append(s)
+
+    parts = ["keystrokes", "uploads"] if collection == "sessions" else [collection]
+    for day, group in by_day.items():
+        for part in parts:
+            todo = [s for s in group if part not in s.get("archived", [])]
+            if not todo:
+                continue
+            with open_partition(root, day, part) as partition:
+                for s in todo:
+                    if part == "keystrokes":
+                        partition.write(await _session_keystrokes(s["session_id"]))
+                    else:
+                        partition.write(await _session_uploads(root, s["session_id"]))
+        if collection == "sessions":
+            write_partition(root, day, "sessions", [{"session_id": s["session_id"], "session": s} for s in group])
+
+        await _purge(collection, group)
+    return len(sessions)
+
+
+async def archive(collection: str, now: datetime | None = None, root: str = _ARCHIVE_DIR) -> int:
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=_WINDOWS_DAYS[collection])
+    query: dict = {"started_at": {"$lt": cutoff}, "status": {"$ne": "active"}}
+    if collection != "sessions":
+        query["archived"] = {"$ne": collection}
+
+    total = 0
+    while True:
+        batch = await get_db().sessions.find(query).sort("started_at", 1).to_list(length=_BATCH)
+        if not batch:
+            break
+        total += await _archive_batch(root, collection, batch)
+        log.info(f"Archived {total} sessions' {collection} older than {_day(cutoff)}")
+    return total
+
+
+async def run(now: datetime | None = None, root: str = _ARCHIVE_DIR) -> dict[str, int]:
+    return {c: await archive(c, now, root) for c in ("keystrokes", "uploads", "sessions")}
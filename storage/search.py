@@ -0,0 +1,354 @@
+import asyncio
+import base64
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from bson import Binary
+from pymongo import ReturnDocument, UpdateOne
+
+from storage import campaigns
+from storage.database import get_db, get_loop
+
+log = logging.getLogger(__name__)
+
+_OUTPUT_EXCERPT_BYTES = int(os.getenv("SEARCH_OUTPUT_EXCERPT_BYTES", "4096"))
+_MAX_LINE_CHARS = 1024
+_MAX_LINES = 2000
+_FLUSH_DOCS = int(os.getenv("SEARCH_FLUSH_DOCS", "64"))
+_FLUSH_INTERVAL_S = int(os.getenv("SEARCH_FLUSH_INTERVAL_S", "30"))
+_BUFFER_IDLE_S = int(os.getenv("SEARCH_BUFFER_IDLE_S", "86400"))
+_SEGMENT_BITS = 16
+_VERIFY_BATCH = 500
+
+_TERM_RE = re.compile(r"[\w.\-]+")
+_ANSI_RE = re.compile(r"\x1b(\[[0-9;?]*[ -/]*[@-~]|\][^\x07]*\x07|[@-Z\\-_])")
+
+
+class _SessionBuffer:
+    __slots__ = ("lines", "current", "output", "in_escape", "touched")
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.current = bytearray()
+        self.output = bytearray()
+        self.in_escape = False
+        self.touched = time.monotonic()
+
+    def feed_input(self, data: bytes) -> None:
+        for byte in data:
+            if self.in_escape:
+                if 0x40 <= byte <= 0x7E and byte != 0x5B:
+                    self.in_escape = False
+                continue
+            if byte == 0x1B:
+                self.in_escape = True
+            elif byte in (0x0D, 0x0A):
+                self._emit()
+            elif byte in (0x7F, 0x08):
+                if self.current:
+                    self.current.pop()
+            elif byte in (0x03, 0x15):
+                self.current.clear()
+            elif byte >= 0x20 or byte == 0x09:
+                if len(self.current) < _MAX_LINE_CHARS:
+                    self.current.append(byte)
+
+    def feed_output(self, data: bytes) -> None:
+        room = _OUTPUT_EXCERPT_BYTES - len(self.output)
+        if room > 0:
+            self.output.extend(data[:room])
+
+    def _emit(self) -> None:
+        line = self.current.decode("utf-8", errors="replace").strip()
+        self.current.clear()
+        if line and len(self.lines) < _MAX_LINES:
+            self.lines.append(line)
+
+    def finish(self) -> tuple[list[str], str]:
+        self._emit()
+        output = _ANSI_RE.sub("", self.output.decode("utf-8", errors="replace"))
+        return self.lines, output
+
+
+_buffers: dict[str, dict[int | None, _SessionBuffer]] = {}
+_pending: dict[tuple[str, int], list[int]] = {}
+_pending_docs = 0
+
+
+def terms(text: str) -> set[str]:
+    return {t for t in _TERM_RE.findall(text.lower())}
+
+
+def trigrams(text: str) -> set[str]:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def encode_postings(doc_ids: list[int]) -> bytes:
+    out = bytearray()
+    prev = 0
+    for doc_id in sorted(doc_ids):
+        delta = doc_id - prev
+        prev = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(blob: bytes) -> list[int]:
+    out: list[int] = []
+    value = shift = prev = 0
+    for byte in blob:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        prev += value
+        out.append(prev)
+        value = shift = 0
+    return out
+
+
+def feed(session_id: str, data: bytes, direction: str, channel: int | None = None) -> None:
+    channels = _buffers.setdefault(session_id, {})
+    buf = channels.get(channel)
+    if buf is None:
+        buf = channels[channel] = _SessionBuffer()
+    buf.touched = time.monotonic()
+    if direction == "input":
+        buf.feed_input(data)
+    else:
+        buf.feed_output(data)
+
+
+def discard(session_id: str) -> None:
+    _buffers.pop(session_id, None)
+
+
+def _evict_idle() -> int:
+    cutoff = time.monotonic() - _BUFFER_IDLE_S
+    idle = [sid for sid, channels in _buffers.items() if all(b.touched < cutoff for b in channels.values())]
+    for session_id in idle:
+        del _buffers[session_id]
+    return len(idle)
+
+
+def _finish(session_id: str) -> tuple[list[str], str]:
+    channels = _buffers.pop(session_id, None) or {}
+    lines: list[str] = []
+    output = ""
+    for channel in sorted(channels, key=lambda c: -1 if c is None else c):
+        channel_lines, channel_output = channels[channel].finish()
+        lines.extend(channel_lines[:_MAX_LINES - len(lines)])
+        output += channel_output
+    return lines, output[:_OUTPUT_EXCERPT_BYTES]
+
+
+async def index_session(session: dict) -> list[str]:
+    session_id = session["session_id"]
+    lines, output = _finish(session_id)
+    if session.get("exec_command"):
+        lines.insert(0, session["exec_command"])
+    if not lines and not output:
+        return lines
+
+    db = get_db()
+    counter = await db.counters.find_one_and_update(
+        {"_id": "search_doc"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    doc_id = counter["seq"]
+
+    await db.search_docs.replace_one(
+        {"session_id": session_id},
+        {
+            "doc_id": doc_id,
+            "session_id": session_id,
+            "source_ip": session.get("source_ip"),
+            "started_at": session.get("started_at"),
+            "lines": lines,
+            "output": output,
+        },
+        upsert=True,
+    )
+
+    await _post(doc_id, lines, output)
+    return lines
+
+
+async def _post(doc_id: int, lines: list[str], output: str) -> None:
+    global _pending_docs
+
+    keys = set()
+    for text in (*lines, output):
+        keys.update("t:" + t for t in terms(text))
+        keys.update("g:" + g for g in trigrams(text))
+    segment = doc_id >> _SEGMENT_BITS
+    for key in keys:
+        _pending.setdefault((key, segment), []).append(doc_id)
+
+    _pending_docs += 1
+    if _pending_docs >= _FLUSH_DOCS:
+        await flush()
+
+
+async def flush() -> None:
+    global _pending, _pending_docs
+
+    if not _pending:
+        return
+    batch, _pending, _pending_docs = _pending, {}, 0
+
+    ops = [
+        UpdateOne(
+            {"key": key, "seg": seg},
+            {"$push": {"blocks": Binary(encode_postings(doc_ids))}, "$inc": {"n": len(doc_ids)}},
+            upsert=True,
+        )
+        for (key, seg), doc_ids in batch.items()
+    ]
+    await get_db().search_postings.bulk_write(ops, ordered=False)
+    log.debug(f"Search index flushed — {len(ops)} posting updates")
+
+
+async def compact() -> None:
+    postings = get_db().search_postings
+    async for doc in postings.find({"blocks.1": {"$exists": True}}):
+        doc_ids = sorted({i for block in doc["blocks"] for i in decode_postings(block)})
+        await postings.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"blocks": [Binary(encode_postings(doc_ids))], "n": len(doc_ids)}},
+        )
+
+
+async def _flush_periodically() -> None:
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL_S)
+        try:
+            await flush()
+        except Exception:
+            log.exception("Search index flush failed")
+        evicted = _evict_idle()
+        if evicted:
+            log.warning(f"Dropped search buffers of {evicted} sessions idle for {_BUFFER_IDLE_S}s without ending")
+
+
+async def ensure_indexes() -> None:
+    db = get_db()
+    await db.search_postings.create_index([("key", 1), ("seg", 1)], unique=True)
+    await db.search_docs.create_index("doc_id", unique=True)
+    await db.search_docs.create_index("session_id", unique=True)
+    await db.search_docs.create_index([("source_ip", 1), ("doc_id", -1)])
+    await db.search_docs.create_index("started_at")
+
+
+def init() -> None:
+    loop = get_loop()
+    asyncio.run_coroutine_threadsafe(ensure_indexes(), loop).result(timeout=10)
+    asyncio.run_coroutine_threadsafe(_flush_periodically(), loop)
+    log.info("Search index initialised")
+
+
+async def _postings(keys: set[str]) -> list[int] | None:
+    found: dict[str, set[int]] = {k: set() for k in keys}
+    async for doc in get_db().search_postings.find({"key": {"$in": list(keys)}}):
+        for block in doc["blocks"]:
+            found[doc["key"]].update(decode_postings(block))
+
+    result: set[int] | None = None
+    for doc_ids in sorted(found.values(), key=len):
+        result = doc_ids if result is None else result & doc_ids
+        if not result:
+            return []
+    return sorted(result or (), reverse=True)
+
+
+async def query(
+    text: str | None = None,
+    term: str | None = None,
+    source_ip: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 20,
+    before: int | None = None,
+) -> tuple[list[dict], int | None]:
+    filt: dict = {}
+    if source_ip:
+        filt["source_ip"] = source_ip
+    if since or until:
+        filt["started_at"] = {}
+        if since:
+            filt["started_at"]["$gte"] = since
+        if until:
+            filt["started_at"]["$lt"] = until
+
+    keys: set[str] = set()
+    if term:
+        keys.update("t:" + t for t in terms(term))
+    if text:
+        if len(text) < 3:
+            raise ValueError("Substring queries need at least 3 characters")
+        keys.update("g:" + g for g in trigrams(text))
+
+    docs = get_db().search_docs
+    projection = {"_id": 0}
+
+    if not keys:
+        if before is not None:
+            filt["doc_id"] = {"$lt": before}
+        hits = await docs.find(filt, projection).sort("doc_id", -1).to_list(length=limit)
+        return hits, (hits[-1]["doc_id"] if len(hits) == limit else None)
+
+    candidates = await _postings(keys)
+    if before is not None:
+        candidates = [i for i in candidates if i < before]
+
+    needle = text.lower() if text else None
+    hits: list[dict] = []
+    for start in range(0, len(candidates), _VERIFY_BATCH):
+        chunk = candidates[start:start + _VERIFY_BATCH]
+        found = await docs.find({**filt, "doc_id": {"$in": chunk}}, projection).to_list(length=None)
+        for doc in sorted(found, key=lambda d: d["doc_id"], reverse=True):
+            if needle and not any(needle in s.lower() for s in (*doc["lines"], doc["output"])):
+                continue
+            hits.append(doc)
+            if len(hits) == limit:
+                return hits, doc["doc_id"]
+    return hits, None
+
+
+async def rebuild() -> int:
+    db = get_db()
+    async for session in db.sessions.find({"archived": "keystrokes"}, {"session_id": 1, "started_at": 1}):
+        await db.search_docs.update_one(
+            {"session_id": session["session_id"], "archived_day": {"$exists": False}},
+            {"$set": {"archived_day": session["started_at"].strftime("%Y-%m-%d")}},
+        )
+    await db.search_docs.delete_many({"archived_day": {"$exists": False}})
+    await db.search_postings.drop()
+    await ensure_indexes()
+    last = await db.search_docs.find_one({}, {"doc_id": 1}, sort=[("doc_id", -1)])
+    await db.counters.update_one(
+        {"_id": "search_doc"}, {"$set": {"seq": last["doc_id"] if last else 0}}, upsert=True
+    )
+
+    count = 0
+    async for doc in db.search_docs.find({}, {"doc_id": 1, "lines": 1, "output": 1}):
+        await _post(doc["doc_id"], doc["lines"], doc["output"])
+        count += 1
+    async for session in db.sessions.find({"archived": {"$ne": "keystrokes"}}).sort("started_at", 1):
+        session_id = session["session_id"]
+        for k in await campaigns.load_keystrokes(session_id):
+            feed(session_id, base64.b64decode(k["data"]), k["direction"], k.get("channel"))
+        await index_session(session)
+        count += 1
+    await flush()
+    await compact()
+    return count
@@ -0,0 +1,139 @@
+import asyncio
+import sys
+import time
+import types
+from datetime import datetime, timezone
+
+from storage import activity, database
+
+NOW = 1_767_225_630.0
+MINUTE = int(NOW) // 60
+
+
+class FakeCursor:
+    async def to_list(self, length=None) -> list:
+        return []
+
+
+class FakeCollection:
+    def __init__(self, name: str, db: "FakeDB") -> None:
+        self.name = name
+        self.db = db
+
+    async def insert_many(self, docs: list[dict], ordered: bool = True) -> None:
+        self.db.inserted.setdefault(self.name, []).extend(docs)
+
+    def aggregate(self, pipeline: list[dict]) -> FakeCursor:
+        self.db.pipelines.append((self.name, pipeline))
+        return FakeCursor()
+
+
+class FakeDB:
+    def __init__(self) -> None:
+        self.inserted: dict[str, list[dict]] = {}
+        self.pipelines: list[tuple[str, list[dict]]] = []
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return FakeCollection(name, self)
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        return FakeCollection(name, self)
+
+
+def _with_fakes(now: float):
+    fake = FakeDB()
+    activity.get_db = lambda: fake
+    activity.time = types.SimpleNamespace(time=lambda: now)
+    activity._counters.clear()
+    return fake
+
+
+def _restore() -> None:
+    activity.get_db = database.get_db
+    activity.time = time
+    activity._counters.clear()
+
+
+def test_counters_batched_per_minute() -> None:
+    try:
+        _with_fakes(NOW)
+        activity.record("commands", node="a", kind="shell")
+        activity.record("commands", 2, kind="shell", node="a")
+        activity.record("commands", node="b", kind="shell")
+        activity.record("logins")
+        assert len(activity._counters) == 3, f"Counters not merged by tag set: {activity._counters}"
+        assert activity._counters[(MINUTE, "commands", (("kind", "shell"), ("node", "a")))] == 3
+
+        assert activity._take(final=False) == {}, "Open minute flushed early"
+        activity.time = types.SimpleNamespace(time=lambda: NOW + 60)
+        activity.record("logins")
+        taken = activity._take(final=False)
+        assert {k[0] for k in taken} == {MINUTE} and len(taken) == 3, f"Closed minute not taken: {taken}"
+        assert list(activity._counters) == [(MINUTE + 1, "logins", ())], "Current minute taken"
+        assert len(activity._take(final=True)) == 1, "Final take left counters behind"
+    finally:
+        _restore()
+
+    print(f"[+] PASS — counters merged per minute and tag set, open minute held back")
+
+
+def test_flush_writes_points() -> None:
+    try:
+        fake = _with_fakes(NOW)
+        activity.record("bytes_in", 512, node="a")
+        activity.record("bytes_in", 256, node="a")
+        asyncio.run(activity.flush())
+        assert "activity" not in fake.inserted, "Open minute written before it closed"
+
+        asyncio.run(activity.flush(final=True))
+        docs = fake.inserted["activity"]
+        assert docs == [{
+            "ts": datetime.fromtimestamp(MINUTE * 60, timezone.utc),
+            "meta": {"metric": "bytes_in", "node": "a"},
+            "value": 768,
+        }], f"Unexpected points: {docs}"
+        asyncio.run(activity.flush(final=True))
+        assert len(fake.inserted["activity"]) == 1, "Flushed counters written twice"
+    finally:
+        _restore()
+
+    print(f"[+] PASS — flush writes one point per minute, metric and tag set")
+
+
+def test_rollup_windows() -> None:
+    try:
+        fake = _with_fakes(NOW)
+        asyncio.run(activity.downsample(datetime(2026, 3, 10, 14, 37, 12, tzinfo=timezone.utc)))
+        (hourly_src, hourly), (daily_src, daily) = fake.pipelines
+        assert hourly_src == "activity" and daily_src == "activity_hourly"
+
+        assert hourly[0]["$match"]["ts"] == {
+            "$gte": datetime(2026, 3, 10, 12, tzinfo=timezone.utc),
+            "$lt": datetime(2026, 3, 10, 14, tzinfo=timezone.utc),
+        }, "Hourly rollup includes the open hour or skips a closed one"
+        assert hourly[1]["$group"]["_id"]["ts"]["$dateTrunc"]["unit"] == "hour"
+        assert hourly[1]["$group"]["_id"]["meta"] == "$meta", "Rollup drops tags"
+        assert hourly[-1]["$merge"]["into"] == "activity_hourly"
+        assert hourly[-1]["$merge"]["whenMatched"] == "replace", "Re-running the rollup would double count"
+
+        assert daily[0]["$match"]["ts"] == {
+            "$gte": datetime(2026, 3, 8, tzinfo=timezone.utc),
+            "$lt": datetime(2026, 3, 10, tzinfo=timezone.utc),
+        }
+        assert daily[1]["$group"]["_id"]["ts"]["$dateTrunc"]["unit"] == "day"
+        assert daily[-1]["$merge"]["into"] == "activity_daily"
+    finally:
+        _restore()
+
+    print(f"[+] PASS — hourly and daily rollups cover the last closed windows idempotently")
+
+
+if __name__ == "__main__":
+    try:
+        test_counters_batched_per_minute()
+        test_flush_writes_points()
+        test_rollup_windows()
+        print("\n[+] All activity tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,79 @@
+import json
+import sys
+import urllib.error
+import urllib.request
+
+from proxy import admin, reaper
+
+
+_TOKEN = "test-admin-token"
+
+
+def _request(port: int, path: str, method: str = "GET", token: str | None = _TOKEN) -> tuple[int, dict]:
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    if token is not None:
+        req.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def test_registry_snapshot() -> None:
+    live = reaper.register("aaaa1111-registry", lambda: None, source_ip="198.51.100.4", username="root")
+    live.channels[0] = "exec"
+    live.touch(12, "input")
+    live.touch(300, "output")
+    live.stage = "active"
+    try:
+        doc = reaper.find("aaaa1111").to_doc()
+        assert (doc["bytes_in"], doc["bytes_out"]) == (12, 300), doc
+        assert doc["channels"] == [{"channel": 0, "kind": "exec"}] and doc["stage"] == "active"
+        assert reaper.find("") is None and reaper.find("zzzz") is None
+    finally:
+        reaper.unregister("aaaa1111-registry")
+    print("[+] PASS — live sessions carry channels, byte counts and stage")
+
+
+def test_list_inspect_terminate() -> None:
+    closed: list[str] = []
+    reaper.register("bbbb2222-first", lambda: closed.append("first"), source_ip="203.0.113.9")
+    reaper.register("bbbb3333-second", lambda: closed.append("second"), source_ip="203.0.113.10")
+    admin._ENABLED = True
+    assert admin.start(port=0) is None, "Admin API started without a token"
+    admin._TOKEN = _TOKEN
+    server = admin.start(port=0)
+    port = server.server_port
+    try:
+        assert _request(port, "/sessions", token=None)[0] == 401, "Admin API served without token"
+        assert _request(port, "/sessions", token="wrong")[0] == 401
+        status, body = _request(port, "/sessions")
+        assert status == 200 and body["count"] == 2, body
+        status, body = _request(port, "/sessions?ip=203.0.113.10")
+        assert [s["session_id"] for s in body["sessions"]] == ["bbbb3333-second"], body
+
+        assert _request(port, "/sessions/bbbb")[0] == 404, "Ambiguous prefix resolved"
+        status, body = _request(port, "/sessions/bbbb2222")
+        assert status == 200 and body["source_ip"] == "203.0.113.9", body
+
+        status, body = _request(port, "/sessions/bbbb2222", method="DELETE")
+        assert status == 202 and body["reason"] == "admin" and closed == ["first"], (body, closed)
+        assert _request(port, "/sessions/nope", method="DELETE")[0] == 404
+    finally:
+        admin._TOKEN = ""
+        admin._ENABLED = False
+        admin.shutdown()
+        reaper.unregister("bbbb2222-first")
+        reaper.unregister("bbbb3333-second")
+    print("[+] PASS — admin API lists, inspects and terminates live sessions")
+
+
+if __name__ == "__main__":
+    try:
+        test_registry_snapshot()
+        test_list_inspect_terminate()
+        print("\n[+] All admin tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+
+from orchestrator.affinity import AffinityPool
+
+
+class _Provisioner:
+    def __init__(self) -> None:
+        self.created = 0
+        self.destroyed: list[str] = []
+
+    def provision(self) -> str:
+        time.sleep(0.05)
+        self.created += 1
+        return f"container-{self.created}"
+
+    def destroy(self, handle: str) -> None:
+        self.destroyed.append(handle)
+
+
+def test_reattach_within_window() -> None:
+    p = _Provisioner()
+    pool = AffinityPool(0.3, p.destroy)
+    key = ("203.0.113.7", "root")
+
+    first, reused = pool.acquire(key, "session-a", p.provision)
+    assert not reused
+    pool.release(first)
+    second, reused = pool.acquire(key, "session-b", p.provision)
+    assert reused and second == first, "Reconnect did not reattach"
+    assert pool.sessions(first) == ["session-a", "session-b"]
+
+    other, reused = pool.acquire(("203.0.113.7", "admin"), "session-c", p.provision)
+    assert not reused and other != first, "Different username shared a container"
+
+    pool.release(second)
+    assert p.destroyed == [], "Destroyed inside the affinity window"
+    time.sleep(0.5)
+    assert p.destroyed == [first], f"Idle container not destroyed: {p.destroyed}"
+    third, reused = pool.acquire(key, "session-d", p.provision)
+    assert not reused and third != first, "Reattached after the window expired"
+    print(f"[+] PASS — reattach within window, destroy after expiry")
+
+
+def test_concurrent_channels_share_container() -> None:
+    p = _Provisioner()
+    pool = AffinityPool(60, p.destroy)
+    key = ("198.51.100.4", "root")
+    handles: list[str] = []
+
+    threads = [
+        threading.Thread(target=lambda i=i: handles.append(pool.acquire(key, f"s{i}", p.provision)[0]))
+        for i in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert p.created == 1 and len(set(handles)) == 1, f"Concurrent sessions provisioned {p.created} containers"
+
+    for h in handles:
+        pool.release(h)
+    pool.evict(handles[0])
+    assert pool.sessions(handles[0]) == [], "TTL eviction left the entry in the pool"
+    print(f"[+] PASS — concurrent channels attach to one ref-counted container")
+
+
+if __name__ == "__main__":
+    try:
+        test_reattach_within_window()
+        test_concurrent_channels_share_container()
+        print("\n[+] All affinity tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
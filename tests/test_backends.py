@@ -0,0 +1,102 @@
+import socket
+import sys
+import threading
+import time
+
+from orchestrator.backends.pty_backend import PtyBackend
+
+
+def _read_until(stream, marker: bytes, timeout: float = 5.0) -> bytes:
+    out = b""
+    deadline = time.monotonic() + timeout
+    while marker not in out and time.monotonic() < deadline:
+        data = stream.recv(4096)
+        if not data:
+            break
+        out += data
+    return out
+
+
+def test_pty_exec_roundtrip() -> None:
+    backend = PtyBackend(isolation="none")
+    backend.init()
+    handle = backend.provision("test-pty-exec")
+    try:
+        _, stream = backend.open_exec(handle, ["sh", "-c", "echo honeypot_pty_marker"], tty=False)
+        out = _read_until(stream, b"honeypot_pty_marker")
+        stream.close()
+        assert b"honeypot_pty_marker" in out, f"Unexpected exec output: {out!r}"
+    finally:
+        backend.destroy(handle)
+
+    print(f"[+] PASS — exec output received")
+
+
+def test_pty_interactive_shell() -> None:
+    backend = PtyBackend(isolation="none")
+    backend.init()
+    handle = backend.provision("test-pty-shell")
+    try:
+        exec_id, stream = backend.open_exec(handle, ["/bin/sh"], tty=True, width=120, height=40)
+        backend.resize(exec_id, 100, 30)
+        stream.sendall(b"stty size; echo done_$((6*7))\n")
+        out = _read_until(stream, b"done_42")
+        assert b"30 100" in out, f"Resize not applied: {out!r}"
+        assert b"done_42" in out, f"Command not executed: {out!r}"
+    finally:
+        backend.destroy(handle)
+
+    assert handle not in backend._sandboxes, "Sandbox not cleaned up"
+    print(f"[+] PASS — interactive PTY with resize")
+
+
+def test_pty_close_during_read() -> None:
+    backend = PtyBackend(isolation="none")
+    backend.init()
+    handle = backend.provision("test-pty-close")
+    try:
+        _, stream = backend.open_exec(handle, ["sh", "-c", "sleep 0.5; echo late; sleep 3"], tty=True)
+
+        def _drain() -> None:
+            while stream.recv(4096):
+                pass
+
+        threading.Thread(target=_drain, daemon=True).start()
+        time.sleep(0.1)
+        stream.close()
+        ours, theirs = socket.socketpair()
+        theirs.sendall(b"other exec output")
+        time.sleep(1.0)
+        ours.setblocking(False)
+        try:
+            out = ours.recv(4096)
+        except BlockingIOError:
+            out = b""
+        assert out == b"other exec output", "Closed PTY stream read from a reused file descriptor"
+    finally:
+        backend.destroy(handle)
+
+    print(f"[+] PASS — closing a PTY stream mid-read does not leak its fd number")
+
+
+def test_unshare_requires_rootfs() -> None:
+    try:
+        PtyBackend(isolation="unshare", rootfs="").init()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Namespaced PTY backend started without a rootfs")
+
+    print(f"[+] PASS — unshare isolation refuses to run on the host filesystem")
+
+
+if __name__ == "__main__":
+    try:
+        test_pty_exec_roundtrip()
+        test_pty_interactive_shell()
+        test_pty_close_during_read()
+        test_unshare_requires_rootfs()
+        print("\n[+] All backend tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
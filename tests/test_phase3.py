@@ -129,10 +129,54 @@ def test_sftp_upload_capture() -> None:
     print(f"    gridfs_ref   : {upload['file_ref']}")
 
 
+def test_concurrent_exec_channels() -> None:
+    print(f"\n[*] Testing concurrent exec channels on one connection")
+
+    marker = f"/tmp/channel-marker-{os.getpid()}"
+    ssh = _make_client()
+    try:
+        transport = ssh.get_transport()
+        first = transport.open_session(timeout=10)
+        first.exec_command(f"touch {marker}; sleep 1; echo first-done")
+        others = []
+        for i in range(3):
+            chan = transport.open_session(timeout=10)
+            chan.exec_command(f"sleep 0.5; ls {marker} && echo channel-{i}")
+            others.append(chan)
+
+        outputs = []
+        for chan in [first, *others]:
+            chan.settimeout(15)
+            data = b""
+            while True:
+                chunk = chan.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            outputs.append(data)
+    finally:
+        ssh.close()
+
+    assert b"first-done" in outputs[0], f"First channel output missing: {outputs[0]!r}"
+    for i, data in enumerate(outputs[1:]):
+        assert f"channel-{i}".encode() in data, f"Channel {i} hung or saw a different container: {data!r}"
+
+    time.sleep(_SETTLE_S)
+    session = asyncio.run(_get_session())
+    assert session, "Session not found in MongoDB"
+    assert len(session.get("channels") or []) == 4, f"Channels not recorded: {session.get('channels')}"
+    keystrokes = asyncio.run(_get_keystrokes(session["session_id"]))
+    channels = {k.get("channel") for k in keystrokes}
+    assert len(channels) == 4, f"Keystrokes not captured per channel: {channels}"
+
+    print(f"[+] PASS — 4 exec channels served concurrently on one transport and container")
+
+
 if __name__ == "__main__":
     try:
         test_keystroke_logging()
         test_sftp_upload_capture()
+        test_concurrent_exec_channels()
         print("\n[+] All Phase 3 tests passed.")
     except AssertionError as exc:
         print(f"\n[-] FAIL: {exc}", file=sys.stderr)
@@ -0,0 +1,38 @@
+import sys
+import time
+
+from proxy import reaper
+
+
+def test_idle_and_cap() -> None:
+    closed: list[str] = []
+    idle = reaper.register("idle-session", lambda: closed.append("idle"))
+    busy = reaper.register("busy-session", lambda: closed.append("busy"))
+    sftp = reaper.register("sftp-session", lambda: closed.append("sftp"), idle=False)
+
+    now = time.monotonic()
+    busy.last_io = now + 590
+    assert reaper.sweep(now + 601, idle_timeout_s=600, max_session_s=3600) == 1
+    assert closed == ["idle"], f"Wrong sessions reaped: {closed}"
+    assert idle.reason == "idle_timeout" and busy.reason is None and sftp.reason is None
+
+    assert reaper.sweep(now + 3601, idle_timeout_s=600, max_session_s=3600) == 2
+    assert sorted(closed) == ["busy", "idle", "sftp"], f"Session cap not enforced: {closed}"
+    assert busy.reason == sftp.reason == "max_duration"
+
+    idle.terminate("again")
+    assert closed.count("idle") == 1 and idle.reason == "idle_timeout", "Terminate is not idempotent"
+
+    for session_id in ("idle-session", "busy-session", "sftp-session"):
+        reaper.unregister(session_id)
+    assert reaper.sweep(now + 10_000) == 0, "Unregistered sessions still swept"
+    print(f"[+] PASS — idle timeout, session cap and SFTP idle exemption")
+
+
+if __name__ == "__main__":
+    try:
+        test_idle_and_cap()
+        print("\n[+] All reaper tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
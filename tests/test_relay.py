@@ -0,0 +1,215 @@
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from relay import protocol
+from relay.collector import Collector
+from relay.sensor import Sensor
+
+_SECRET = b"test-relay-secret"
+
+
+class _MemorySink:
+    def __init__(self, delay_s: float = 0.0) -> None:
+        self.delay_s = delay_s
+        self.docs: dict[tuple[str, str], dict] = {}
+        self.checkpoints: dict[str, int] = {}
+
+    async def last_seq(self, node: str) -> int:
+        return self.checkpoints.get(node, 0)
+
+    async def write(self, node: str, seq: int, records: list[dict]) -> None:
+        await asyncio.sleep(self.delay_s)
+        for i, record in enumerate(records):
+            key = str(record["k"]) if record["k"] else f"{node}:{seq}:{i}"
+            self.docs[(record["c"], f"{node}/{key}")] = {**record["d"], "node_id": node}
+        self.checkpoints[node] = max(self.checkpoints.get(node, 0), seq)
+
+
+def _start_collector(collector: Collector) -> tuple[asyncio.AbstractEventLoop, int]:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(collector.serve("127.0.0.1", 0), loop).result()
+    return loop, server.sockets[0].getsockname()[1]
+
+
+def _wait(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_multi_sensor_delivery() -> None:
+    sink = _MemorySink(delay_s=0.05)
+    collector = Collector(_SECRET, sink, max_inflight=1)
+    _, port = _start_collector(collector)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensors = [
+            Sensor(("127.0.0.1", port), f"node-{n}", _SECRET, f"{tmp}/{n}", batch_max_records=50, batch_interval_s=0.1)
+            for n in range(3)
+        ]
+        for sensor in sensors:
+            sensor.start()
+        for n, sensor in enumerate(sensors):
+            for i in range(400):
+                sensor.ship("keystrokes", {"_id": "local", "session_id": f"s{n}", "i": i})
+            sensor.ship("sessions", {"session_id": f"s{n}", "status": "active"}, key={"session_id": f"s{n}"})
+            sensor.ship("sessions", {"session_id": f"s{n}", "status": "completed"}, key={"session_id": f"s{n}"})
+
+        assert _wait(lambda: len(sink.docs) == 3 * 401), f"Only {len(sink.docs)} records delivered"
+        for sensor in sensors:
+            sensor.stop()
+
+    sessions = [d for (c, _), d in sink.docs.items() if c == "sessions"]
+    assert sorted(d["node_id"] for d in sessions) == ["node-0", "node-1", "node-2"]
+    assert all(d["status"] == "completed" for d in sessions), "Session upsert not applied in order"
+    assert all("_id" not in d for d in sink.docs.values()), "Local _id leaked to the collector"
+    print(f"[+] PASS — 3 sensors delivered {len(sink.docs)} records through a busy collector")
+
+
+def test_resend_is_idempotent() -> None:
+    sink = _MemorySink()
+    _, port = _start_collector(Collector(_SECRET, sink))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor = Sensor(("127.0.0.1", port), "node-r", _SECRET, tmp, batch_interval_s=0.1)
+        sensor.ship("connections", {"source_ip": "192.0.2.1"})
+        seq = sensor.seal()
+        with open(sensor._spool_path(seq), "rb") as f:
+            body = f.read()
+        sensor.start()
+        assert _wait(lambda: sink.checkpoints.get("node-r") == seq), "Batch not acknowledged"
+        sensor.stop()
+
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+            sock.sendall(protocol.frame(_SECRET, protocol.HELLO, protocol.encode_body({"node": "node-r"})))
+            assert protocol.read_frame(sock, _SECRET)[1]["last_seq"] == seq
+            sock.sendall(protocol.frame(_SECRET, protocol.BATCH, body))
+            kind, reply = protocol.read_frame(sock, _SECRET)
+            assert kind == protocol.ACK and reply["seq"] == seq, "Duplicate batch not acknowledged"
+
+        restarted = Sensor(("127.0.0.1", port), "node-r", _SECRET, tmp)
+        assert restarted._seq == seq + 1, "Sequence number not persisted across restarts"
+
+    assert len(sink.docs) == 1, f"Duplicate batch written twice: {len(sink.docs)}"
+    print(f"[+] PASS — replayed batch acknowledged without a second write")
+
+
+def test_sequence_reset_recovers() -> None:
+    sink = _MemorySink()
+    _, port = _start_collector(Collector(_SECRET, sink))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor = Sensor(("127.0.0.1", port), "node-z", _SECRET, tmp, batch_interval_s=0.1)
+        for i in range(3):
+            sensor.ship("connections", {"i": i})
+            sensor.seal()
+        sensor.start()
+        assert _wait(lambda: sink.checkpoints.get("node-z") == 3), "Batches not acknowledged"
+        sensor.stop()
+
+        os.remove(sensor._seq_path())
+        restarted = Sensor(("127.0.0.1", port), "node-z", _SECRET, tmp, batch_interval_s=0.1)
+        assert restarted._seq == 1
+        restarted.ship("connections", {"i": "after-reset"})
+        restarted.seal()
+        restarted.start()
+        assert _wait(lambda: len(sink.docs) == 4), "Batch sealed after a sequence reset was dropped"
+        restarted.ship("connections", {"i": "next"})
+        assert _wait(lambda: len(sink.docs) == 5), "Sensor kept reusing acknowledged sequence numbers"
+        restarted.stop()
+        assert Sensor(("127.0.0.1", port), "node-z", _SECRET, tmp)._seq == 6, "Resynced sequence not persisted"
+    print("[+] PASS — sensor resyncs its sequence to the collector checkpoint")
+
+
+def test_concurrent_seal() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor = Sensor(("127.0.0.1", 9), "node-c", _SECRET, tmp)
+        seqs: list[int] = []
+
+        def _worker(n: int) -> None:
+            for i in range(200):
+                sensor.ship("keystrokes", {"n": n, "i": i})
+                seq = sensor.seal()
+                if seq is not None:
+                    seqs.append(seq)
+
+        threads = [threading.Thread(target=_worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        records = 0
+        for seq in sensor._spool_seqs():
+            with open(sensor._spool_path(seq), "rb") as f:
+                batch = protocol.decode_body(f.read())
+            assert batch["seq"] == seq
+            records += len(batch["records"])
+    assert len(seqs) == len(set(seqs)), "Sequence number reused by concurrent seals"
+    assert records == 800, f"Records lost by concurrent seals: {records}"
+    print(f"[+] PASS — concurrent seals allocate {len(seqs)} distinct sequence numbers")
+
+
+def test_spool_limit_without_scans() -> None:
+    sink = _MemorySink()
+    _, port = _start_collector(Collector(_SECRET, sink))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor = Sensor(("127.0.0.1", port), "node-s", _SECRET, tmp, batch_interval_s=0.1, spool_max_bytes=2048)
+
+        def _no_scan() -> list[int]:
+            raise AssertionError("Spool directory scanned while sealing")
+
+        sensor._spool_seqs = _no_scan
+        for i in range(40):
+            sensor.ship("keystrokes", {"i": i, "pad": "x" * 200})
+            sensor.seal()
+        del sensor._spool_seqs
+        on_disk = sum(os.path.getsize(sensor._spool_path(seq)) for seq in sensor._spool_seqs())
+        assert sensor._spool_size == on_disk <= 2048, f"Spool size drifted: {sensor._spool_size} vs {on_disk}"
+        assert sensor.dropped > 0, "Spool limit not enforced"
+        assert Sensor(("127.0.0.1", port), "node-s", _SECRET, tmp)._spool_size == on_disk
+
+        sensor.start()
+        assert _wait(lambda: sensor._spool_size == 0), f"Acked batches still counted: {sensor._spool_size}"
+        sensor.ship("keystrokes", {"i": "after-drain"})
+        assert sensor.seal() is not None, "Seal refused after the spool drained"
+        sensor.stop()
+    print("[+] PASS — spool size tracked on write and ack")
+
+
+def test_bad_secret_rejected() -> None:
+    sink = _MemorySink()
+    _, port = _start_collector(Collector(_SECRET, sink))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sensor = Sensor(("127.0.0.1", port), "node-x", b"wrong-secret", tmp, batch_interval_s=0.1)
+        sensor.start()
+        sensor.ship("keystrokes", {"session_id": "x"})
+        time.sleep(1)
+        sensor.stop(drain_s=0)
+
+    assert not sink.docs, "Collector accepted a batch with a bad MAC"
+    print(f"[+] PASS — unauthenticated sensor rejected")
+
+
+if __name__ == "__main__":
+    try:
+        test_multi_sensor_delivery()
+        test_resend_is_idempotent()
+        test_sequence_reset_recovers()
+        test_concurrent_seal()
+        test_spool_limit_without_scans()
+        test_bad_secret_rejected()
+        print("\n[+] All relay tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
